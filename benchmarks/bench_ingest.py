@@ -0,0 +1,392 @@
+"""
+Throughput benchmarks of the marilib ingest and transmit paths.
+
+Everything runs in memory, with fake serial and MQTT adapters, so no gateway is needed.
+
+Usage:
+python -m benchmarks.bench_ingest --output results.json
+python -m benchmarks.bench_ingest --baseline results.json  # compare with a previous run
+"""
+
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Callable
+
+import click
+from rich.console import Console
+
+import marilib
+from marilib.communication_adapter import CommunicationAdapterBase, MQTTAdapterDummy
+from marilib.logger import MetricsLogger
+from marilib.mari_protocol import Frame, FrameView, Header, HeaderStats, MetricsProbePayload
+from marilib.marilib_cloud import MarilibCloud
+from marilib.marilib_edge import MarilibEdge
+from marilib.model import EdgeEvent, GatewayInfo, NodeInfoCloud, NodeInfoEdge
+from marilib.serial_hdlc import HDLCHandler, HDLCState, HDLCStreamDecoder, hdlc_encode
+from marilib.tui_edge import MarilibTUIEdge
+
+GATEWAY_ADDRESS = 0x0000000000000EEE
+NODE_ADDRESS_BASE = 0x0000000000001000
+FRAMES_PER_NODE = 10
+PAYLOAD = b"\x01" + bytes(range(20))
+READ_CHUNK_SIZE = 4096
+
+
+class FakeSerialAdapter(CommunicationAdapterBase):
+    """Serial adapter that encodes the frames and writes them in memory."""
+
+    def __init__(self):
+        self.port = "fake"
+        self.baudrate = 0
+        self.output = io.BytesIO()
+
+    def init(self, on_data_received):
+        self.on_data_received = on_data_received
+
+    def close(self):
+        pass
+
+    def read_rates(self) -> tuple[float, float]:
+        return 0.0, 0.0
+
+    def send_data(self, data) -> bool:
+        self.output.write(hdlc_encode(data))
+        return True
+
+
+# ============================ Data generation =================================
+
+
+def node_addresses(nodes: int) -> list[int]:
+    return list(range(NODE_ADDRESS_BASE, NODE_ADDRESS_BASE + nodes))
+
+
+def gateway_info() -> GatewayInfo:
+    return GatewayInfo(address=GATEWAY_ADDRESS, schedule_id=1, schedule_stats=0)
+
+
+def node_data_frame(address: int, payload: bytes = PAYLOAD) -> bytes:
+    header = Header(destination=GATEWAY_ADDRESS, source=address)
+    return Frame(header, stats=HeaderStats(rssi=200), payload=payload).to_bytes()
+
+
+def probe_payload(seq: int) -> bytes:
+    return MetricsProbePayload(
+        edge_tx_ts_us=seq * 1000,
+        cloud_tx_ts_us=seq * 1000,
+        edge_tx_count=seq,
+        gw_tx_count=seq,
+        gw_rx_count=seq,
+        node_tx_count=seq,
+        node_rx_count=seq,
+        gw_rx_asn=seq * 100,
+    ).to_bytes()
+
+
+def edge_events(nodes: int) -> list[bytes]:
+    """Serial events received by an edge, interleaving the nodes."""
+    return [
+        EdgeEvent.to_bytes(EdgeEvent.NODE_DATA) + node_data_frame(address)
+        for _ in range(FRAMES_PER_NODE)
+        for address in node_addresses(nodes)
+    ]
+
+
+def build_edge(nodes: int, **kwargs) -> MarilibEdge:
+    """An edge with a gateway and nodes, with some traffic and probe stats."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        mari = MarilibEdge(lambda event, data: None, FakeSerialAdapter(), **kwargs)
+    mari.handle_serial_data(EdgeEvent.to_bytes(EdgeEvent.GATEWAY_INFO) + gateway_info().to_bytes())
+    for address in node_addresses(nodes):
+        mari.handle_serial_data(
+            EdgeEvent.to_bytes(EdgeEvent.NODE_JOINED) + NodeInfoEdge(address=address).to_bytes()
+        )
+        for seq in range(1, 4):
+            node = mari.gateway.get_node(address)
+            node.probe_increment_tx_count()
+            mari.handle_serial_data(
+                EdgeEvent.to_bytes(EdgeEvent.NODE_DATA)
+                + node_data_frame(address, probe_payload(seq))
+            )
+        mari.send_frame(address, PAYLOAD)
+    return mari
+
+
+def build_cloud(nodes: int) -> MarilibCloud:
+    with contextlib.redirect_stdout(io.StringIO()):
+        mari = MarilibCloud(lambda event, data: None, MQTTAdapterDummy(is_edge=False), 1)
+    mari.handle_mqtt_data(EdgeEvent.to_bytes(EdgeEvent.GATEWAY_INFO) + gateway_info().to_bytes())
+    for address in node_addresses(nodes):
+        node_info = NodeInfoCloud(address=address, gateway_address=GATEWAY_ADDRESS)
+        mari.handle_mqtt_data(EdgeEvent.to_bytes(EdgeEvent.NODE_JOINED) + node_info.to_bytes())
+    return mari
+
+
+# ============================ Benchmarks ======================================
+
+
+def measure(func: Callable[[], int], min_time: float) -> dict:
+    """Calls func (which returns the number of operations it did) for at least min_time."""
+    ops = 0
+    elapsed = 0.0
+    while elapsed < min_time:
+        start = time.perf_counter()
+        ops += func()
+        elapsed += time.perf_counter() - start
+    return {"ops": ops, "ops_per_sec": ops / elapsed, "us_per_op": elapsed / ops * 1e6}
+
+
+def bench_hdlc_handler(nodes: int, min_time: float) -> dict:
+    stream = b"".join(hdlc_encode(event) for event in edge_events(nodes))
+    single_bytes = [bytes([byte]) for byte in stream]
+    frames = len(edge_events(nodes))
+
+    def run():
+        handler = HDLCHandler()
+        for byte in single_bytes:
+            handler.handle_byte(byte)
+            if handler.state == HDLCState.READY:
+                handler.payload
+        return frames
+
+    return measure(run, min_time)
+
+
+def bench_hdlc_stream_decoder(nodes: int, min_time: float) -> dict:
+    stream = b"".join(hdlc_encode(event) for event in edge_events(nodes))
+    chunks = [stream[pos : pos + READ_CHUNK_SIZE] for pos in range(0, len(stream), READ_CHUNK_SIZE)]
+
+    def run():
+        decoder = HDLCStreamDecoder()
+        return sum(len(decoder.feed(chunk)) for chunk in chunks)
+
+    return measure(run, min_time)
+
+
+def bench_frame_from_bytes(nodes: int, min_time: float) -> dict:
+    frames = [event[1:] for event in edge_events(nodes)]
+
+    def run():
+        for frame in frames:
+            Frame().from_bytes(frame).header.source
+        return len(frames)
+
+    return measure(run, min_time)
+
+
+def bench_frame_view(nodes: int, min_time: float) -> dict:
+    frames = [event[1:] for event in edge_events(nodes)]
+
+    def run():
+        for frame in frames:
+            FrameView(frame).header.source
+        return len(frames)
+
+    return measure(run, min_time)
+
+
+def bench_edge_handle_serial_data(nodes: int, min_time: float) -> dict:
+    mari = build_edge(nodes)
+    events = edge_events(nodes)
+
+    def run():
+        for event in events:
+            mari.handle_serial_data(event)
+        return len(events)
+
+    return measure(run, min_time)
+
+
+def bench_cloud_handle_mqtt_data(nodes: int, min_time: float) -> dict:
+    mari = build_cloud(nodes)
+    events = edge_events(nodes)
+
+    def run():
+        for event in events:
+            mari.handle_mqtt_data(event)
+        return len(events)
+
+    return measure(run, min_time)
+
+
+def bench_edge_send_frame(nodes: int, min_time: float) -> dict:
+    mari = build_edge(nodes)
+    addresses = node_addresses(nodes)
+
+    def run():
+        mari.serial_interface.output = io.BytesIO()
+        for address in addresses:
+            mari.send_frame(address, PAYLOAD)
+        return len(addresses)
+
+    return measure(run, min_time)
+
+
+def bench_tui_render(nodes: int, min_time: float) -> dict:
+    mari = build_edge(nodes)
+    console = Console(file=io.StringIO(), width=200, height=60, force_terminal=True)
+    mari.tui = MarilibTUIEdge(re_render_max_freq=0, console=console)
+
+    def run():
+        mari.render_tui()
+        return 1
+
+    result = measure(run, min_time)
+    mari.tui.live.stop()
+    return result
+
+
+def bench_gateway_update(nodes: int, min_time: float) -> dict:
+    """The main loop bookkeeping, with every node alive."""
+    mari = build_edge(nodes)
+    gateway = mari.gateway
+
+    def run():
+        gateway.update()
+        return 1
+
+    return measure(run, min_time)
+
+
+def bench_snapshot_publish(nodes: int, min_time: float) -> dict:
+    mari = build_edge(nodes)
+
+    def run():
+        mari.publish_snapshot(force=True)
+        return 1
+
+    return measure(run, min_time)
+
+
+def bench_logger_rows(nodes: int, min_time: float) -> dict:
+    mari = build_edge(nodes)
+    with tempfile.TemporaryDirectory() as log_dir:
+        logger = MetricsLogger(log_dir_base=log_dir)
+
+        gateway = mari.snapshot().gateways[0]
+
+        def run():
+            logger.log_gateway_metrics(gateway)
+            logger.log_all_nodes_metrics(gateway.nodes)
+            return 1 + nodes
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = measure(run, min_time)
+            logger.close()
+    return result
+
+
+BENCHMARKS = {
+    "hdlc_handler": bench_hdlc_handler,
+    "hdlc_stream_decoder": bench_hdlc_stream_decoder,
+    "frame_from_bytes": bench_frame_from_bytes,
+    "frame_view": bench_frame_view,
+    "edge_handle_serial_data": bench_edge_handle_serial_data,
+    "cloud_handle_mqtt_data": bench_cloud_handle_mqtt_data,
+    "edge_send_frame": bench_edge_send_frame,
+    "tui_render": bench_tui_render,
+    "gateway_update": bench_gateway_update,
+    "snapshot_publish": bench_snapshot_publish,
+    "logger_rows": bench_logger_rows,
+}
+
+
+# ============================ Reporting =======================================
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Prints the speedup of each benchmark, returns the regressions."""
+    regressions = []
+    print(f"\n{'benchmark':<26} {'nodes':>6} {'baseline/s':>12} {'current/s':>12} {'ratio':>7}")
+    for name, by_nodes in results["results"].items():
+        for nodes, result in by_nodes.items():
+            base = baseline["results"].get(name, {}).get(nodes)
+            if not base:
+                continue
+            ratio = result["ops_per_sec"] / base["ops_per_sec"]
+            flag = ""
+            if ratio < 1 - tolerance:
+                flag = "  REGRESSION"
+                regressions.append(f"{name}[{nodes}]")
+            print(
+                f"{name:<26} {nodes:>6} {base['ops_per_sec']:>12.0f} "
+                f"{result['ops_per_sec']:>12.0f} {ratio:>6.2f}x{flag}"
+            )
+    return regressions
+
+
+@click.command()
+@click.option(
+    "--nodes",
+    "-n",
+    default="10,100,1000",
+    show_default=True,
+    help="Comma separated numbers of simulated nodes",
+)
+@click.option(
+    "--benchmark",
+    "-b",
+    "selected",
+    multiple=True,
+    type=click.Choice(list(BENCHMARKS)),
+    help="Benchmark to run, can be repeated (default: all)",
+)
+@click.option(
+    "--min-time",
+    type=float,
+    default=0.5,
+    show_default=True,
+    help="Minimum measurement time per benchmark, in seconds",
+)
+@click.option("--output", "-o", type=click.Path(), help="Save the results to this JSON file")
+@click.option(
+    "--baseline",
+    type=click.Path(exists=True),
+    help="Compare the results with a JSON file saved by a previous run",
+)
+@click.option(
+    "--tolerance",
+    type=float,
+    default=0.1,
+    show_default=True,
+    help="Slowdown ratio, relative to the baseline, reported as a regression",
+)
+def main(nodes, selected, min_time, output, baseline, tolerance):
+    results = {
+        "marilib_version": marilib.__version__,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": {},
+    }
+    for name in selected or BENCHMARKS:
+        results["results"][name] = {}
+        for count in [int(count) for count in nodes.split(",")]:
+            result = BENCHMARKS[name](count, min_time)
+            results["results"][name][str(count)] = result
+            print(
+                f"{name:<26} {count:>6} nodes: {result['ops_per_sec']:>12.0f} ops/s "
+                f"{result['us_per_op']:>10.2f} us/op"
+            )
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to {output}")
+
+    if baseline:
+        with open(baseline) as f:
+            regressions = compare(results, json.load(f), tolerance)
+        if regressions:
+            print(f"\nRegressions: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
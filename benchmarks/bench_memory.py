@@ -0,0 +1,163 @@
+"""
+Memory retained per decoded frame, with the packet classes before and after
+class-level metadata and __slots__, and per node of a gateway.
+
+Usage:
+python -m benchmarks.bench_memory --frames 100000 --nodes 1000
+"""
+
+import dataclasses
+import gc
+import tracemalloc
+from dataclasses import dataclass
+
+import click
+
+from marilib.clock import VirtualClock
+from marilib.mari_protocol import Frame, FrameView, Header, HeaderStats
+from marilib.model import MariGateway
+from marilib.protocol import PacketFieldMetadata
+
+FRAME_BYTES = Frame(
+    Header(destination=0x0000000000000EEE, source=0x0000000000001000),
+    stats=HeaderStats(rssi=200),
+    payload=b"\x01" + bytes(range(20)),
+).to_bytes()
+
+
+# Baseline: the packet layout before class-level metadata and __slots__, where
+# every instance has a __dict__ and builds its own list of PacketFieldMetadata.
+
+
+@dataclass
+class BaselineHeaderStats:
+    metadata: list[PacketFieldMetadata] = dataclasses.field(
+        default_factory=lambda: [
+            PacketFieldMetadata(name="rssi", disp="rssi", length=1),
+        ]
+    )
+    rssi: int = 0
+
+
+@dataclass
+class BaselineHeader:
+    metadata: list[PacketFieldMetadata] = dataclasses.field(
+        default_factory=lambda: [
+            PacketFieldMetadata(name="version", disp="ver.", length=1),
+            PacketFieldMetadata(name="type_", disp="type", length=1),
+            PacketFieldMetadata(name="network_id", disp="net", length=2),
+            PacketFieldMetadata(name="destination", disp="dst", length=8),
+            PacketFieldMetadata(name="source", disp="src", length=8),
+        ]
+    )
+    version: int = 0
+    type_: int = 0
+    network_id: int = 0
+    destination: int = 0
+    source: int = 0
+
+
+@dataclass
+class BaselineFrame:
+    header: BaselineHeader = None
+    stats: BaselineHeaderStats = dataclasses.field(default_factory=BaselineHeaderStats)
+    payload: bytes = b""
+
+
+def baseline_from_bytes(bytes_: bytes) -> BaselineFrame:
+    """Decodes the frame, then copies it in the baseline layout."""
+    frame = Frame().from_bytes(bytes_)
+    header = frame.header
+    return BaselineFrame(
+        BaselineHeader(
+            version=header.version,
+            type_=header.type_,
+            network_id=header.network_id,
+            destination=header.destination,
+            source=header.source,
+        ),
+        BaselineHeaderStats(rssi=frame.stats.rssi),
+        frame.payload,
+    )
+
+
+def retained_bytes_per_frame(make_frame, frames: int) -> float:
+    """Bytes allocated, and still alive, per frame kept in a list."""
+    retained = []
+    gc.collect()
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    for _ in range(frames):
+        retained.append(make_frame())
+    gc.collect()
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(retained) == frames
+    return (end - start) / frames
+
+
+def retained_bytes_per_node(nodes: int, frames_per_node: int) -> float:
+    """Bytes allocated, and still alive, per node of a gateway, after receiving frames."""
+    gateway = MariGateway(clock=VirtualClock())
+    frame = Frame().from_bytes(FRAME_BYTES)
+    gc.collect()
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    for address in range(1, nodes + 1):
+        node = gateway.add_node(address)
+        for _ in range(frames_per_node):
+            node.register_received_frame(frame)
+            node.register_sent_frame(frame)
+        if frames_per_node:
+            node.stats.rssi_mean_dbm()  # adds the pending frames to the RSSI histograms
+    gc.collect()
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(gateway.node_registry) == nodes
+    return (end - start) / nodes
+
+
+BENCHMARKS = {
+    "baseline": lambda: baseline_from_bytes(FRAME_BYTES),
+    "frame_from_bytes": lambda: Frame().from_bytes(FRAME_BYTES),
+    "frame_view": lambda: FrameView(bytes(FRAME_BYTES)),
+}
+
+
+@click.command()
+@click.option(
+    "--frames",
+    "-f",
+    type=int,
+    default=100_000,
+    show_default=True,
+    help="Number of frames retained",
+)
+@click.option(
+    "--nodes",
+    "-n",
+    type=int,
+    default=1000,
+    show_default=True,
+    help="Number of nodes added to the gateway",
+)
+@click.option(
+    "--max-node-bytes",
+    type=int,
+    default=None,
+    help="Exit with an error code when a node that received frames retains more bytes",
+)
+def main(frames, nodes, max_node_bytes):
+    for name, make_frame in BENCHMARKS.items():
+        per_frame = retained_bytes_per_frame(make_frame, frames)
+        print(f"{name:<20} {per_frame:>8.0f} bytes per retained frame")
+    idle = retained_bytes_per_node(nodes, frames_per_node=0)
+    print(f"{'node_idle':<20} {idle:>8.0f} bytes per node")
+    active = retained_bytes_per_node(nodes, frames_per_node=10)
+    print(f"{'node_active':<20} {active:>8.0f} bytes per node, with sent and received frames")
+    if max_node_bytes is not None and active > max_node_bytes:
+        raise click.ClickException(f"{active:.0f} bytes per node, more than {max_node_bytes}")
+
+
+if __name__ == "__main__":
+    main()
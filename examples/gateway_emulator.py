@@ -0,0 +1,58 @@
+"""
+Runs a software Mari gateway with virtual nodes on a pseudo-terminal.
+
+Attach an edge to the printed port, for example:
+
+python examples/mari_edge.py -p /dev/pts/3 -i 1
+"""
+
+import time
+
+import click
+from marilib.emulator import GatewayEmulator
+from marilib.model import SCHEDULES
+
+
+@click.command()
+@click.option("--nodes", "-n", type=int, default=100, show_default=True, help="Number of nodes")
+@click.option(
+    "--schedule-id",
+    "-s",
+    type=click.Choice([str(schedule_id) for schedule_id in SCHEDULES]),
+    default="1",
+    show_default=True,
+    help="Schedule announced by the gateway",
+)
+@click.option(
+    "--rate",
+    "-r",
+    type=float,
+    default=1.0,
+    show_default=True,
+    help="Data frames per second sent by each node",
+)
+@click.option(
+    "--loss-rate",
+    type=float,
+    default=0.0,
+    show_default=True,
+    help="Probability of losing a frame on the radio link",
+)
+def main(nodes: int, schedule_id: str, rate: float, loss_rate: float):
+    emulator = GatewayEmulator(
+        num_nodes=nodes, schedule_id=int(schedule_id), data_rate=rate, loss_rate=loss_rate
+    )
+    emulator.start()
+    print(f"Gateway emulator with {nodes} nodes listening on {emulator.port}")
+    try:
+        while True:
+            time.sleep(1)
+            print(f"Frames sent: {emulator.frames_sent}, received: {emulator.frames_received}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        emulator.stop()
+
+
+if __name__ == "__main__":
+    main()
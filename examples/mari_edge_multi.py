@@ -0,0 +1,53 @@
+import time
+
+import click
+from marilib.communication_adapter import MQTTAdapter, SerialAdapter
+from marilib.marilib_edge_multi import MarilibEdgeMulti
+from marilib.model import EdgeEvent
+
+
+def on_event(event, event_data):
+    """An event handler for the application."""
+    if event == EdgeEvent.GATEWAY_INFO:
+        return
+    print(".", end="", flush=True)
+
+
+@click.command()
+@click.option(
+    "--port",
+    "-p",
+    "ports",
+    type=str,
+    multiple=True,
+    required=True,
+    help="Serial port of a gateway, repeat for each gateway (e.g., -p /dev/ttyACM0 -p /dev/ttyACM2)",
+)
+@click.option(
+    "--mqtt-url",
+    "-m",
+    type=str,
+    default=None,
+    help="MQTT broker to use (default: None, no cloud)",
+)
+def main(ports: tuple[str], mqtt_url: str):
+    """Drive several gateways from a single process."""
+    mari = MarilibEdgeMulti(
+        on_event,
+        serial_interfaces=[SerialAdapter(port) for port in ports],
+        mqtt_interface=MQTTAdapter.from_url(mqtt_url, is_edge=True) if mqtt_url else None,
+        main_file=__file__,
+    )
+
+    try:
+        while True:
+            mari.update()
+            for gateway in mari.gateways:
+                print(f"\nGateway {gateway.info.address:016X}: {len(gateway.nodes)} nodes")
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
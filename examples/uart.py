@@ -1,28 +1,19 @@
 import time
 
-from marilib.serial_hdlc import (
-    HDLCDecodeException,
-    HDLCHandler,
-    HDLCState,
-    hdlc_encode,
-)
+from marilib.serial_hdlc import HDLCStreamDecoder, hdlc_encode
 from marilib.serial_uart import SerialInterface
 
 BAUDRATE = 1000000
 
-hdlc_handler = HDLCHandler()
+hdlc_decoder = HDLCStreamDecoder()
 
 
-def on_byte_received(byte):
-    hdlc_handler.handle_byte(byte)
-    if hdlc_handler.state == HDLCState.READY:
-        try:
-            print(".", end="", flush=True)
-        except HDLCDecodeException as e:
-            print(f"Error decoding payload: {e}")
+def on_bytes_received(data):
+    for _ in hdlc_decoder.feed(data):
+        print(".", end="", flush=True)
 
 
-serial_interface = SerialInterface("/dev/ttyACM0", BAUDRATE, on_byte_received)
+serial_interface = SerialInterface("/dev/ttyACM0", BAUDRATE, on_bytes_received)
 
 
 while True:
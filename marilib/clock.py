@@ -0,0 +1,59 @@
+"""Time sources of marilib.
+
+Liveness, windowed stats, rate limiting and probe round trips use the
+monotonic time of a Clock, which never jumps when the wall clock is adjusted.
+Wall time is only used to timestamp logs.
+"""
+
+import time
+from datetime import datetime, timedelta
+
+
+class Clock:
+    """The system clock, based on time.monotonic_ns()."""
+
+    def now_ns(self) -> int:
+        """Returns the monotonic time, in nanoseconds."""
+        return time.monotonic_ns()
+
+    def now(self) -> float:
+        """Returns the monotonic time, in seconds."""
+        return self.now_ns() / 1e9
+
+    def now_us(self) -> int:
+        """Returns the monotonic time, in microseconds."""
+        return self.now_ns() // 1000
+
+    def wall_time(self) -> datetime:
+        """Returns the local wall time, for log timestamps."""
+        return datetime.now()
+
+
+class VirtualClock(Clock):
+    """A clock that only moves when advanced, for tests and simulations.
+
+    >>> clock = VirtualClock()
+    >>> clock.advance(1.5)
+    >>> clock.now(), clock.now_us()
+    (1.5, 1500000)
+    """
+
+    def __init__(self, start_ns: int = 0, wall_start: datetime | None = None):
+        self._now_ns = start_ns
+        self._start_ns = start_ns
+        self.wall_start = wall_start or datetime.now()
+
+    def now_ns(self) -> int:
+        return self._now_ns
+
+    def advance(self, seconds: float):
+        if seconds < 0:
+            raise ValueError("a clock cannot go back in time")
+        self._now_ns += round(seconds * 1e9)
+
+    def wall_time(self) -> datetime:
+        return self.wall_start + timedelta(microseconds=(self._now_ns - self._start_ns) // 1000)
+
+
+# default clock of the models, edges and clouds
+SYSTEM_CLOCK = Clock()
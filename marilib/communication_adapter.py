@@ -1,17 +1,30 @@
+import asyncio
 import base64
+import concurrent.futures
 from urllib.parse import urlparse
 import paho.mqtt.client as mqtt
+import serial
 
 from abc import ABC, abstractmethod
 from rich import print
 
-from marilib.serial_hdlc import (
-    HDLCDecodeException,
-    HDLCHandler,
-    HDLCState,
-    hdlc_encode,
+from marilib.serial_hdlc import HDLCStreamDecoder, hdlc_encode
+from marilib.serial_uart import (
+    SERIAL_DEFAULT_BAUDRATE,
+    SERIAL_PAYLOAD_CHUNK_DELAY,
+    SERIAL_READ_CHUNK_SIZE,
+    SERIAL_TRIGGER_BYTE_DELAY,
+    SERIAL_TX_COALESCE_MAX_SIZE,
+    SERIAL_TX_QUEUE_SIZE,
+    SerialInterface,
+    SerialReadCounters,
+    SerialTxOverflowPolicy,
+    SerialTxStats,
+    SerialWriter,
+    iter_chunks_with_trigger_byte,
 )
-from marilib.serial_uart import SerialInterface, SERIAL_DEFAULT_BAUDRATE
+
+ASYNC_SEND_TIMEOUT = 1  # seconds, for send_data called from outside the event loop
 
 
 class CommunicationAdapterBase(ABC):
@@ -29,34 +42,185 @@ class CommunicationAdapterBase(ABC):
 class SerialAdapter(CommunicationAdapterBase):
     """Class used to interface with the serial port."""
 
-    def __init__(self, port, baudrate=SERIAL_DEFAULT_BAUDRATE):
+    def __init__(
+        self,
+        port,
+        baudrate=SERIAL_DEFAULT_BAUDRATE,
+        read_chunk_size=SERIAL_READ_CHUNK_SIZE,
+        read_timeout=None,
+        tx_queue_size=SERIAL_TX_QUEUE_SIZE,
+        tx_overflow_policy=SerialTxOverflowPolicy.BLOCK,
+        tx_coalesce_max_size=SERIAL_TX_COALESCE_MAX_SIZE,
+    ):
+        self.port = port
+        self.baudrate = baudrate
+        self.read_chunk_size = read_chunk_size
+        self.read_timeout = read_timeout
+        self.tx_queue_size = tx_queue_size
+        self.tx_overflow_policy = tx_overflow_policy
+        self.tx_coalesce_max_size = tx_coalesce_max_size
+        self.hdlc_decoder = HDLCStreamDecoder()
+
+    def on_bytes_received(self, data: bytes):
+        for payload in self.hdlc_decoder.feed(data):
+            # print(f"Received payload: {payload.hex()}")
+            self.on_data_received(payload)
+
+    def init(self, on_data_received: callable):
+        self.on_data_received = on_data_received
+        self.serial = SerialInterface(
+            self.port,
+            self.baudrate,
+            self.on_bytes_received,
+            read_chunk_size=self.read_chunk_size,
+            read_timeout=self.read_timeout,
+        )
+        self.writer = SerialWriter(
+            self.serial,
+            queue_size=self.tx_queue_size,
+            overflow_policy=self.tx_overflow_policy,
+            coalesce_max_size=self.tx_coalesce_max_size,
+        )
+        print(f"[yellow]Connected to serial port {self.port} at {self.baudrate} baud[/]")
+
+    def close(self):
+        print("[yellow]Disconnect from gateway...[/]")
+        self.writer.stop()
+
+    def read_rates(self) -> tuple[float, float]:
+        """Returns the bytes and chunks read from the serial port per second."""
+        return self.serial.read_rates()
+
+    @property
+    def tx_queue_depth(self) -> int:
+        return self.writer.queue_depth
+
+    @property
+    def tx_stats(self) -> SerialTxStats:
+        return self.writer.stats
+
+    def send_data(self, data) -> bool:
+        """Queues data to be sent to the gateway, returns False if it was dropped."""
+        return self.writer.write(hdlc_encode(data))
+
+
+class AsyncSerialAdapter(CommunicationAdapterBase):
+    """Class used to interface with the serial port from an asyncio event loop.
+
+    Must be initialized from a running event loop. Data is read when the port is
+    readable (loop.add_reader, not supported by the Windows proactor event loop),
+    and frames are written by a task of the same loop, which runs the blocking
+    serial writes in the default executor.
+    """
+
+    def __init__(
+        self,
+        port,
+        baudrate=SERIAL_DEFAULT_BAUDRATE,
+        read_chunk_size=SERIAL_READ_CHUNK_SIZE,
+        tx_queue_size=SERIAL_TX_QUEUE_SIZE,
+        send_timeout=ASYNC_SEND_TIMEOUT,
+    ):
         self.port = port
         self.baudrate = baudrate
-        self.hdlc_handler = HDLCHandler()
-
-    def on_byte_received(self, byte):
-        self.hdlc_handler.handle_byte(byte)
-        if self.hdlc_handler.state == HDLCState.READY:
-            try:
-                payload = self.hdlc_handler.payload
-                # print(f"Received payload: {payload.hex()}")
-                self.on_data_received(payload)
-            except HDLCDecodeException as e:
-                print(f"Error decoding payload: {e}")
+        self.read_chunk_size = read_chunk_size
+        self.tx_queue_size = tx_queue_size
+        self.send_timeout = send_timeout
+        self.hdlc_decoder = HDLCStreamDecoder()
+        self.read_counters = SerialReadCounters()
+        self.tx_frames_dropped = 0
 
     def init(self, on_data_received: callable):
         self.on_data_received = on_data_received
-        self.serial = SerialInterface(self.port, self.baudrate, self.on_byte_received)
+        self.loop = asyncio.get_running_loop()
+        self.serial = serial.Serial(self.port, self.baudrate, timeout=0)
+        self.tx_queue = asyncio.Queue(maxsize=self.tx_queue_size)
+        self._tx_room = asyncio.Event()
+        self.loop.add_reader(self.serial.fileno(), self._on_readable)
+        self._writer_task = self.loop.create_task(self._run_writer())
         print(f"[yellow]Connected to serial port {self.port} at {self.baudrate} baud[/]")
 
     def close(self):
         print("[yellow]Disconnect from gateway...[/]")
+        self.loop.remove_reader(self.serial.fileno())
+        self._writer_task.cancel()
+        self.serial.close()
+
+    def read_rates(self) -> tuple[float, float]:
+        """Returns the bytes and chunks read from the serial port per second."""
+        return self.read_counters.rates()
+
+    @property
+    def tx_queue_depth(self) -> int:
+        return self.tx_queue.qsize()
+
+    def send_data(self, data) -> bool:
+        """
+        Queues data to be sent to the gateway, returns False if it was dropped.
+        Can be called from other threads (e.g. the MQTT client thread), which then
+        wait for the event loop to queue the data, at most send_timeout seconds.
+        """
+        encoded = hdlc_encode(data)
+        try:
+            in_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            in_loop = False
+        if in_loop:
+            return self._enqueue(encoded)
+        future = asyncio.run_coroutine_threadsafe(self._enqueue_async(encoded), self.loop)
+        try:
+            return future.result(self.send_timeout)
+        except concurrent.futures.TimeoutError:
+            if not future.cancel():
+                # queued by the loop just after the timeout
+                return future.result()
+            self.tx_frames_dropped += 1
+            return False
+
+    async def wait_for_room(self):
+        """Waits until the transmit queue can take a new frame."""
+        while self.tx_queue.full():
+            self._tx_room.clear()
+            await self._tx_room.wait()
+
+    async def _enqueue_async(self, encoded) -> bool:
+        return self._enqueue(encoded)
+
+    def _enqueue(self, encoded) -> bool:
+        try:
+            self.tx_queue.put_nowait(encoded)
+        except asyncio.QueueFull:
+            self.tx_frames_dropped += 1
+            return False
+        return True
 
-    def send_data(self, data):
-        with self.serial.lock:  # Use the existing lock for thread safety
-            self.serial.serial.flush()
-            encoded = hdlc_encode(data)
-            self.serial.write(encoded)
+    def _on_readable(self):
+        try:
+            data = self.serial.read(min(self.serial.in_waiting or 1, self.read_chunk_size))
+        except (TypeError, OSError, serial.serialutil.SerialException) as exc:
+            print(f"[red]Serial port disconnected: {exc}[/]")
+            self.loop.remove_reader(self.serial.fileno())
+            return
+        if not data:
+            return
+        self.read_counters.add(data)
+        for payload in self.hdlc_decoder.feed(data):
+            self.on_data_received(payload)
+
+    async def _run_writer(self):
+        while True:
+            encoded = await self.tx_queue.get()
+            self._tx_room.set()
+            for trigger_byte, chunk in iter_chunks_with_trigger_byte(encoded):
+                # writes block until the bytes are sent, so they run outside the loop
+                await self.loop.run_in_executor(None, self.serial.write, trigger_byte)
+                await asyncio.sleep(SERIAL_TRIGGER_BYTE_DELAY)
+                await self.loop.run_in_executor(None, self._write_chunk, chunk)
+                await asyncio.sleep(SERIAL_PAYLOAD_CHUNK_DELAY)
+
+    def _write_chunk(self, chunk: bytes):
+        self.serial.write(chunk)
+        self.serial.flush()
 
 
 class MQTTAdapter(CommunicationAdapterBase):
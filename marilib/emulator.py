@@ -0,0 +1,290 @@
+"""Software emulator of a Mari gateway, attached to a pseudo-terminal."""
+
+import heapq
+import logging
+import os
+import random
+import select
+import threading
+import time
+from dataclasses import dataclass
+
+from marilib.mari_protocol import (
+    MARI_BROADCAST_ADDRESS,
+    MARI_NET_ID_DEFAULT,
+    DefaultPayloadType,
+    Frame,
+    FrameView,
+    Header,
+    HeaderStats,
+    MetricsProbePayload,
+)
+from marilib.model import SCHEDULES, EdgeEvent, GatewayInfo, NodeInfoEdge
+from marilib.serial_hdlc import HDLCStreamDecoder, hdlc_encode
+
+EMULATOR_GATEWAY_ADDRESS = 0x0000000000000EEE
+EMULATOR_NODE_ADDRESS_BASE = 0x0000000000001000
+
+
+def _rssi_to_byte(rssi_dbm: int) -> int:
+    """Encodes an RSSI the way HeaderStats.rssi_dbm decodes it."""
+    return rssi_dbm + 255 if rssi_dbm < 0 else rssi_dbm
+
+
+@dataclass
+class EmulatedNode:
+    address: int
+    rssi_dbm: int = -50
+    gw_tx_count: int = 0
+    gw_rx_count: int = 0
+    node_tx_count: int = 0
+    node_rx_count: int = 0
+
+
+class GatewayEmulator:
+    """
+    Emulates a Mari gateway and its nodes behind a pseudo-terminal (POSIX only).
+
+    The emulator speaks the same HDLC / EdgeEvent serial protocol as the gateway
+    firmware, so MarilibEdge can attach to it unmodified, using the emulator port:
+
+        emulator = GatewayEmulator(num_nodes=100, data_rate=1)
+        emulator.start()
+        mari = MarilibEdge(on_event, SerialAdapter(emulator.port))
+
+    Frames written by the edge are reassembled as a stream, so the trigger byte
+    chunking of SerialInterface.write is transparent. Metrics probes sent to a node
+    are echoed back with the gateway and node counters filled in.
+    """
+
+    def __init__(
+        self,
+        num_nodes: int = 10,
+        schedule_id: int = 1,
+        data_rate: float = 1.0,
+        payload_size: int = 8,
+        gateway_address: int = EMULATOR_GATEWAY_ADDRESS,
+        network_id: int = MARI_NET_ID_DEFAULT,
+        gateway_info_period: float = 1.0,
+        keep_alive_period: float = 1.0,
+        probe_latency: float = 0.0,
+        loss_rate: float = 0.0,
+        seed: int | None = None,
+    ):
+        self.schedule_id = schedule_id
+        self.data_rate = data_rate  # NODE_DATA frames per second, per node
+        self.payload_size = payload_size
+        self.gateway_address = gateway_address
+        self.network_id = network_id
+        self.gateway_info_period = gateway_info_period
+        self.keep_alive_period = keep_alive_period
+        self.probe_latency = probe_latency
+        self.loss_rate = loss_rate
+        self.random = random.Random(seed)
+        self.nodes = {
+            address: EmulatedNode(address, rssi_dbm=self.random.randint(-90, -40))
+            for address in range(EMULATOR_NODE_ADDRESS_BASE, EMULATOR_NODE_ADDRESS_BASE + num_nodes)
+        }
+        self.frames_sent = 0
+        self.frames_received = 0
+        import tty  # POSIX only
+
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self._decoder = HDLCStreamDecoder()
+        self._schedule = []  # heap of (due time, sequence, action, args)
+        self._sequence = 0
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._threads = []
+        self._start_ts = time.monotonic()
+        self._logger = logging.getLogger(__name__)
+
+    @property
+    def port(self) -> str:
+        """Name of the serial port to open to talk to the emulator."""
+        return os.ttyname(self._slave)
+
+    @property
+    def asn(self) -> int:
+        schedule = SCHEDULES.get(self.schedule_id)
+        if not schedule:
+            return 0
+        slot_duration_s = schedule["sf_duration"] / len(schedule["slots"]) / 1000
+        return int((time.monotonic() - self._start_ts) / slot_duration_s)
+
+    def start(self):
+        """Starts emitting events: gateway info, node joins, keep-alives and data."""
+        self._start_ts = time.monotonic()
+        self._schedule_at(0, self._send_gateway_info)
+        for idx, node in enumerate(self.nodes.values()):
+            # spread joins and traffic over a second, like a real network would
+            offset = idx / len(self.nodes)
+            self._schedule_at(offset, self._send_node_event, EdgeEvent.NODE_JOINED, node.address)
+            self._schedule_at(offset, self._send_keep_alive, node.address)
+            if self.data_rate > 0:
+                self._schedule_at(offset + 1 / self.data_rate, self._send_node_data, node.address)
+        self._threads = [
+            threading.Thread(target=self._run_reader, daemon=True),
+            threading.Thread(target=self._run_scheduler, daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """Makes all nodes leave, then closes the pseudo-terminal."""
+        for address in list(self.nodes):
+            self.remove_node(address)
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify()
+        os.close(self._master)
+        os.close(self._slave)
+        for thread in self._threads:
+            thread.join()
+
+    def remove_node(self, address: int):
+        """Makes a node leave the network."""
+        if self.nodes.pop(address, None):
+            self._send_node_event(EdgeEvent.NODE_LEFT, address)
+
+    # ============================ Private methods =============================
+
+    def _schedule_at(self, delay: float, action, *args):
+        with self._condition:
+            self._sequence += 1
+            heapq.heappush(self._schedule, (time.monotonic() + delay, self._sequence, action, args))
+            self._condition.notify()
+
+    def _run_scheduler(self):
+        while not self._stop_event.is_set():
+            with self._condition:
+                if not self._schedule:
+                    self._condition.wait()
+                    continue
+                due, _, action, args = self._schedule[0]
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                heapq.heappop(self._schedule)
+            try:
+                action(*args)
+            except OSError:
+                # pseudo-terminal closed
+                break
+
+    def _run_reader(self):
+        while not self._stop_event.is_set():
+            try:
+                readable, _, _ = select.select([self._master], [], [], 0.1)
+                if not readable:
+                    continue
+                data = os.read(self._master, 4096)
+            except (OSError, ValueError):
+                break
+            if not data:
+                break
+            for payload in self._decoder.feed(data):
+                self._handle_downlink(payload)
+
+    def _write_event(self, event: EdgeEvent, data: bytes):
+        encoded = memoryview(hdlc_encode(EdgeEvent.to_bytes(event) + data))
+        with self._write_lock:
+            while encoded:
+                encoded = encoded[os.write(self._master, encoded) :]
+            self.frames_sent += 1
+
+    def _send_gateway_info(self):
+        info = GatewayInfo(
+            address=self.gateway_address,
+            network_id=self.network_id,
+            schedule_id=self.schedule_id,
+            schedule_stats=0,
+            asn=self.asn,
+        )
+        self._write_event(EdgeEvent.GATEWAY_INFO, info.to_bytes())
+        self._schedule_at(self.gateway_info_period, self._send_gateway_info)
+
+    def _send_node_event(self, event: EdgeEvent, address: int):
+        self._write_event(event, NodeInfoEdge(address=address).to_bytes())
+
+    def _send_keep_alive(self, address: int):
+        if address not in self.nodes:
+            return
+        self._send_node_event(EdgeEvent.NODE_KEEP_ALIVE, address)
+        self._schedule_at(self.keep_alive_period, self._send_keep_alive, address)
+
+    def _send_uplink(self, node: EmulatedNode, payload: bytes):
+        node.node_tx_count += 1
+        if self.random.random() < self.loss_rate:
+            return
+        node.gw_rx_count += 1
+        frame = Frame(
+            Header(
+                network_id=self.network_id, destination=self.gateway_address, source=node.address
+            ),
+            stats=HeaderStats(rssi=_rssi_to_byte(node.rssi_dbm)),
+            payload=payload,
+        )
+        self._write_event(EdgeEvent.NODE_DATA, frame.to_bytes())
+
+    def _send_node_data(self, address: int):
+        if not (node := self.nodes.get(address)):
+            return
+        payload = bytes([DefaultPayloadType.APPLICATION_DATA]) + bytes(
+            self.random.getrandbits(8) for _ in range(self.payload_size - 1)
+        )
+        self._send_uplink(node, payload)
+        self._schedule_at(1 / self.data_rate, self._send_node_data, address)
+
+    def _send_probe_echo(self, address: int, probe: MetricsProbePayload):
+        if not (node := self.nodes.get(address)):
+            return
+        probe.node_tx_count = node.node_tx_count + 1
+        probe.node_tx_enqueued_asn = self.asn
+        probe.node_tx_dequeued_asn = self.asn
+        probe.gw_rx_count = node.gw_rx_count + 1
+        probe.gw_rx_asn = self.asn
+        probe.rssi_at_gw = _rssi_to_byte(node.rssi_dbm)
+        self._send_uplink(node, probe.to_bytes())
+
+    def _handle_downlink(self, payload: bytes):
+        self.frames_received += 1
+        if len(payload) < 1 or payload[0] != EdgeEvent.NODE_DATA:
+            return
+        try:
+            frame = FrameView(memoryview(payload)[1:])
+        except ValueError:
+            return
+        destination = frame.header.destination
+        if destination == MARI_BROADCAST_ADDRESS:
+            destinations = list(self.nodes.values())
+        elif node := self.nodes.get(destination):
+            destinations = [node]
+        else:
+            return
+        received = []
+        for node in destinations:
+            node.gw_tx_count += 1
+            if self.random.random() < self.loss_rate:
+                continue
+            node.node_rx_count += 1
+            received.append(node)
+        if (
+            destination == MARI_BROADCAST_ADDRESS
+            or not received
+            or frame.payload_type != DefaultPayloadType.METRICS_PROBE
+        ):
+            return
+        # the node answers the probe, with the counters at its reception
+        node = destinations[0]
+        probe = MetricsProbePayload().from_bytes(frame.payload)
+        probe.gw_tx_count = node.gw_tx_count
+        probe.gw_tx_enqueued_asn = self.asn
+        probe.gw_tx_dequeued_asn = self.asn
+        probe.node_rx_count = node.node_rx_count
+        probe.node_rx_asn = self.asn
+        probe.rssi_at_node = _rssi_to_byte(node.rssi_dbm)
+        self._schedule_at(self.probe_latency, self._send_probe_echo, node.address, probe)
@@ -0,0 +1,128 @@
+"""Columnar decoding of many frames at once, to NumPy structured arrays.
+
+Requires the optional numpy dependency (pip install marilib-pkg[numpy]).
+"""
+
+import struct
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+from marilib.mari_protocol import FRAME_PAYLOAD_OFFSET, HEADER_SIZE
+
+# columns of the decoded frames, all little endian
+FRAME_BATCH_FIELDS = [
+    ("version", "u1"),
+    ("type_", "u1"),
+    ("network_id", "<u2"),
+    ("destination", "<u8"),
+    ("source", "<u8"),
+    ("rssi", "u1"),
+    ("rssi_dbm", "<i2"),
+    ("payload_offset", "<i8"),  # in FrameBatch.buffer
+    ("payload_length", "<i8"),
+    ("payload_type", "u1"),  # 0 if the payload is empty
+]
+_LENGTH_PREFIX_STRUCTS = {
+    size: struct.Struct(f"<{c}") for size, c in [(1, "B"), (2, "H"), (4, "I")]
+}
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError as exc:
+        raise ImportError(
+            "numpy is required for batch frame decoding: pip install marilib-pkg[numpy]"
+        ) from exc
+    return numpy
+
+
+@dataclass
+class FrameBatch:
+    """Frames decoded as columns, with the raw bytes they point to.
+
+    Filters are plain NumPy expressions on the records, e.g. the frames of a node
+    received with a RSSI below -80 dBm:
+
+        records = batch.records
+        weak = records[(records["source"] == address) & (records["rssi_dbm"] < -80)]
+    """
+
+    records: Any  # numpy structured array, with FRAME_BATCH_FIELDS columns
+    buffer: bytes
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def payload(self, index: int) -> bytes:
+        offset = int(self.records["payload_offset"][index])
+        return self.buffer[offset : offset + int(self.records["payload_length"][index])]
+
+
+def _gather(np, buffer, offsets, dtype: str):
+    """Reads one little endian integer at each offset of buffer."""
+    size = np.dtype(dtype).itemsize
+    if size == 1:
+        return buffer[offsets]
+    return buffer[offsets[:, None] + np.arange(size)].view(dtype).ravel()
+
+
+def _decode(buffer: bytes, starts, lengths) -> FrameBatch:
+    np = _numpy()
+    if len(lengths) and lengths.min() < HEADER_SIZE:
+        raise ValueError("Frame is too short to contain a header")
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    records = np.zeros(len(starts), dtype=FRAME_BATCH_FIELDS)
+    records["version"] = _gather(np, data, starts, "u1")
+    records["type_"] = _gather(np, data, starts + 1, "u1")
+    records["network_id"] = _gather(np, data, starts + 2, "<u2")
+    records["destination"] = _gather(np, data, starts + 4, "<u8")
+    records["source"] = _gather(np, data, starts + 12, "<u8")
+
+    has_stats = lengths > HEADER_SIZE
+    rssi = records["rssi"]
+    rssi[has_stats] = data[starts[has_stats] + HEADER_SIZE]
+    records["rssi_dbm"] = np.where(rssi > 127, rssi.astype(np.int16) - 255, rssi)
+
+    records["payload_offset"] = starts + np.minimum(lengths, FRAME_PAYLOAD_OFFSET)
+    records["payload_length"] = np.maximum(lengths - FRAME_PAYLOAD_OFFSET, 0)
+    has_payload = records["payload_length"] > 0
+    records["payload_type"][has_payload] = data[records["payload_offset"][has_payload]]
+    return FrameBatch(records=records, buffer=buffer)
+
+
+def decode_frames(frames: Iterable[bytes]) -> FrameBatch:
+    """Decodes frames, each one as returned by Frame.to_bytes, to a FrameBatch."""
+    np = _numpy()
+    frames = [bytes(frame) for frame in frames]
+    lengths = np.fromiter((len(frame) for frame in frames), dtype=np.int64, count=len(frames))
+    starts = np.cumsum(lengths) - lengths
+    return _decode(b"".join(frames), starts, lengths)
+
+
+def decode_frames_buffer(buffer, length_size: int = 2) -> FrameBatch:
+    """Decodes consecutive frames, each prefixed by its little endian length, to a FrameBatch."""
+    np = _numpy()
+    if length_size not in _LENGTH_PREFIX_STRUCTS:
+        raise ValueError(f"Unsupported length prefix size: {length_size}")
+    length_struct = _LENGTH_PREFIX_STRUCTS[length_size]
+    buffer = bytes(buffer)
+    starts, lengths = [], []
+    offset = 0
+    while offset < len(buffer):
+        if len(buffer) - offset < length_size:
+            raise ValueError("Truncated frame length")
+        (length,) = length_struct.unpack_from(buffer, offset)
+        offset += length_size
+        if len(buffer) - offset < length:
+            raise ValueError("Truncated frame")
+        starts.append(offset)
+        lengths.append(length)
+        offset += length
+    return _decode(buffer, np.array(starts, dtype=np.int64), np.array(lengths, dtype=np.int64))
+
+
+def encode_frames_buffer(frames: Iterable[bytes], length_size: int = 2) -> bytes:
+    """Concatenates frames, each prefixed by its little endian length."""
+    length_struct = _LENGTH_PREFIX_STRUCTS[length_size]
+    return b"".join(length_struct.pack(len(frame)) + bytes(frame) for frame in frames)
@@ -1,10 +1,12 @@
 import csv
 import os
+import threading
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import IO, List, Dict
+from typing import IO, Dict, Sequence
 
-from marilib.model import MariGateway, MariNode
+from marilib.clock import SYSTEM_CLOCK, Clock
+from marilib.snapshot import GatewaySnapshot, NodeSnapshot
 
 
 @dataclass
@@ -17,16 +19,20 @@ class MetricsLogger:
     rotation_interval_minutes: int = 1440  # 1 day
     already_logged_setup_parameters: bool = False
     log_interval_seconds: float = 1.0
-    last_log_time: Dict[int, datetime] = field(default_factory=dict)
+    last_log_time: Dict[int, float] = field(default_factory=dict)  # clock.now(), by gateway
+    # rotation and log intervals use the monotonic time of the clock, rows its wall time
+    clock: Clock = field(default=SYSTEM_CLOCK, repr=False)
 
     def __post_init__(self):
         """
         Initializes the logger with rotation and setup logging capabilities.
         """
+        # events can be logged from the threads of several gateways
+        self._events_lock = threading.Lock()
         try:
             self.rotation_interval = timedelta(minutes=self.rotation_interval_minutes)
 
-            self.start_time = datetime.now()
+            self.start_time = self.clock.wall_time()
             self.run_timestamp = self.start_time.strftime("%Y%m%d_%H%M%S")
             self.log_dir = os.path.join(self.log_dir_base, f"run_{self.run_timestamp}")
             os.makedirs(self.log_dir, exist_ok=True)
@@ -38,6 +44,7 @@ class MetricsLogger:
             self._nodes_writer = None
             self._events_writer = None
             self.segment_start_time: datetime | None = None
+            self.segment_start_ts = 0.0  # clock.now() of the segment start
 
             # Open events log file
             events_path = os.path.join(self.log_dir, "log_events.csv")
@@ -54,6 +61,18 @@ class MetricsLogger:
             print(f"Error: Failed to initialize logger: {e}")
             self.active = False
 
+    def use_clock(self, clock: Clock):
+        """Switches to the clock of the edge or cloud the logger is attached to.
+
+        The current segment and the log intervals restart at clock.now(), as the
+        times taken with the previous clock can't be compared to the new ones.
+        """
+        if clock is self.clock:
+            return
+        self.clock = clock
+        self.segment_start_ts = clock.now()
+        self.last_log_time.clear()
+
     def log_setup_parameters(self, params: Dict[str, any] | None):
         """Creates and writes test setup parameters to metrics_setup.csv."""
         if not params or self.already_logged_setup_parameters:
@@ -72,7 +91,8 @@ class MetricsLogger:
     def _open_new_segment(self):
         self._close_segment_files()
 
-        self.segment_start_time = datetime.now()
+        self.segment_start_time = self.clock.wall_time()
+        self.segment_start_ts = self.clock.now()
         segment_ts = self.segment_start_time.strftime("%H%M%S")
 
         gateway_path = os.path.join(self.log_dir, f"gateway_metrics_{segment_ts}.csv")
@@ -96,6 +116,12 @@ class MetricsLogger:
             "latest_node_rx_count",
             "latest_gw_tx_count",
             "latest_gw_rx_count",
+            "p50_latency_edge_ms",
+            "p95_latency_edge_ms",
+            "p99_latency_edge_ms",
+            "p50_latency_cloud_ms",
+            "p95_latency_cloud_ms",
+            "p99_latency_cloud_ms",
         ]
         self._gateway_writer.writerow(gateway_header)
 
@@ -120,11 +146,20 @@ class MetricsLogger:
             "avg_latency_cloud_ms",
             "last_latency_edge_ms",
             "last_latency_cloud_ms",
+            "p50_latency_edge_ms",
+            "p95_latency_edge_ms",
+            "p99_latency_edge_ms",
+            "p50_latency_cloud_ms",
+            "p95_latency_cloud_ms",
+            "p99_latency_cloud_ms",
+            "rssi_mean_1min_dbm",
+            "rssi_stddev_1min_dbm",
+            "rssi_trend_db",
         ]
         self._nodes_writer.writerow(nodes_header)
 
     def _check_for_rotation(self):
-        if datetime.now() - self.segment_start_time >= self.rotation_interval:
+        if self.clock.now() - self.segment_start_ts >= self.rotation_interval.total_seconds():
             self._open_new_segment()
 
     def _log_common(self):
@@ -133,63 +168,72 @@ class MetricsLogger:
         self._check_for_rotation()
         return True
 
-    def log_periodic_metrics(self, gateway: MariGateway, nodes: List[MariNode]):
-        last_log_time = self.last_log_time.get(gateway.info.address, self.segment_start_time)
-        if datetime.now() - last_log_time >= timedelta(seconds=self.log_interval_seconds):
+    def log_periodic_metrics(self, gateway: GatewaySnapshot):
+        """Logs the metrics of the gateway and its nodes, at most every log_interval_seconds."""
+        now = self.clock.now()
+        last_log_time = self.last_log_time.get(gateway.info.address, self.segment_start_ts)
+        if now - last_log_time >= self.log_interval_seconds:
             self.log_gateway_metrics(gateway)
-            self.log_all_nodes_metrics(nodes)
-            self.last_log_time[gateway.info.address] = datetime.now()
+            self.log_all_nodes_metrics(gateway.nodes)
+            self.last_log_time[gateway.info.address] = now
 
-    def log_gateway_metrics(self, gateway: MariGateway):
+    def log_gateway_metrics(self, gateway: GatewaySnapshot):
         if not self._log_common() or self._gateway_writer is None:
             return
 
-        timestamp = datetime.now().isoformat()
+        timestamp = self.clock.wall_time().isoformat()
         row = [
             timestamp,
             f"0x{gateway.info.address:016X}",
             gateway.info.schedule_id,
             len(gateway.nodes),
-            # gateway.stats.sent_count(include_test_packets=False),
-            # gateway.stats.received_count(include_test_packets=False),
-            # gateway.stats.sent_count(1, include_test_packets=False),
-            # gateway.stats.received_count(1, include_test_packets=False),
-            f"{gateway.stats_avg_latency_roundtrip_node_edge_ms():.2f}",
-            f"{gateway.stats_avg_pdr_downlink_radio():.2f}",
-            f"{gateway.stats_avg_pdr_uplink_radio():.2f}",
-            gateway.stats_latest_node_tx_count(),
-            gateway.stats_latest_node_rx_count(),
-            gateway.stats_latest_gw_tx_count(),
-            gateway.stats_latest_gw_rx_count(),
+            # gateway.sent_count,
+            # gateway.received_count,
+            # gateway.sent_rate,
+            # gateway.received_rate,
+            f"{gateway.avg_latency_roundtrip_node_edge_ms:.2f}",
+            f"{gateway.avg_pdr_downlink_radio:.2f}",
+            f"{gateway.avg_pdr_uplink_radio:.2f}",
+            gateway.latest_node_tx_count,
+            gateway.latest_node_rx_count,
+            gateway.latest_gw_tx_count,
+            gateway.latest_gw_rx_count,
+            *(f"{latency:.2f}" for latency in gateway.latency_roundtrip_node_edge_ms_percentiles),
+            *(f"{latency:.2f}" for latency in gateway.latency_roundtrip_node_cloud_ms_percentiles),
         ]
         self._gateway_writer.writerow(row)
 
-    def log_all_nodes_metrics(self, nodes: List[MariNode]):
+    def log_all_nodes_metrics(self, nodes: Sequence[NodeSnapshot]):
         """Writes metrics for all nodes, handling rotation."""
         if not self._log_common() or self._nodes_writer is None:
             return
 
-        timestamp = datetime.now().isoformat()
+        timestamp = self.clock.wall_time().isoformat()
         for node in nodes:
             row = [
                 timestamp,
                 f"0x{node.gateway_address:016X}",
                 f"0x{node.address:016X}",
                 node.is_alive,
-                # node.stats.sent_count(include_test_packets=False),
-                # node.stats.received_count(include_test_packets=False),
-                # node.stats.sent_count(1, include_test_packets=False),
-                # node.stats.received_count(1, include_test_packets=False),
-                f"{node.stats.success_rate(30):.2%}",
-                f"{node.stats.success_rate():.2%}",
+                # node.sent_count,
+                # node.received_count,
+                # node.sent_rate,
+                # node.received_rate,
+                f"{node.success_rate_30s:.2%}",
+                f"{node.success_rate:.2%}",
                 f"{node.pdr_downlink:.2%}",
                 f"{node.pdr_uplink:.2%}",
-                node.stats_rssi_node_dbm(),
-                node.stats_rssi_gw_dbm(),
-                f"{node.stats_avg_latency_roundtrip_node_edge_ms():.2f}",
-                f"{node.stats_avg_latency_roundtrip_node_edge_ms():.2f}",  # FIXME!: should use cloud option
-                f"{node.stats_latest_latency_roundtrip_node_edge_ms():.2f}",
-                f"{node.stats_latest_latency_roundtrip_node_edge_ms():.2f}",  # FIXME!: should use cloud option
+                node.rssi_node_dbm,
+                node.rssi_gw_dbm,
+                f"{node.avg_latency_roundtrip_node_edge_ms:.2f}",
+                f"{node.avg_latency_roundtrip_node_edge_ms:.2f}",  # FIXME!: should use cloud option
+                f"{node.latest_latency_roundtrip_node_edge_ms:.2f}",
+                f"{node.latest_latency_roundtrip_node_edge_ms:.2f}",  # FIXME!: should use cloud option
+                *(f"{latency:.2f}" for latency in node.latency_roundtrip_node_edge_ms_percentiles),
+                *(f"{latency:.2f}" for latency in node.latency_roundtrip_node_cloud_ms_percentiles),
+                f"{node.rssi_mean_dbm:.1f}",
+                f"{node.rssi_stddev_dbm:.1f}",
+                f"{node.rssi_trend_db:.1f}",
             ]
             self._nodes_writer.writerow(row)
 
@@ -200,7 +244,7 @@ class MetricsLogger:
         if not self.active or self._events_writer is None:
             return
 
-        timestamp = datetime.now().isoformat()
+        timestamp = self.clock.wall_time().isoformat()
         row = [
             timestamp,
             f"0x{gateway_address:016X}",
@@ -208,9 +252,10 @@ class MetricsLogger:
             event_name,
             event_tag,
         ]
-        self._events_writer.writerow(row)
-        if self._events_file:
-            self._events_file.flush()
+        with self._events_lock:
+            self._events_writer.writerow(row)
+            if self._events_file:
+                self._events_file.flush()
 
     def _close_segment_files(self):
         if self._gateway_file and not self._gateway_file.closed:
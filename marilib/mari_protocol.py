@@ -1,6 +1,8 @@
 import dataclasses
+import struct
 from dataclasses import dataclass
 from enum import IntEnum
+from typing import Any, Callable, ClassVar
 
 from marilib.protocol import Packet, PacketFieldMetadata, PacketType
 
@@ -20,46 +22,42 @@ class DefaultPayloadType(IntEnum):
         return bytes([self.value])
 
 
-@dataclass
+@dataclass(slots=True)
 class DefaultPayload(Packet):
-    metadata: list[PacketFieldMetadata] = dataclasses.field(
-        default_factory=lambda: [
-            PacketFieldMetadata(name="type", length=1),
-        ]
-    )
+    metadata: ClassVar[list[PacketFieldMetadata]] = [
+        PacketFieldMetadata(name="type", length=1),
+    ]
     type_: DefaultPayloadType = DefaultPayloadType.APPLICATION_DATA
 
     def with_filler_bytes(self, length: int) -> bytes:
         return self.to_bytes() + bytes([0xF1] * length)
 
 
-@dataclass
+@dataclass(slots=True)
 class MetricsProbePayload(Packet):
-    metadata: list[PacketFieldMetadata] = dataclasses.field(
-        default_factory=lambda: [
-            PacketFieldMetadata(name="type", length=1),
-            PacketFieldMetadata(name="cloud_tx_ts_us", length=8),
-            PacketFieldMetadata(name="cloud_rx_ts_us", length=8),
-            PacketFieldMetadata(name="cloud_tx_count", length=4),
-            PacketFieldMetadata(name="cloud_rx_count", length=4),
-            PacketFieldMetadata(name="edge_tx_ts_us", length=8),
-            PacketFieldMetadata(name="edge_rx_ts_us", length=8),
-            PacketFieldMetadata(name="edge_tx_count", length=4),
-            PacketFieldMetadata(name="edge_rx_count", length=4),
-            PacketFieldMetadata(name="gw_tx_count", length=4),
-            PacketFieldMetadata(name="gw_rx_count", length=4),
-            PacketFieldMetadata(name="gw_rx_asn", length=8),
-            PacketFieldMetadata(name="gw_tx_enqueued_asn", length=8),
-            PacketFieldMetadata(name="gw_tx_dequeued_asn", length=8),
-            PacketFieldMetadata(name="node_rx_count", length=4),
-            PacketFieldMetadata(name="node_tx_count", length=4),
-            PacketFieldMetadata(name="node_rx_asn", length=8),
-            PacketFieldMetadata(name="node_tx_enqueued_asn", length=8),
-            PacketFieldMetadata(name="node_tx_dequeued_asn", length=8),
-            PacketFieldMetadata(name="rssi_at_node", length=1),
-            PacketFieldMetadata(name="rssi_at_gw", length=1),
-        ]
-    )
+    metadata: ClassVar[list[PacketFieldMetadata]] = [
+        PacketFieldMetadata(name="type", length=1),
+        PacketFieldMetadata(name="cloud_tx_ts_us", length=8),
+        PacketFieldMetadata(name="cloud_rx_ts_us", length=8),
+        PacketFieldMetadata(name="cloud_tx_count", length=4),
+        PacketFieldMetadata(name="cloud_rx_count", length=4),
+        PacketFieldMetadata(name="edge_tx_ts_us", length=8),
+        PacketFieldMetadata(name="edge_rx_ts_us", length=8),
+        PacketFieldMetadata(name="edge_tx_count", length=4),
+        PacketFieldMetadata(name="edge_rx_count", length=4),
+        PacketFieldMetadata(name="gw_tx_count", length=4),
+        PacketFieldMetadata(name="gw_rx_count", length=4),
+        PacketFieldMetadata(name="gw_rx_asn", length=8),
+        PacketFieldMetadata(name="gw_tx_enqueued_asn", length=8),
+        PacketFieldMetadata(name="gw_tx_dequeued_asn", length=8),
+        PacketFieldMetadata(name="node_rx_count", length=4),
+        PacketFieldMetadata(name="node_tx_count", length=4),
+        PacketFieldMetadata(name="node_rx_asn", length=8),
+        PacketFieldMetadata(name="node_tx_enqueued_asn", length=8),
+        PacketFieldMetadata(name="node_tx_dequeued_asn", length=8),
+        PacketFieldMetadata(name="rssi_at_node", length=1),
+        PacketFieldMetadata(name="rssi_at_gw", length=1),
+    ]
     type_: DefaultPayloadType = DefaultPayloadType.METRICS_PROBE
     cloud_tx_ts_us: int = 0
     cloud_rx_ts_us: int = 0
@@ -170,48 +168,146 @@ class MetricsProbePayload(Packet):
         return self.rssi_at_gw
 
     def __repr__(self):
-        rep = dataclasses.asdict(self)
-        rep.pop("metadata", None)
-        return f"{rep}"
+        return f"{dataclasses.asdict(self)}"
 
 
-@dataclass
+@dataclass(slots=True)
 class MetricsRequestPayload(Packet):
-    metadata: list[PacketFieldMetadata] = dataclasses.field(
-        default_factory=lambda: [
-            PacketFieldMetadata(name="type", length=1),
-            PacketFieldMetadata(name="timestamp_us", length=8),
-        ]
-    )
+    metadata: ClassVar[list[PacketFieldMetadata]] = [
+        PacketFieldMetadata(name="type", length=1),
+        PacketFieldMetadata(name="timestamp_us", length=8),
+    ]
     type_: DefaultPayloadType = DefaultPayloadType.METRICS_REQUEST
     timestamp_us: int = 0
 
 
-@dataclass
+@dataclass(slots=True)
 class MetricsResponsePayload(Packet):
-    metadata: list[PacketFieldMetadata] = dataclasses.field(
-        default_factory=lambda: [
-            PacketFieldMetadata(name="type", length=1),
-            PacketFieldMetadata(name="timestamp_us", length=8),
-            PacketFieldMetadata(name="rx_count", length=4),
-            PacketFieldMetadata(name="tx_count", length=4),
-        ]
-    )
+    metadata: ClassVar[list[PacketFieldMetadata]] = [
+        PacketFieldMetadata(name="type", length=1),
+        PacketFieldMetadata(name="timestamp_us", length=8),
+        PacketFieldMetadata(name="rx_count", length=4),
+        PacketFieldMetadata(name="tx_count", length=4),
+    ]
     type_: DefaultPayloadType = DefaultPayloadType.METRICS_RESPONSE
     timestamp_us: int = 0
     rx_count: int = 0
     tx_count: int = 0
 
 
-@dataclass
+@dataclass(slots=True)
+class PayloadTypeInfo:
+    """How uplink frames of a payload type (first payload byte) are handled."""
+
+    payload_type: int | None = None
+    name: str = "UNKNOWN"
+    # test traffic is counted apart and not passed to the application
+    is_test: bool = False
+    # called when the frame is received, with the lock held: handler(frame, gateway, node)
+    handler: Callable[[Any, Any, Any], None] | None = None
+    # decodes the payload bytes, only called on demand (see PayloadTypeRegistry.decode)
+    decoder: Callable[[bytes], Any] | None = None
+
+
+_UNKNOWN_PAYLOAD_TYPE = PayloadTypeInfo()
+
+
+class PayloadTypeRegistry:
+    """Payload types, looked up by the first byte of the payload.
+
+    >>> registry = PayloadTypeRegistry()
+    >>> _ = registry.register(0x42, name="TEMPERATURE", decoder=lambda payload: payload[1])
+    >>> registry.get(0x42).name, registry.get(0x43).name
+    ('TEMPERATURE', 'UNKNOWN')
+    >>> registry.decode(b"\\x42\\x15")
+    21
+    """
+
+    def __init__(self):
+        self._types: list[PayloadTypeInfo] = [_UNKNOWN_PAYLOAD_TYPE] * 256
+
+    def register(
+        self,
+        payload_type: int,
+        name: str = "",
+        is_test: bool = False,
+        handler: Callable[[Any, Any, Any], None] | None = None,
+        decoder: Callable[[bytes], Any] | None = None,
+    ) -> PayloadTypeInfo:
+        """Registers a payload type, replacing any previous registration."""
+        if not 0 <= payload_type <= 0xFF:
+            raise ValueError(f"Invalid payload type: {payload_type}")
+        info = PayloadTypeInfo(
+            payload_type=payload_type,
+            name=name or f"0x{payload_type:02X}",
+            is_test=is_test,
+            handler=handler,
+            decoder=decoder,
+        )
+        self._types[payload_type] = info
+        return info
+
+    def set_handler(self, payload_type: int, handler: Callable[[Any, Any, Any], None] | None):
+        """Sets the handler of a registered payload type."""
+        info = self.get(payload_type)
+        if info.payload_type is None:
+            raise ValueError(f"Unknown payload type: {payload_type}")
+        info.handler = handler
+
+    def get(self, payload_type: int | None) -> PayloadTypeInfo:
+        if payload_type is None:
+            return _UNKNOWN_PAYLOAD_TYPE
+        return self._types[payload_type]
+
+    def decode(self, payload: bytes) -> Any:
+        """Decodes a payload with the decoder of its type, None if there is none."""
+        decoder = self.get(payload[0] if payload else None).decoder
+        return decoder(payload) if decoder else None
+
+    def copy(self) -> "PayloadTypeRegistry":
+        registry = PayloadTypeRegistry()
+        registry._types = [
+            dataclasses.replace(info) if info.payload_type is not None else info
+            for info in self._types
+        ]
+        return registry
+
+
+def _decoder(packet_class):
+    return lambda payload: packet_class().from_bytes(payload)
+
+
+# default payload types, copied by each MarilibEdge and MarilibCloud
+PAYLOAD_TYPES = PayloadTypeRegistry()
+PAYLOAD_TYPES.register(DefaultPayloadType.APPLICATION_DATA, "APPLICATION_DATA")
+PAYLOAD_TYPES.register(
+    DefaultPayloadType.METRICS_REQUEST,
+    "METRICS_REQUEST",
+    is_test=True,
+    decoder=_decoder(MetricsRequestPayload),
+)
+PAYLOAD_TYPES.register(
+    DefaultPayloadType.METRICS_RESPONSE,
+    "METRICS_RESPONSE",
+    is_test=True,
+    decoder=_decoder(MetricsResponsePayload),
+)
+PAYLOAD_TYPES.register(DefaultPayloadType.METRICS_LOAD, "METRICS_LOAD", is_test=True)
+PAYLOAD_TYPES.register(
+    DefaultPayloadType.METRICS_PROBE,
+    "METRICS_PROBE",
+    is_test=True,
+    decoder=_decoder(MetricsProbePayload),
+)
+
+
+@dataclass(slots=True)
 class HeaderStats(Packet):
     """Dataclass that holds MAC header stats."""
 
-    metadata: list[PacketFieldMetadata] = dataclasses.field(
-        default_factory=lambda: [
-            PacketFieldMetadata(name="rssi", disp="rssi", length=1),
-        ]
-    )
+    metadata: ClassVar[list[PacketFieldMetadata]] = [
+        PacketFieldMetadata(name="rssi", disp="rssi", length=1),
+    ]
     rssi: int = 0
 
     @property
@@ -221,19 +317,17 @@ class HeaderStats(Packet):
         return self.rssi
 
 
-@dataclass
+@dataclass(slots=True)
 class Header(Packet):
     """Dataclass that holds MAC header fields."""
 
-    metadata: list[PacketFieldMetadata] = dataclasses.field(
-        default_factory=lambda: [
-            PacketFieldMetadata(name="version", disp="ver.", length=1),
-            PacketFieldMetadata(name="type_", disp="type", length=1),
-            PacketFieldMetadata(name="network_id", disp="net", length=2),
-            PacketFieldMetadata(name="destination", disp="dst", length=8),
-            PacketFieldMetadata(name="source", disp="src", length=8),
-        ]
-    )
+    metadata: ClassVar[list[PacketFieldMetadata]] = [
+        PacketFieldMetadata(name="version", disp="ver.", length=1),
+        PacketFieldMetadata(name="type_", disp="type", length=1),
+        PacketFieldMetadata(name="network_id", disp="net", length=2),
+        PacketFieldMetadata(name="destination", disp="dst", length=8),
+        PacketFieldMetadata(name="source", disp="src", length=8),
+    ]
     version: int = MARI_PROTOCOL_VERSION
     type_: int = PacketType.DATA
     network_id: int = MARI_NET_ID_DEFAULT
@@ -245,13 +339,17 @@ class Header(Packet):
         return f"Header(version={self.version}, type_={type_}, network_id=0x{self.network_id:04x}, destination=0x{self.destination:016x}, source=0x{self.source:016x})"
 
 
-@dataclass
+@dataclass(slots=True)
 class Frame:
     """Data class that holds a payload packet."""
 
     header: Header = None
     stats: HeaderStats = dataclasses.field(default_factory=HeaderStats)
     payload: bytes = b""
+    # payload types of the MarilibEdge or MarilibCloud that handles the frame
+    _registry: PayloadTypeRegistry | None = dataclasses.field(
+        default=None, init=False, repr=False, compare=False
+    )
 
     def from_bytes(self, bytes_):
         self.header = Header().from_bytes(bytes_[0:20])
@@ -266,20 +364,182 @@ class Frame:
         stats_bytes = self.stats.to_bytes(byteorder)
         return header_bytes + stats_bytes + self.payload
 
+    @property
+    def payload_type(self) -> int | None:
+        return self.payload[0] if self.payload else None
+
+    def classify(self, registry: PayloadTypeRegistry = PAYLOAD_TYPES) -> PayloadTypeInfo:
+        """Looks up the payload type in registry, which is kept for the next lookups."""
+        self._registry = registry
+        return registry.get(self.payload_type)
+
+    @property
+    def payload_info(self) -> PayloadTypeInfo:
+        return (self._registry or PAYLOAD_TYPES).get(self.payload_type)
+
     @property
     def is_test_packet(self) -> bool:
-        """Returns True if either the payload is a metrics response, request, or load test packet."""
-        return (
-            self.payload.startswith(DefaultPayloadType.METRICS_RESPONSE.as_bytes())
-            or self.payload.startswith(DefaultPayloadType.METRICS_REQUEST.as_bytes())
-            or self.payload.startswith(DefaultPayloadType.METRICS_LOAD.as_bytes())
-            or self.payload.startswith(DefaultPayloadType.METRICS_PROBE.as_bytes())
-        )
+        """Returns True if the payload type is registered as test traffic."""
+        return self.payload_info.is_test
 
     @property
     def is_load_test_packet(self) -> bool:
-        return self.payload.startswith(DefaultPayloadType.METRICS_LOAD.as_bytes())
+        return self.payload_type == DefaultPayloadType.METRICS_LOAD
+
+    def __repr__(self):
+        return f"Frame(header={self.header}, payload={self.payload})"
+
+
+HEADER_SIZE = 20
+FRAME_PAYLOAD_OFFSET = HEADER_SIZE + 1  # header + stats
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+_U64 = struct.Struct("<Q")
+
+
+class HeaderView:
+    """Read-only view of the MAC header fields at the beginning of a buffer."""
+
+    __slots__ = ("_buffer",)
+
+    def __init__(self, buffer: memoryview):
+        self._buffer = buffer
+
+    @property
+    def version(self) -> int:
+        return self._buffer[0]
+
+    @property
+    def type_(self) -> int:
+        return self._buffer[1]
+
+    @property
+    def network_id(self) -> int:
+        return _U16.unpack_from(self._buffer, 2)[0]
+
+    @property
+    def destination(self) -> int:
+        return _U64.unpack_from(self._buffer, 4)[0]
+
+    @property
+    def source(self) -> int:
+        return _U64.unpack_from(self._buffer, 12)[0]
+
+    def to_header(self) -> Header:
+        return Header().from_bytes(self._buffer[:HEADER_SIZE])
+
+    def to_bytes(self, byteorder="little") -> bytes:
+        return bytes(self._buffer[:HEADER_SIZE])
+
+    def __repr__(self):
+        return repr(self.to_header())
+
+
+class HeaderStatsView:
+    """Read-only view of the MAC header stats."""
+
+    __slots__ = ("rssi",)
+
+    def __init__(self, rssi: int):
+        self.rssi = rssi
+
+    @property
+    def rssi_dbm(self) -> int:
+        if self.rssi > 127:
+            return self.rssi - 255
+        return self.rssi
+
+    def to_bytes(self, byteorder="little") -> bytes:
+        return _U8.pack(self.rssi)
+
+
+class FrameView:
+    """Lazy, zero-copy alternative to Frame.from_bytes.
+
+    Header fields are decoded from the underlying buffer when accessed, and the
+    payload is only copied when read. It can be used in place of a Frame when
+    reading frames, and to_frame returns an equivalent Frame.
+
+    >>> frame = FrameView(bytes.fromhex("0210170059291ba8fdcecef531eb7f2526ef0399dcf0f0"))
+    >>> hex(frame.header.source), frame.stats.rssi_dbm, frame.payload
+    ('0x9903ef26257feb31', -35, b'\\xf0\\xf0')
+    """
+
+    __slots__ = ("_buffer", "_payload", "_payload_info", "_registry")
+
+    def __init__(self, bytes_):
+        if len(bytes_) < HEADER_SIZE:
+            raise ValueError("Not enough bytes to parse")
+        self._buffer = memoryview(bytes_).toreadonly()
+        self._payload = None
+        self._payload_info = None
+        self._registry = PAYLOAD_TYPES
+
+    @property
+    def header(self) -> HeaderView:
+        return HeaderView(self._buffer)
+
+    @property
+    def stats(self) -> HeaderStatsView:
+        return HeaderStatsView(self._buffer[HEADER_SIZE] if len(self._buffer) > HEADER_SIZE else 0)
+
+    @property
+    def payload(self) -> bytes:
+        if self._payload is None:
+            self._payload = bytes(self._buffer[FRAME_PAYLOAD_OFFSET:])
+        return self._payload
+
+    @payload.setter
+    def payload(self, payload: bytes):
+        self._payload = payload
+        self._payload_info = None
+
+    @property
+    def payload_type(self) -> int | None:
+        """Returns the first byte of the payload, without copying it."""
+        if self._payload is not None:
+            return self._payload[0] if self._payload else None
+        if len(self._buffer) > FRAME_PAYLOAD_OFFSET:
+            return self._buffer[FRAME_PAYLOAD_OFFSET]
+        return None
+
+    def classify(self, registry: PayloadTypeRegistry = PAYLOAD_TYPES) -> PayloadTypeInfo:
+        """Looks up the payload type in registry, the result is cached in the frame.
+
+        The registry is kept to classify the frame again if its payload changes.
+        """
+        self._registry = registry
+        self._payload_info = registry.get(self.payload_type)
+        return self._payload_info
+
+    @property
+    def payload_info(self) -> PayloadTypeInfo:
+        if self._payload_info is None:
+            return self.classify(self._registry)
+        return self._payload_info
+
+    @property
+    def is_test_packet(self) -> bool:
+        """Returns True if the payload type is registered as test traffic."""
+        return self.payload_info.is_test
+
+    @property
+    def is_load_test_packet(self) -> bool:
+        return self.payload_type == DefaultPayloadType.METRICS_LOAD
+
+    def to_frame(self) -> Frame:
+        frame = Frame(
+            header=self.header.to_header(),
+            stats=HeaderStats(rssi=self.stats.rssi),
+            payload=self.payload,
+        )
+        frame.classify(self._registry)
+        return frame
+
+    def to_bytes(self, byteorder="little") -> bytes:
+        if self._payload is None and len(self._buffer) >= FRAME_PAYLOAD_OFFSET:
+            return bytes(self._buffer)
+        return self.header.to_bytes() + self.stats.to_bytes() + self.payload
 
     def __repr__(self):
-        header_no_metadata = dataclasses.replace(self.header, metadata=[])
-        return f"Frame(header={header_no_metadata}, payload={self.payload})"
+        return f"Frame(header={self.header}, payload={self.payload})"
@@ -1,12 +1,21 @@
 import threading
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Any, Callable
+from typing import Any, Callable, Iterator
 
+from marilib.clock import SYSTEM_CLOCK, Clock
 from marilib.metrics import MetricsTester
-from marilib.mari_protocol import Frame, Header
+from marilib.mari_protocol import (
+    PAYLOAD_TYPES,
+    DefaultPayloadType,
+    Frame,
+    FrameView,
+    Header,
+    PayloadTypeRegistry,
+)
 from marilib.model import (
     EdgeEvent,
+    ExpiryQueue,
     GatewayInfo,
     MariGateway,
     MariNode,
@@ -14,6 +23,8 @@ from marilib.model import (
 )
 from marilib.communication_adapter import MQTTAdapter
 from marilib.marilib import MarilibBase
+from marilib.node_table import NodeTable
+from marilib.snapshot import SNAPSHOT_PUBLISH_PERIOD, NetworkSnapshot, SnapshotPublisher
 from marilib.tui_cloud import MarilibTUICloud
 
 LOAD_PACKET_PAYLOAD = b"L"
@@ -35,12 +46,41 @@ class MarilibCloud(MarilibBase):
     gateways: dict[int, MariGateway] = field(default_factory=dict)
     lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
     metrics_tester: MetricsTester | None = None
-
-    started_ts: datetime = field(default_factory=datetime.now)
-    last_received_mqtt_data_ts: datetime = field(default_factory=datetime.now)
+    payload_types: PayloadTypeRegistry = field(default_factory=PAYLOAD_TYPES.copy)
+    # max age of the snapshot returned by snapshot(), in seconds
+    snapshot_period: float = SNAPSHOT_PUBLISH_PERIOD
+    snapshots: SnapshotPublisher = field(init=False, repr=False)
+    # addresses of the gateways, by liveness deadline
+    gateway_expiry: ExpiryQueue = field(default_factory=ExpiryQueue, init=False, repr=False)
+    # optional columnar copy of the nodes of all the gateways, needs numpy
+    node_table: NodeTable | None = field(default=None, repr=False)
+    # frames kept in the history of each gateway and node, 0 keeps no history
+    frame_history_capacity: int = 0
+    # gateway and node of each node address, maintained on join, leave, keep-alive and timeout
+    node_index: dict[int, tuple[MariGateway, MariNode]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    # nodes that moved to another gateway, as (left, joined) events to dispatch,
+    # joined is None when the move came with a NODE_JOINED from the new gateway
+    moved_nodes: list[tuple[NodeInfoCloud, NodeInfoCloud | None]] = field(
+        default_factory=list, init=False, repr=False
+    )
+
+    # monotonic time source, a VirtualClock runs the cloud faster than real time
+    clock: Clock = field(default=SYSTEM_CLOCK, repr=False)
+    started_ts: datetime | None = None  # wall time
+    last_received_mqtt_data_ts: float | None = None  # clock.now()
     main_file: str | None = None
 
     def __post_init__(self):
+        self.started_ts = self.started_ts or self.clock.wall_time()
+        if self.last_received_mqtt_data_ts is None:
+            self.last_received_mqtt_data_ts = self.clock.now()
+        self.snapshots = SnapshotPublisher(self.clock, self.snapshot_period)
+        for address, gateway in self.gateways.items():
+            self.gateway_expiry.schedule(address, gateway.alive_until)
+            for node in gateway.nodes:
+                self.node_index[node.address] = (gateway, node)
         self.setup_params = {
             "main_file": self.main_file or "unknown",
             "mqtt_host": self.mqtt_interface.host,
@@ -51,45 +91,82 @@ class MarilibCloud(MarilibBase):
         self.mqtt_interface.set_on_data_received(self.on_mqtt_data_received)
         self.mqtt_interface.init()
         if self.logger:
+            self.logger.use_clock(self.clock)
             self.logger.log_setup_parameters(self.setup_params)
         self.metrics_tester = MetricsTester(
             self
         )  # just instantiate, do not start it at the cloud, for now
+        self.payload_types.set_handler(DefaultPayloadType.METRICS_PROBE, self._handle_metrics_probe)
 
     # ============================ MarilibBase methods =========================
 
     def update(self):
         """Recurrent bookkeeping. Don't forget to call this periodically on your main loop."""
         with self.lock:
-            # remove dead gateways
-            self.gateways = {
-                addr: gateway for addr, gateway in self.gateways.items() if gateway.is_alive
-            }
+            expired = []
+            # remove dead gateways, their nodes leave with them
+            for address in self.gateway_expiry.pop_expired(
+                self.clock.now(), self._gateway_alive_until
+            ):
+                gateway = self.gateways.pop(address)
+                expired += [gateway.remove_node(addr) for addr in gateway.nodes_addresses]
             # update each gateway
             for gateway in self.gateways.values():
-                gateway.update()
-                if self.logger:
-                    self.logger.log_periodic_metrics(gateway, gateway.nodes)
+                expired += gateway.update()
+            for node in expired:
+                self._unindex_node(node)
+        snapshot = self.publish_snapshot()
+        self._dispatch_moved_nodes()
+        for node in expired:
+            # the edge did not report these nodes as left, but they timed out
+            self.dispatch_mqtt_event(
+                EdgeEvent.NODE_LEFT, node.as_node_info_cloud(), event_tag="timeout"
+            )
+        if self.logger:
+            for gateway in snapshot.gateways:
+                self.logger.log_periodic_metrics(gateway)
 
     @property
     def nodes(self) -> list[MariNode]:
-        return [node for gateway in self.gateways.values() for node in gateway.nodes]
+        return [node for _, node in self.node_index.values()]
+
+    @property
+    def node_count(self) -> int:
+        return len(self.node_index)
+
+    def iter_nodes(self) -> Iterator[MariNode]:
+        """Iterates over the nodes of all the gateways, without copying them, hold the lock."""
+        for _, node in self.node_index.values():
+            yield node
+
+    def get_node(self, address: int) -> MariNode | None:
+        entry = self.node_index.get(address)
+        return entry[1] if entry else None
+
+    def get_node_gateway(self, address: int) -> MariGateway | None:
+        """Returns the gateway the node is connected to."""
+        entry = self.node_index.get(address)
+        return entry[0] if entry else None
 
     def add_node(self, address: int, gateway_address: int = None) -> MariNode | None:
         with self.lock:
             gateway = self.gateways.get(gateway_address)
             if gateway:
-                node = gateway.add_node(address)
-                return node
+                return self._index_node(gateway, address)
         return None
 
     def remove_node(self, address: int, gateway_address: int = None) -> MariNode | None:
+        """Removes a node, from any gateway when gateway_address is None."""
         with self.lock:
-            gateway = self.gateways.get(gateway_address)
-            if gateway:
-                node = gateway.remove_node(address)
-                return node
-        return None
+            entry = self.node_index.get(address)
+            if not entry:
+                return None
+            gateway, _ = entry
+            if gateway_address is not None and gateway.info.address != gateway_address:
+                # left a gateway it already moved away from
+                return None
+            del self.node_index[address]
+            return gateway.remove_node(address)
 
     def send_frame(self, dst: int, payload: bytes):
         """
@@ -97,11 +174,33 @@ class MarilibCloud(MarilibBase):
         Consists in publishing a message to the /mari/{network_id}/to_edge topic.
         """
         mari_frame = Frame(Header(destination=dst), payload=payload)
+        mari_frame.classify(self.payload_types)
 
         self.mqtt_interface.send_data_to_edge(
             EdgeEvent.to_bytes(EdgeEvent.NODE_DATA) + mari_frame.to_bytes()
         )
 
+        with self.lock:
+            if entry := self.node_index.get(dst):
+                gateway, node = entry
+                gateway.register_sent_frame(mari_frame)
+                node.register_sent_frame(mari_frame)
+
+    def snapshot(self) -> NetworkSnapshot:
+        """Returns the latest snapshot of the network, without taking the lock.
+
+        It is published by update(), at most every snapshot_period seconds.
+        """
+        return self.snapshots.latest or self.publish_snapshot(force=True)
+
+    def publish_snapshot(self, force: bool = False) -> NetworkSnapshot:
+        """Publishes a new snapshot if the latest one is older than snapshot_period."""
+        if force or self.snapshots.is_due():
+            with self.lock:
+                gateways = list(self.gateways.values())
+            return self.snapshots.publish(gateways, self.lock)
+        return self.snapshots.latest
+
     def render_tui(self):
         if self.tui:
             self.tui.render(self)
@@ -129,7 +228,7 @@ class MarilibCloud(MarilibBase):
         if len(data) < 1:
             return False, EdgeEvent.UNKNOWN, None
 
-        self.last_received_mqtt_data_ts = datetime.now()
+        self.last_received_mqtt_data_ts = self.clock.now()
 
         try:
             event_type = EdgeEvent(data[0])
@@ -151,40 +250,47 @@ class MarilibCloud(MarilibBase):
                 node_info = NodeInfoCloud().from_bytes(data[1:])
                 gateway = self.gateways.get(node_info.gateway_address)
                 if gateway:
-                    gateway.update_node_liveness(node_info.address)
+                    with self.lock:
+                        self._index_node(gateway, node_info.address, joined=False)
                     return True, EdgeEvent.NODE_KEEP_ALIVE, node_info
 
             elif event_type == EdgeEvent.GATEWAY_INFO:
                 gateway_info = GatewayInfo().from_bytes(data[1:])
-                gateway = self.gateways.get(gateway_info.address)
-                if not gateway:
-                    # we are learning about a new gateway, so instantiate it and add it to the list
-                    gateway = MariGateway(info=gateway_info)
-                    self.gateways[gateway.info.address] = gateway
-                else:
-                    gateway.set_info(gateway_info)
+                with self.lock:
+                    gateway = self.gateways.get(gateway_info.address)
+                    if not gateway:
+                        # we are learning about a new gateway, so instantiate it and add it to the list
+                        gateway = MariGateway(
+                            info=gateway_info,
+                            clock=self.clock,
+                            node_table=self.node_table,
+                            frame_history_capacity=self.frame_history_capacity,
+                        )
+                        self.gateways[gateway.info.address] = gateway
+                        self.gateway_expiry.schedule(gateway.info.address, gateway.alive_until)
+                    else:
+                        gateway.set_info(gateway_info)
                 return True, EdgeEvent.GATEWAY_INFO, gateway_info
 
             elif event_type == EdgeEvent.NODE_DATA:
-                frame = Frame().from_bytes(data[1:])
+                frame = FrameView(memoryview(data)[1:])
+                payload_info = frame.classify(self.payload_types)
 
                 gateway_address = frame.header.destination
                 node_address = frame.header.source
                 gateway = self.gateways.get(gateway_address)
                 if not gateway:
                     return False, EdgeEvent.UNKNOWN, None
-                node = gateway.get_node(node_address)
-                if not gateway or not node:
+                if node_address not in self.node_index:
                     return False, EdgeEvent.UNKNOWN, None
 
-                gateway.update_node_liveness(node_address)
-                gateway.register_received_frame(frame)
+                with self.lock:
+                    # also moves the node, if the frame came through another gateway
+                    node = self._index_node(gateway, node_address, joined=False)
+                    gateway.register_received_frame(frame)
 
-                # handle metrics probe packets
-                if frame.is_test_packet:
-                    payload = self.metrics_tester.handle_response_cloud(frame, gateway, node)
-                    if payload:
-                        frame.payload = payload.to_bytes()
+                    if payload_info.handler:
+                        payload_info.handler(frame, gateway, node)
 
                 return True, EdgeEvent.NODE_DATA, frame
 
@@ -196,10 +302,67 @@ class MarilibCloud(MarilibBase):
 
     def on_mqtt_data_received(self, data: bytes):
         res, event_type, event_data = self.handle_mqtt_data(data)
+        self._dispatch_moved_nodes()
         if res:
-            if self.logger and event_type in [EdgeEvent.NODE_JOINED, EdgeEvent.NODE_LEFT]:
-                # TODO: update the logging system to also support GATEWAY_INFO events from multiple gateways
-                self.logger.log_event(
-                    event_data.gateway_address, event_data.address, event_type.name
-                )
-            self.cb_application(event_type, event_data)
+            self.dispatch_mqtt_event(event_type, event_data)
+
+    def dispatch_mqtt_event(
+        self,
+        event_type: EdgeEvent,
+        event_data: NodeInfoCloud | GatewayInfo | Frame,
+        event_tag: str = "",
+    ):
+        """Notifies the logger and the application about a handled event."""
+        if self.logger and event_type in [EdgeEvent.NODE_JOINED, EdgeEvent.NODE_LEFT]:
+            # TODO: update the logging system to also support GATEWAY_INFO events from multiple gateways
+            self.logger.log_event(
+                event_data.gateway_address, event_data.address, event_type.name, event_tag
+            )
+        self.cb_application(event_type, event_data)
+
+    # ============================ Private methods =============================
+
+    def _index_node(self, gateway: MariGateway, address: int, joined: bool = True) -> MariNode:
+        """Adds the node to the gateway, or marks it as seen, must be called with the lock held.
+
+        joined is False when the node is only seen through the gateway (keep-alive or data),
+        then a NODE_JOINED event is dispatched if it moved there from another gateway.
+        """
+        entry = self.node_index.get(address)
+        if entry is None:
+            node = gateway.add_node(address)
+        else:
+            previous_gateway, node = entry
+            if previous_gateway is gateway:
+                node.mark_seen(self.clock.now())
+                return node
+            # the node moved without leaving its previous gateway first
+            left = node.as_node_info_cloud()
+            gateway.move_node_in(previous_gateway.remove_node(address))
+            self.moved_nodes.append((left, None if joined else node.as_node_info_cloud()))
+        self.node_index[address] = (gateway, node)
+        return node
+
+    def _unindex_node(self, node: MariNode):
+        entry = self.node_index.get(node.address)
+        if entry is not None and entry[1] is node:
+            del self.node_index[node.address]
+
+    def _dispatch_moved_nodes(self):
+        if not self.moved_nodes:
+            return
+        with self.lock:
+            moved, self.moved_nodes = self.moved_nodes, []
+        for left, joined in moved:
+            self.dispatch_mqtt_event(EdgeEvent.NODE_LEFT, left, event_tag="moved")
+            if joined is not None:
+                self.dispatch_mqtt_event(EdgeEvent.NODE_JOINED, joined, event_tag="moved")
+
+    def _gateway_alive_until(self, address: int) -> float | None:
+        gateway = self.gateways.get(address)
+        return gateway.alive_until if gateway else None
+
+    def _handle_metrics_probe(self, frame: FrameView, gateway: MariGateway, node: MariNode):
+        payload = self.metrics_tester.handle_response_cloud(frame, gateway, node)
+        if payload:
+            frame.payload = payload.to_bytes()
@@ -4,13 +4,17 @@ from datetime import datetime
 from typing import Any, Callable
 from rich import print
 
+from marilib.clock import SYSTEM_CLOCK, Clock
 from marilib.metrics import MetricsTester
 from marilib.mari_protocol import (
     MARI_BROADCAST_ADDRESS,
+    PAYLOAD_TYPES,
     Frame,
+    FrameView,
     Header,
     DefaultPayload,
     DefaultPayloadType,
+    PayloadTypeRegistry,
 )
 from marilib.model import (
     EdgeEvent,
@@ -23,6 +27,8 @@ from marilib.model import (
 from marilib.protocol import ProtocolPayloadParserException
 from marilib.communication_adapter import MQTTAdapter, MQTTAdapterDummy, SerialAdapter
 from marilib.marilib import MarilibBase
+from marilib.pipeline import DISPATCH_QUEUE_SIZE, DispatchPipeline
+from marilib.snapshot import SNAPSHOT_PUBLISH_PERIOD, NetworkSnapshot, SnapshotPublisher
 from marilib.tui_edge import MarilibTUIEdge
 
 
@@ -41,36 +47,75 @@ class MarilibEdge(MarilibBase):
     tui: MarilibTUIEdge | None = None
 
     logger: Any | None = None
-    gateway: MariGateway = field(default_factory=MariGateway)
+    gateway: MariGateway | None = None
     lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
     metrics_tester: MetricsTester | None = None
     metrics_probe_period: float = 0
-
-    started_ts: datetime = field(default_factory=datetime.now)
-    last_received_serial_data_ts: datetime = field(default_factory=datetime.now)
-    last_received_mqtt_data_ts: datetime = field(default_factory=datetime.now)
+    payload_types: PayloadTypeRegistry = field(default_factory=PAYLOAD_TYPES.copy)
+    # when > 0, received data is handled by worker threads instead of the serial thread
+    dispatch_workers: int = 0
+    dispatch_queue_size: int = DISPATCH_QUEUE_SIZE
+    pipeline: DispatchPipeline | None = None
+    # max age of the snapshot returned by snapshot(), in seconds
+    snapshot_period: float = SNAPSHOT_PUBLISH_PERIOD
+    snapshots: SnapshotPublisher = field(init=False, repr=False)
+    # frames kept in the history of the gateway and of each node, 0 keeps no history
+    frame_history_capacity: int = 0
+
+    # monotonic time source, a VirtualClock runs the edge faster than real time
+    clock: Clock = field(default=SYSTEM_CLOCK, repr=False)
+    started_ts: datetime | None = None  # wall time
+    last_received_serial_data_ts: float | None = None  # clock.now()
+    last_received_mqtt_data_ts: float | None = None  # clock.now()
     main_file: str | None = None
 
     def __post_init__(self):
+        self.started_ts = self.started_ts or self.clock.wall_time()
+        if self.last_received_serial_data_ts is None:
+            self.last_received_serial_data_ts = self.clock.now()
+        if self.last_received_mqtt_data_ts is None:
+            self.last_received_mqtt_data_ts = self.clock.now()
+        if self.gateway is None:
+            self.gateway = MariGateway(
+                clock=self.clock, frame_history_capacity=self.frame_history_capacity
+            )
+        self.snapshots = SnapshotPublisher(self.clock, self.snapshot_period)
         self.setup_params = {
             "main_file": self.main_file or "unknown",
             "serial_port": self.serial_interface.port,
         }
         if self.mqtt_interface is None:
             self.mqtt_interface = MQTTAdapterDummy()
-        self.serial_interface.init(self.on_serial_data_received)
+        if self.dispatch_workers > 0:
+            self.pipeline = DispatchPipeline(
+                [("handle", self._handle_serial_data_stage), ("dispatch", self._dispatch_stage)],
+                workers=self.dispatch_workers,
+                queue_size=self.dispatch_queue_size,
+                key=self._serial_data_node_address,
+            )
+            self.serial_interface.init(self.pipeline.submit)
+        else:
+            self.serial_interface.init(self.on_serial_data_received)
         if self.logger:
+            self.logger.use_clock(self.clock)
             self.logger.log_setup_parameters(self.setup_params)
         self.metrics_tester = MetricsTester(self, self.metrics_probe_period)
+        self.payload_types.set_handler(DefaultPayloadType.METRICS_PROBE, self._handle_metrics_probe)
         self.metrics_tester.start()
 
     # ============================ MarilibBase methods =========================
 
     def update(self):
         with self.lock:
-            self.gateway.update()
-            if self.logger and self.logger.active:
-                self.logger.log_periodic_metrics(self.gateway, self.gateway.nodes)
+            expired = self.gateway.update()
+        snapshot = self.publish_snapshot()
+        for node in expired:
+            # the gateway did not report these nodes as left, but they timed out
+            self.dispatch_serial_event(
+                EdgeEvent.NODE_LEFT, NodeInfoEdge(address=node.address), event_tag="timeout"
+            )
+        if self.logger and self.logger.active:
+            self.logger.log_periodic_metrics(snapshot.gateways[0])
 
     @property
     def nodes(self) -> list[MariNode]:
@@ -85,10 +130,20 @@ class MarilibEdge(MarilibBase):
             return self.gateway.remove_node(address)
 
     def send_frame(self, dst: int, payload: bytes):
-        """Sends a frame to the gateway via serial."""
+        """
+        Sends a frame to the gateway via serial.
+        The frame is queued and written by the serial writer thread, so this returns right away.
+        """
         assert self.serial_interface is not None
 
         mari_frame = Frame(Header(destination=dst), payload=payload)
+        mari_frame.classify(self.payload_types)
+
+        if not self.serial_interface.send_data(
+            EdgeEvent.to_bytes(EdgeEvent.NODE_DATA) + mari_frame.to_bytes()
+        ):
+            # dropped because the transmit queue is full
+            return
 
         with self.lock:
             self.gateway.register_sent_frame(mari_frame)
@@ -98,9 +153,18 @@ class MarilibEdge(MarilibBase):
             elif n := self.gateway.get_node(dst):
                 n.register_sent_frame(mari_frame)
 
-        self.serial_interface.send_data(
-            EdgeEvent.to_bytes(EdgeEvent.NODE_DATA) + mari_frame.to_bytes()
-        )
+    def snapshot(self) -> NetworkSnapshot:
+        """Returns the latest snapshot of the network, without taking the lock.
+
+        It is published by update(), at most every snapshot_period seconds.
+        """
+        return self.snapshots.latest or self.publish_snapshot(force=True)
+
+    def publish_snapshot(self, force: bool = False) -> NetworkSnapshot:
+        """Publishes a new snapshot if the latest one is older than snapshot_period."""
+        if force or self.snapshots.is_due():
+            return self.snapshots.publish([self.gateway], self.lock)
+        return self.snapshots.latest
 
     def render_tui(self):
         if self.tui:
@@ -142,11 +206,11 @@ class MarilibEdge(MarilibBase):
         if len(data) < 1:
             return
 
-        self.last_received_mqtt_data_ts = datetime.now()
+        self.last_received_mqtt_data_ts = self.clock.now()
 
         try:
             event_type = EdgeEvent(data[0])
-            frame = Frame().from_bytes(data[1:])
+            frame = FrameView(memoryview(data)[1:])
         except (ValueError, ProtocolPayloadParserException) as exc:
             print(f"[red]Error parsing frame: {exc}[/]")
             return
@@ -165,7 +229,7 @@ class MarilibEdge(MarilibBase):
         if len(data) < 1:
             return False, EdgeEvent.UNKNOWN, None
 
-        self.last_received_serial_data_ts = datetime.now()
+        self.last_received_serial_data_ts = self.clock.now()
 
         try:
             event_type = EdgeEvent(data[0])
@@ -200,16 +264,16 @@ class MarilibEdge(MarilibBase):
 
         elif event_type == EdgeEvent.NODE_DATA:
             try:
-                frame = Frame().from_bytes(data[1:])
+                frame = FrameView(memoryview(data)[1:])
+                payload_info = frame.classify(self.payload_types)
                 with self.lock:
                     self.gateway.update_node_liveness(frame.header.source)
                     self.gateway.register_received_frame(frame)
 
-                    # handle metrics probe packets
-                    if frame.is_test_packet:
-                        payload = self.metrics_tester.handle_response_edge(frame)
-                        if payload:
-                            frame.payload = payload.to_bytes()
+                    if payload_info.handler:
+                        payload_info.handler(
+                            frame, self.gateway, self.gateway.get_node(frame.header.source)
+                        )
 
                 return True, event_type, frame
             except (ValueError, ProtocolPayloadParserException):
@@ -221,9 +285,19 @@ class MarilibEdge(MarilibBase):
         res, event_type, event_data = self.handle_serial_data(data)
         if not res:
             return
+        self.dispatch_serial_event(event_type, event_data)
 
+    def dispatch_serial_event(
+        self,
+        event_type: EdgeEvent,
+        event_data: NodeInfoEdge | GatewayInfo | Frame,
+        event_tag: str = "",
+    ):
+        """Notifies the logger, the application and the cloud about a handled event."""
         if self.logger and event_type in [EdgeEvent.NODE_JOINED, EdgeEvent.NODE_LEFT]:
-            self.logger.log_event(self.gateway.info.address, event_data.address, event_type.name)
+            # the logger serializes its writes, the model lock is not needed
+            gateway_address = self.gateway.info.address
+            self.logger.log_event(gateway_address, event_data.address, event_type.name, event_tag)
         if event_type == EdgeEvent.GATEWAY_INFO:
             self.mqtt_interface.update(event_data.network_id_str, self.on_mqtt_data_received)
             if self.logger:
@@ -254,6 +328,31 @@ class MarilibEdge(MarilibBase):
 
     # ============================ Private methods =============================
 
+    def _handle_metrics_probe(self, frame: FrameView, gateway: MariGateway, node: MariNode | None):
+        payload = self.metrics_tester.handle_response_edge(frame)
+        if payload:
+            frame.payload = payload.to_bytes()
+
+    def _handle_serial_data_stage(self, data: bytes):
+        res, event_type, event_data = self.handle_serial_data(data)
+        return (event_type, event_data) if res else None
+
+    def _dispatch_stage(self, event: tuple[EdgeEvent, Any]):
+        self.dispatch_serial_event(*event)
+
+    @staticmethod
+    def _serial_data_node_address(data: bytes) -> int:
+        """Returns the address of the node the serial data is about, 0 if none."""
+        if len(data) >= 21 and data[0] == EdgeEvent.NODE_DATA:
+            return int.from_bytes(data[13:21], "little")
+        if len(data) >= 9 and data[0] in [
+            EdgeEvent.NODE_JOINED,
+            EdgeEvent.NODE_LEFT,
+            EdgeEvent.NODE_KEEP_ALIVE,
+        ]:
+            return int.from_bytes(data[1:9], "little")
+        return 0
+
     def _is_test_packet(self, payload: bytes) -> bool:
         """Determines if a packet sent FROM the edge is for testing purposes."""
         payload = DefaultPayload().from_bytes(payload)
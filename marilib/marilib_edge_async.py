@@ -0,0 +1,107 @@
+import asyncio
+from typing import Any, AsyncIterator
+
+from marilib.clock import SYSTEM_CLOCK, Clock
+from marilib.communication_adapter import AsyncSerialAdapter, MQTTAdapter
+from marilib.mari_protocol import Frame
+from marilib.marilib_edge import MarilibEdge
+from marilib.model import EdgeEvent, MariGateway, MariNode
+from marilib.snapshot import NetworkSnapshot
+
+EVENT_QUEUE_SIZE = 1024
+
+
+class AsyncMarilibEdge:
+    """
+    Asyncio facade for MarilibEdge.
+    The serial port is handled by the event loop (see AsyncSerialAdapter), and the
+    network model is the one of MarilibEdge, updated from the event loop too.
+
+    Example:
+
+        async with AsyncMarilibEdge(AsyncSerialAdapter(port)) as mari:
+            async for event, data in mari.events():
+                if event == EdgeEvent.NODE_DATA:
+                    await mari.send_frame(data.header.source, b"pong")
+
+    mari.update() must still be called periodically, for example from another task.
+    """
+
+    def __init__(
+        self,
+        serial_interface: AsyncSerialAdapter,
+        mqtt_interface: MQTTAdapter | None = None,
+        logger: Any | None = None,
+        metrics_probe_period: float = 0,
+        event_queue_size: int = EVENT_QUEUE_SIZE,
+        main_file: str | None = None,
+        clock: Clock = SYSTEM_CLOCK,
+    ):
+        self.serial_interface = serial_interface
+        self.mqtt_interface = mqtt_interface
+        self.logger = logger
+        self.metrics_probe_period = metrics_probe_period
+        self.event_queue_size = event_queue_size
+        self.main_file = main_file
+        self.clock = clock
+        self.events_dropped = 0
+        self.mari: MarilibEdge | None = None
+
+    async def start(self):
+        """Opens the serial port, must be called from the running event loop."""
+        self.event_queue = asyncio.Queue(maxsize=self.event_queue_size)
+        self.mari = MarilibEdge(
+            self._on_event,
+            serial_interface=self.serial_interface,
+            mqtt_interface=self.mqtt_interface,
+            logger=self.logger,
+            metrics_probe_period=self.metrics_probe_period,
+            main_file=self.main_file,
+            clock=self.clock,
+        )
+
+    async def close(self):
+        self.mari.metrics_test_disable()
+        self.serial_interface.close()
+
+    async def __aenter__(self) -> "AsyncMarilibEdge":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    # ============================ API =========================================
+
+    @property
+    def gateway(self) -> MariGateway:
+        return self.mari.gateway
+
+    @property
+    def nodes(self) -> list[MariNode]:
+        return self.mari.nodes
+
+    def snapshot(self) -> NetworkSnapshot:
+        return self.mari.snapshot()
+
+    def update(self):
+        """Recurrent bookkeeping. Don't forget to call this periodically."""
+        self.mari.update()
+
+    async def events(self) -> AsyncIterator[tuple[EdgeEvent, MariNode | Frame]]:
+        """Yields the events that MarilibEdge passes to the application callback."""
+        while True:
+            yield await self.event_queue.get()
+
+    async def send_frame(self, dst: int, payload: bytes):
+        """Sends a frame to the gateway, waiting for room in the transmit queue."""
+        await self.serial_interface.wait_for_room()
+        self.mari.send_frame(dst, payload)
+
+    # ============================ Callbacks ===================================
+
+    def _on_event(self, event: EdgeEvent, event_data: MariNode | Frame):
+        try:
+            self.event_queue.put_nowait((event, event_data))
+        except asyncio.QueueFull:
+            self.events_dropped += 1
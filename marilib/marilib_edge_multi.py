@@ -0,0 +1,138 @@
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from rich import print
+
+from marilib.clock import SYSTEM_CLOCK, Clock
+from marilib.communication_adapter import MQTTAdapter, MQTTAdapterDummy, SerialAdapter
+from marilib.mari_protocol import MARI_BROADCAST_ADDRESS, Frame, FrameView
+from marilib.marilib import MarilibBase
+from marilib.marilib_edge import MarilibEdge
+from marilib.model import EdgeEvent, MariGateway, MariNode
+from marilib.pipeline import DISPATCH_QUEUE_SIZE
+from marilib.snapshot import NetworkSnapshot
+
+
+@dataclass
+class MarilibEdgeMulti(MarilibBase):
+    """
+    The MarilibEdgeMulti class drives several Mari radio gateways from a single process.
+    There is one MarilibEdge per serial port, each with its own gateway model and lock,
+    all of them sharing the same (optional) MQTT connection.
+    Frames sent to a node are routed to the gateway the node is joined to, and
+    broadcast frames are sent by every gateway.
+    """
+
+    cb_application: Callable[[EdgeEvent, MariNode | Frame], None]
+    serial_interfaces: list[SerialAdapter]
+    mqtt_interface: MQTTAdapter | None = None
+
+    logger: Any | None = None
+    metrics_probe_period: float = 0
+    dispatch_workers: int = 0
+    dispatch_queue_size: int = DISPATCH_QUEUE_SIZE
+    edges: list[MarilibEdge] = field(default_factory=list)
+    clock: Clock = field(default=SYSTEM_CLOCK, repr=False)
+    main_file: str | None = None
+
+    def __post_init__(self):
+        if self.mqtt_interface is None:
+            self.mqtt_interface = MQTTAdapterDummy()
+        # frames coming from the cloud must be routed to the right gateway, so set the
+        # callback before the edges do it when they learn the network id
+        self.mqtt_interface.set_on_data_received(self.on_mqtt_data_received)
+        self.edges = [
+            MarilibEdge(
+                self.cb_application,
+                serial_interface=serial_interface,
+                mqtt_interface=self.mqtt_interface,
+                logger=self.logger,
+                metrics_probe_period=self.metrics_probe_period,
+                dispatch_workers=self.dispatch_workers,
+                dispatch_queue_size=self.dispatch_queue_size,
+                main_file=self.main_file,
+                clock=self.clock,
+            )
+            for serial_interface in self.serial_interfaces
+        ]
+
+    # ============================ MarilibBase methods =========================
+
+    def update(self):
+        for edge in self.edges:
+            edge.update()
+
+    @property
+    def nodes(self) -> list[MariNode]:
+        return [node for edge in self.edges for node in edge.nodes]
+
+    def add_node(self, address: int, gateway_address: int = None) -> MariNode | None:
+        if edge := self.get_edge_by_gateway(gateway_address):
+            return edge.add_node(address)
+        return None
+
+    def remove_node(self, address: int) -> MariNode | None:
+        if edge := self.get_edge_by_node(address):
+            return edge.remove_node(address)
+        return None
+
+    def send_frame(self, dst: int, payload: bytes):
+        """
+        Sends a frame via the gateway the destination node is joined to,
+        or via all gateways for broadcast frames.
+        Frames to unknown nodes are not sent.
+        """
+        if dst == MARI_BROADCAST_ADDRESS:
+            for edge in self.edges:
+                edge.send_frame(dst, payload)
+        elif edge := self.get_edge_by_node(dst):
+            edge.send_frame(dst, payload)
+
+    def render_tui(self):
+        """NOTE: the TUI only supports a single gateway for now."""
+
+    def close_tui(self):
+        pass
+
+    # ============================ MarilibEdgeMulti methods ====================
+
+    @property
+    def gateways(self) -> list[MariGateway]:
+        return [edge.gateway for edge in self.edges]
+
+    def snapshot(self) -> NetworkSnapshot:
+        """Returns the latest snapshots of all the gateways, without taking their locks."""
+        snapshots = [edge.snapshot() for edge in self.edges]
+        return NetworkSnapshot(
+            ts=min((snapshot.ts for snapshot in snapshots), default=self.clock.now()),
+            gateways=tuple(gateway for snapshot in snapshots for gateway in snapshot.gateways),
+        )
+
+    def get_edge_by_gateway(self, gateway_address: int) -> MarilibEdge | None:
+        for edge in self.edges:
+            if edge.gateway.info.address == gateway_address:
+                return edge
+        return None
+
+    def get_edge_by_node(self, address: int) -> MarilibEdge | None:
+        for edge in self.edges:
+            if edge.gateway.get_node(address):
+                return edge
+        return None
+
+    def metrics_test_disable(self):
+        for edge in self.edges:
+            edge.metrics_test_disable()
+
+    # ============================ Callbacks ===================================
+
+    def on_mqtt_data_received(self, data: bytes):
+        """Routes the frames coming from the cloud to the right gateway(s)."""
+        if len(data) < 1 or data[0] != EdgeEvent.NODE_DATA:
+            return
+        try:
+            frame = FrameView(memoryview(data)[1:])
+        except ValueError as exc:
+            print(f"[red]Error parsing frame: {exc}[/]")
+            return
+        self.send_frame(frame.header.destination, frame.payload)
@@ -1,5 +1,4 @@
 import threading
-import time
 from typing import TYPE_CHECKING
 
 from rich import print
@@ -62,8 +61,8 @@ class MetricsTester:
                 self._stop_event.wait(sleep_duration)
 
     def timestamp_us(self) -> int:
-        """Returns the current time in microseconds."""
-        return int(time.time() * 1000 * 1000)
+        """Returns the monotonic time of the marilib clock, in microseconds."""
+        return self.marilib.clock.now_us()
 
     def send_metrics_request(self, node: MariNode, marilib_type: str):
         """Sends a metrics request packet to a specific address."""
@@ -1,12 +1,20 @@
+import heapq
+import math
 import statistics
+from array import array
 from collections import deque
 from dataclasses import dataclass, field
-from datetime import datetime, timedelta
 from enum import IntEnum
+from typing import TYPE_CHECKING, Callable, ClassVar, Hashable
 import rich
 
+from marilib.clock import SYSTEM_CLOCK, Clock
 from marilib.mari_protocol import Frame, MetricsProbePayload
 from marilib.protocol import Packet, PacketFieldMetadata
+from marilib.sketch import LATENCY_PERCENTILES, LatencySketch
+
+if TYPE_CHECKING:
+    from marilib.node_table import NodeTable
 
 # schedules taken from: https://github.com/DotBots/mari-evaluation/blob/main/simulations/radio-schedule.ipynb
 SCHEDULES = {
@@ -58,6 +66,13 @@ MARI_PROBE_STATS_EPOCH_DURATION_ASN = 565 * 60  # about 30 seconds
 
 MARI_PROBE_STATS_MAX_LEN = 10
 
+FRAME_HISTORY_CAPACITY = 65536  # suggested max frames kept in each frame history, when enabled
+
+RSSI_HISTOGRAM_MIN_DBM = -120  # lower RSSI are counted in the first bin
+RSSI_HISTOGRAM_MAX_DBM = 0  # higher RSSI are counted in the last bin
+RSSI_HISTOGRAM_WINDOWS = {60: 5, 600: 60, 3600: 300}  # window seconds: bucket seconds
+RSSI_HISTOGRAM_PERIOD = 5  # seconds, frames are added to the histograms once per period
+
 
 @dataclass
 class TestState:
@@ -78,53 +93,39 @@ class EdgeEvent(IntEnum):
         return event.value.to_bytes(1, "little")
 
 
-@dataclass
+@dataclass(slots=True)
 class NodeInfoCloud(Packet):
-    metadata: list[PacketFieldMetadata] = field(
-        default_factory=lambda: [
-            PacketFieldMetadata(name="address", length=8),
-            PacketFieldMetadata(name="gateway_address", length=8),
-        ],
-        repr=False,
-    )
+    metadata: ClassVar[list[PacketFieldMetadata]] = [
+        PacketFieldMetadata(name="address", length=8),
+        PacketFieldMetadata(name="gateway_address", length=8),
+    ]
     address: int = 0
     gateway_address: int = 0
 
 
-@dataclass
+@dataclass(slots=True)
 class NodeInfoEdge(Packet):
-    metadata: list[PacketFieldMetadata] = field(
-        default_factory=lambda: [
-            PacketFieldMetadata(name="address", length=8),
-        ],
-        repr=False,
-    )
+    metadata: ClassVar[list[PacketFieldMetadata]] = [
+        PacketFieldMetadata(name="address", length=8),
+    ]
     address: int = 0
 
     def to_cloud(self, gateway_address: int) -> NodeInfoCloud:
         return NodeInfoCloud(address=self.address, gateway_address=gateway_address)
 
 
-@dataclass
+@dataclass(slots=True)
 class NodeStatsReply(Packet):
     """Dataclass representing the statistics packet sent back by a node."""
 
-    metadata: list[PacketFieldMetadata] = field(
-        default_factory=lambda: [
-            PacketFieldMetadata(name="rx_app_packets", length=4),
-            PacketFieldMetadata(name="tx_app_packets", length=4),
-        ]
-    )
+    metadata: ClassVar[list[PacketFieldMetadata]] = [
+        PacketFieldMetadata(name="rx_app_packets", length=4),
+        PacketFieldMetadata(name="tx_app_packets", length=4),
+    ]
     rx_app_packets: int = 0
     tx_app_packets: int = 0
 
 
-@dataclass
-class FrameLogEntry:
-    frame: Frame
-    ts: datetime = field(default_factory=lambda: datetime.now())
-
-
 @dataclass
 class MetricsStats:
     latencies: deque = field(default_factory=lambda: deque(maxlen=50))
@@ -152,59 +153,355 @@ class MetricsStats:
     # TODO: Add PDR stats
 
 
+class FrameCounters:
+    """Frame counts in a ring of time buckets, covering a sliding window.
+
+    Each bucket holds the number of frames, of test frames and the sum of the
+    RSSI of the frames added during `resolution` seconds. Windowed counts sum
+    the buckets of the last window_secs, counting the oldest one in proportion
+    to the part of it that is still inside the window. They are approximate:
+    exact when frames are spread evenly within that bucket, off by at most its
+    frame count otherwise. Reading does not change the ring, the buckets that
+    went out of the window are only cleared by add.
+    """
+
+    def __init__(self, window_seconds: float, resolution: float = 1.0):
+        if resolution <= 0:
+            raise ValueError("resolution must be > 0")
+        self.resolution = resolution
+        self.size = math.ceil(window_seconds / resolution) + 1
+        self.counts = array("I", bytes(4 * self.size))
+        self.test_counts = array("I", bytes(4 * self.size))
+        self.rssi_sums = array("i", bytes(4 * self.size))
+        self._bucket = 0  # newest bucket, as a number of resolutions since the epoch
+
+    def _advance(self, now: float) -> int:
+        """Clears the buckets that went out of the window, returns the current bucket."""
+        bucket = int(now / self.resolution)
+        if bucket > self._bucket:
+            for stale in range(bucket - min(bucket - self._bucket, self.size) + 1, bucket + 1):
+                index = stale % self.size
+                self.counts[index] = 0
+                self.test_counts[index] = 0
+                self.rssi_sums[index] = 0
+            self._bucket = bucket
+        return bucket
+
+    def add(self, is_test: bool, rssi_dbm: int = 0, now: float | None = None):
+        index = self._advance(SYSTEM_CLOCK.now() if now is None else now) % self.size
+        self.counts[index] += 1
+        if is_test:
+            self.test_counts[index] += 1
+        self.rssi_sums[index] += rssi_dbm
+
+    def sums(self, window_secs: float, now: float | None = None) -> tuple[float, float, float]:
+        """Returns the frame count, test frame count and RSSI sum over the last window_secs."""
+        now = SYSTEM_CLOCK.now() if now is None else now
+        return (
+            self.window_sum(self.counts, window_secs, now),
+            self.window_sum(self.test_counts, window_secs, now),
+            self.window_sum(self.rssi_sums, window_secs, now),
+        )
+
+    def window_sum(self, column: array, window_secs: float, now: float) -> float:
+        """Sums one of the columns over the last window_secs."""
+        bucket = int(now / self.resolution)
+        window = window_secs / self.resolution
+        elapsed = now / self.resolution - bucket  # part of the current bucket already elapsed
+        # frames of the current bucket were all added during the elapsed part
+        total = self._bucket_value(column, bucket) * (
+            min(1.0, window / elapsed) if elapsed > 0 else 1.0
+        )
+        # then the buckets entirely inside the window, and the oldest one, partly inside it
+        full = min(max(math.floor(window - elapsed), 0), self.size - 1)
+        oldest = bucket - full - 1
+        # the buckets of the ring older than size resolutions are stale, but not cleared yet
+        first = max(oldest + 1, self._bucket - self.size + 1)
+        last = min(bucket - 1, self._bucket)
+        if first <= last:
+            total += self._ring_sum(column, first, last - first + 1)
+        if full + 1 < self.size and window - elapsed - full > 0:
+            total += self._bucket_value(column, oldest) * (window - elapsed - full)
+        return total
+
+    def _bucket_value(self, column: array, bucket: int) -> int:
+        """Returns the value of a bucket, 0 if it is not in the ring anymore, or not yet."""
+        if self._bucket - self.size < bucket <= self._bucket:
+            return column[bucket % self.size]
+        return 0
+
+    def _ring_sum(self, column: array, start: int, count: int) -> int:
+        """Sums count buckets of column, from the start index and wrapping around the ring."""
+        start %= self.size
+        end = start + count
+        if end <= self.size:
+            return sum(column[start:end])
+        return sum(column[start:]) + sum(column[: end - self.size])
+
+
+class FrameHistory:
+    """Timestamp, RSSI and test flag of the frames of the last window_seconds.
+
+    Kept in parallel arrays, about 10 bytes per frame, with at most capacity
+    frames. A capacity of 0 disables the history, frames are not kept.
+    """
+
+    def __init__(self, window_seconds: float, capacity: int = FRAME_HISTORY_CAPACITY):
+        if capacity < 0:
+            raise ValueError("capacity must be >= 0")
+        self.window_seconds = window_seconds
+        self.capacity = capacity
+        self.timestamps = array("d")  # Clock.now() at reception
+        self.rssi_dbm = array("b")
+        self.is_test = array("b")
+        self._head = 0  # index of the oldest frame in the arrays
+
+    def __len__(self) -> int:
+        return len(self.timestamps) - self._head
+
+    def __iter__(self):
+        """Yields (timestamp, rssi_dbm, is_test) tuples, oldest first."""
+        for index in range(self._head, len(self.timestamps)):
+            yield self.timestamps[index], self.rssi_dbm[index], bool(self.is_test[index])
+
+    def add(self, rssi_dbm: int, is_test: bool, now: float | None = None):
+        if not self.capacity:
+            return
+        now = SYSTEM_CLOCK.now() if now is None else now
+        self.timestamps.append(now)
+        self.rssi_dbm.append(max(-128, min(127, rssi_dbm)))
+        self.is_test.append(is_test)
+        if len(self) > self.capacity:
+            self._head += 1
+        self.prune(now)
+
+    def prune(self, now: float | None = None):
+        """Forgets the frames older than window_seconds."""
+        now = SYSTEM_CLOCK.now() if now is None else now
+        timestamps = self.timestamps
+        while self._head < len(timestamps) and now - timestamps[self._head] > self.window_seconds:
+            self._head += 1
+        # compact the arrays once half of them is forgotten frames
+        if self._head > 64 and self._head * 2 > len(timestamps):
+            del self.timestamps[: self._head]
+            del self.rssi_dbm[: self._head]
+            del self.is_test[: self._head]
+            self._head = 0
+
+
+class RssiHistogram:
+    """1 dB bins of the RSSI of the frames of the last window_seconds.
+
+    The bins of each `resolution` seconds are kept in a ring of time buckets,
+    and summed in totals that are updated when frames are added and when a
+    bucket goes out of the window. The window covers the current bucket and
+    the previous complete ones. The bins, most of the memory, are allocated
+    with the first frames: a histogram that never had any takes a few hundred bytes.
+    """
+
+    def __init__(self, window_seconds: float, resolution: float):
+        if resolution <= 0:
+            raise ValueError("resolution must be > 0")
+        self.window_seconds = window_seconds
+        self.resolution = resolution
+        self.size = max(math.ceil(window_seconds / resolution), 1)
+        self.bins = RSSI_HISTOGRAM_MAX_DBM - RSSI_HISTOGRAM_MIN_DBM + 1
+        self.buckets: array | None = None  # bins of each bucket, allocated by add_bins
+        self.bucket_counts = array("I", bytes(4 * self.size))
+        self.bucket_sums = array("q", bytes(8 * self.size))  # of the RSSI, in dBm
+        self.bucket_squares = array("q", bytes(8 * self.size))  # of the squared RSSI
+        self.totals: array | None = None  # bins over the window, allocated by add_bins
+        self.count = 0
+        self.sum = 0
+        self.squares = 0
+        self._bucket = 0  # newest bucket, as a number of resolutions since the epoch
+
+    def _advance(self, now: float) -> int:
+        """Removes the buckets that went out of the window from the totals."""
+        bucket = int(now / self.resolution)
+        if bucket > self._bucket:
+            for stale in range(bucket - min(bucket - self._bucket, self.size) + 1, bucket + 1):
+                index = stale % self.size
+                if not self.bucket_counts[index]:
+                    continue
+                start = index * self.bins
+                for offset in range(self.bins):
+                    if count := self.buckets[start + offset]:
+                        self.totals[offset] -= count
+                        self.buckets[start + offset] = 0
+                self.count -= self.bucket_counts[index]
+                self.sum -= self.bucket_sums[index]
+                self.squares -= self.bucket_squares[index]
+                self.bucket_counts[index] = 0
+                self.bucket_sums[index] = 0
+                self.bucket_squares[index] = 0
+            self._bucket = bucket
+        return bucket
+
+    def add_bins(self, bins: dict[int, int], total: int, squares: int, now: float):
+        """Adds frames received at now, as a frame count by RSSI in the histogram range."""
+        index = self._advance(now) % self.size
+        if self.buckets is None:
+            self.buckets = array("I", bytes(4 * self.size * self.bins))
+            self.totals = array("I", bytes(4 * self.bins))
+        start = index * self.bins - RSSI_HISTOGRAM_MIN_DBM
+        count = 0
+        for rssi_dbm, frames in bins.items():
+            self.buckets[start + rssi_dbm] += frames
+            self.totals[rssi_dbm - RSSI_HISTOGRAM_MIN_DBM] += frames
+            count += frames
+        self.bucket_counts[index] += count
+        self.bucket_sums[index] += total
+        self.bucket_squares[index] += squares
+        self.count += count
+        self.sum += total
+        self.squares += squares
+
+    def mean(self, now: float) -> float:
+        self._advance(now)
+        return self.sum / self.count if self.count else 0.0
+
+    def stddev(self, now: float) -> float:
+        self._advance(now)
+        if not self.count:
+            return 0.0
+        mean = self.sum / self.count
+        return math.sqrt(max(self.squares / self.count - mean * mean, 0.0))
+
+    def percentiles(self, percentiles: tuple, now: float) -> tuple[int, ...]:
+        """Returns the RSSI at the given percentiles (0 to 100), 0 without frames."""
+        self._advance(now)
+        values = [0] * len(percentiles)
+        if self.count:
+            ranks = sorted((p / 100 * (self.count - 1), i) for i, p in enumerate(percentiles))
+            offset, seen = -1, 0
+            for rank, position in ranks:
+                while seen <= rank:
+                    offset += 1
+                    seen += self.totals[offset]
+                values[position] = RSSI_HISTOGRAM_MIN_DBM + offset
+        return tuple(values)
+
+    def histogram(self, now: float) -> dict[int, int]:
+        """Returns the frame count by RSSI, for the RSSI with frames."""
+        self._advance(now)
+        if not self.count:
+            return {}
+        return {
+            RSSI_HISTOGRAM_MIN_DBM + offset: count
+            for offset, count in enumerate(self.totals)
+            if count
+        }
+
+
+class RssiWindows:
+    """RSSI histograms over several windows, see RSSI_HISTOGRAM_WINDOWS.
+
+    Frames are first counted in a small dict for the current `period`, which
+    is added to the histograms of all the windows when the period ends or when
+    one of them is read. The resolutions of the windows are multiples of the
+    period, so the frames of a period always fall in a single bucket.
+    """
+
+    def __init__(
+        self,
+        windows: dict[int, float] = RSSI_HISTOGRAM_WINDOWS,
+        period: float = RSSI_HISTOGRAM_PERIOD,
+    ):
+        self.period = period
+        self.windows = {
+            window: RssiHistogram(window, resolution) for window, resolution in windows.items()
+        }
+        self._pending: dict[int, int] = {}  # frame count by RSSI, during the current period
+        self._pending_now = 0.0  # time of the latest pending frame
+        self._period_end = 0.0
+
+    def add(self, rssi_dbm: int, now: float):
+        if now >= self._period_end:
+            self.flush()
+            self._period_end = (int(now / self.period) + 1) * self.period
+        if rssi_dbm < RSSI_HISTOGRAM_MIN_DBM:
+            rssi_dbm = RSSI_HISTOGRAM_MIN_DBM
+        elif rssi_dbm > RSSI_HISTOGRAM_MAX_DBM:
+            rssi_dbm = RSSI_HISTOGRAM_MAX_DBM
+        pending = self._pending
+        pending[rssi_dbm] = pending.get(rssi_dbm, 0) + 1
+        self._pending_now = now
+
+    def flush(self):
+        """Adds the frames of the current period to the histograms."""
+        if not self._pending:
+            return
+        total = sum(rssi_dbm * count for rssi_dbm, count in self._pending.items())
+        squares = sum(rssi_dbm * rssi_dbm * count for rssi_dbm, count in self._pending.items())
+        for histogram in self.windows.values():
+            histogram.add_bins(self._pending, total, squares, self._pending_now)
+        self._pending = {}
+
+    def window(self, window_secs: int) -> RssiHistogram:
+        self.flush()
+        return self.windows[window_secs]
+
+
 @dataclass
 class FrameStats:
     window_seconds: int = 240  # set window duration
-    sent: deque[FrameLogEntry] = field(default_factory=deque)
-    received: deque[FrameLogEntry] = field(default_factory=deque)
+    # max frames kept in sent and received, 0 keeps no history, see FRAME_HISTORY_CAPACITY
+    history_capacity: int = 0
     cumulative_sent: int = 0
     cumulative_received: int = 0
     cumulative_sent_non_test: int = 0
     cumulative_received_non_test: int = 0
+    last_received_rssi_dbm: int = 0
+    resolution_seconds: float = 1.0  # of the windowed counters
+    sent: FrameHistory = field(init=False, repr=False)
+    received: FrameHistory = field(init=False, repr=False)
+    sent_counters: FrameCounters = field(init=False, repr=False)
+    received_counters: FrameCounters = field(init=False, repr=False)
+    # RSSI histograms of the received frames
+    received_rssi: RssiWindows = field(default_factory=RssiWindows, repr=False)
+    clock: Clock = field(default=SYSTEM_CLOCK, repr=False)
+
+    def __post_init__(self):
+        self.keep_history(self.history_capacity)
+        self.sent_counters = FrameCounters(self.window_seconds, self.resolution_seconds)
+        self.received_counters = FrameCounters(self.window_seconds, self.resolution_seconds)
+
+    def keep_history(self, capacity: int = FRAME_HISTORY_CAPACITY):
+        """Keeps the latest frames in sent and received, at most capacity of each."""
+        self.history_capacity = capacity
+        self.sent = FrameHistory(self.window_seconds, capacity)
+        self.received = FrameHistory(self.window_seconds, capacity)
 
     def add_sent(self, frame: Frame):
-        """Adds a sent frame, prunes old entries, and updates counters."""
+        """Adds a sent frame to the counters, and to the history when it is enabled."""
+        is_test = frame.is_test_packet
         self.cumulative_sent += 1
-        if not frame.is_test_packet:
+        if not is_test:
             self.cumulative_sent_non_test += 1  # NOTE: do we need this?
-
-        entry = FrameLogEntry(frame=frame)
-        self.sent.append(entry)
-
-        # remove old entries
-        while self.sent and (entry.ts - self.sent[0].ts).total_seconds() > self.window_seconds:
-            self.sent.popleft()
+        now = self.clock.now()
+        self.sent_counters.add(is_test, now=now)
+        if self.history_capacity:
+            self.sent.add(0, is_test, now=now)
 
     def add_received(self, frame: Frame):
-        """Adds a received frame and prunes old entries."""
+        """Adds a received frame to the counters, the RSSI histograms and the history."""
+        is_test = frame.is_test_packet
         self.cumulative_received += 1
-        if not frame.is_test_packet:
+        if not is_test:
             self.cumulative_received_non_test += 1  # NOTE: do we need this?
-
-        entry = FrameLogEntry(frame=frame)
-        self.received.append(entry)
-
-        # remove old entries
-        while (
-            self.received and (entry.ts - self.received[0].ts).total_seconds() > self.window_seconds
-        ):
-            self.received.popleft()
+        self.last_received_rssi_dbm = frame.stats.rssi_dbm
+        now = self.clock.now()
+        self.received_counters.add(is_test, self.last_received_rssi_dbm, now=now)
+        if self.history_capacity:
+            self.received.add(self.last_received_rssi_dbm, is_test, now=now)
+        self.received_rssi.add(self.last_received_rssi_dbm, now)
 
     def sent_count(self, window_secs: int = 0, include_test_packets: bool = True) -> int:
         if window_secs == 0:
             return self.cumulative_sent if include_test_packets else self.cumulative_sent_non_test
 
-        now = datetime.now()
-        if include_test_packets:
-            return len([e for e in self.sent if now - e.ts < timedelta(seconds=window_secs)])
-        else:
-            return len(
-                [
-                    e
-                    for e in self.sent
-                    if now - e.ts < timedelta(seconds=window_secs) and not e.frame.is_test_packet
-                ]
-            )
+        return self._window_count(self.sent_counters, window_secs, include_test_packets)
 
     def received_count(self, window_secs: int = 0, include_test_packets: bool = True) -> int:
         if window_secs == 0:
@@ -214,16 +511,16 @@ class FrameStats:
                 else self.cumulative_received_non_test
             )
 
-        now = datetime.now()
-        if include_test_packets:
-            entries = [e for e in self.received if now - e.ts < timedelta(seconds=window_secs)]
-        else:
-            entries = [
-                e
-                for e in self.received
-                if now - e.ts < timedelta(seconds=window_secs) and not e.frame.is_test_packet
-            ]
-        return len(entries)
+        return self._window_count(self.received_counters, window_secs, include_test_packets)
+
+    def _window_count(
+        self, counters: FrameCounters, window_secs: float, include_test_packets: bool
+    ) -> int:
+        now = self.clock.now()
+        counts = counters.window_sum(counters.counts, window_secs, now)
+        if not include_test_packets:
+            counts -= counters.window_sum(counters.test_counts, window_secs, now)
+        return round(counts)
 
     def success_rate(self, window_secs: int = 0) -> float:
         s = self.sent_count(window_secs, include_test_packets=True)
@@ -233,25 +530,149 @@ class FrameStats:
         return min(r / s, 1.0)
 
     def received_rssi_dbm(self, window_secs: int = 0) -> float:
-        if not self.received:
+        counts, _, rssi_sums = self.received_counters.sums(
+            window_secs or self.window_seconds, self.clock.now()
+        )
+        if counts == 0:
             return 0
 
         if window_secs == 0:
-            return int(self.received[-1].frame.stats.rssi_dbm) if self.received else 0
-        n = datetime.now()
-        d = [
-            e.frame.stats.rssi_dbm
-            for e in self.received
-            if (n - e.ts < timedelta(seconds=window_secs))
-        ]
-        return int(sum(d) / len(d) if d else 0)
+            return int(self.last_received_rssi_dbm)
+        return int(rssi_sums / counts)
+
+    def rssi_mean_dbm(self, window_secs: int = 60) -> float:
+        """Mean RSSI of the received frames, window_secs is one of RSSI_HISTOGRAM_WINDOWS"""
+        return self.received_rssi.window(window_secs).mean(self.clock.now())
+
+    def rssi_stddev_dbm(self, window_secs: int = 60) -> float:
+        return self.received_rssi.window(window_secs).stddev(self.clock.now())
+
+    def rssi_percentiles_dbm(
+        self, percentiles: tuple = (5, 50, 95), window_secs: int = 60
+    ) -> tuple[int, ...]:
+        return self.received_rssi.window(window_secs).percentiles(percentiles, self.clock.now())
+
+    def rssi_trend_db(self, short_window_secs: int = 60, long_window_secs: int = 3600) -> float:
+        """Mean RSSI of the short window minus the one of the long window.
+
+        Negative when the link is degrading, 0 until both windows have frames.
+        """
+        now = self.clock.now()
+        short = self.received_rssi.window(short_window_secs)
+        long = self.received_rssi.window(long_window_secs)
+        short_mean, long_mean = short.mean(now), long.mean(now)
+        if not short.count or not long.count:
+            return 0.0
+        return short_mean - long_mean
+
+
+class ExpiryQueue:
+    """Keys (node or gateway addresses) in a heap ordered by deadline.
+
+    Deadlines can move later without touching the heap: each key is in the heap
+    at most once, and is only checked when its scheduled deadline is reached,
+    then either expired or pushed back with its current deadline. Popping the
+    expired keys costs O(expired + rescheduled), whatever the number of keys.
+    """
+
+    def __init__(self):
+        self._heap: list[tuple[float, Hashable]] = []
+        self._scheduled: set[Hashable] = set()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def schedule(self, key: Hashable, deadline: float):
+        """Adds a key, unless it is already in the heap, where its deadline will be checked."""
+        if key in self._scheduled:
+            return
+        self._scheduled.add(key)
+        heapq.heappush(self._heap, (deadline, key))
+
+    def pop_expired(
+        self, now: float, deadline_of: Callable[[Hashable], float | None]
+    ) -> list[Hashable]:
+        """Returns the keys whose current deadline, given by deadline_of, is passed.
+
+        Keys for which deadline_of returns None are forgotten.
+        """
+        heap = self._heap
+        expired = []
+        while heap and heap[0][0] <= now:
+            _, key = heapq.heappop(heap)
+            deadline = deadline_of(key)
+            if deadline is not None and deadline > now:
+                heapq.heappush(heap, (deadline, key))
+                continue
+            self._scheduled.discard(key)
+            if deadline is not None:
+                expired.append(key)
+        return expired
+
+
+# probe metrics of each node summed by NodeAggregates, in the order of MariNode.probe_metrics
+NODE_AGGREGATE_METRICS = [
+    "pdr_downlink_radio",
+    "pdr_uplink_radio",
+    "pdr_downlink_uart",
+    "pdr_uplink_uart",
+    "avg_latency_roundtrip_node_edge_ms",
+    "avg_latency_roundtrip_node_cloud_ms",
+    "latest_node_tx_count",
+    "latest_node_rx_count",
+    "latest_gw_tx_count",
+    "latest_gw_rx_count",
+]
+EMPTY_PROBE_METRICS = (0,) * len(NODE_AGGREGATE_METRICS)
+_NODE_AGGREGATE_INDEXES = {metric: index for index, metric in enumerate(NODE_AGGREGATE_METRICS)}
+
+
+class NodeAggregates:
+    """Running sums of the probe metrics of the nodes of a gateway.
+
+    Updated when a node joins or leaves and when one of them saves a probe, so
+    reading a gateway average costs the same whatever the number of nodes.
+    The latency sketches are the merge of the latency sketches of the nodes.
+    """
+
+    def __init__(self):
+        self.sums = list(EMPTY_PROBE_METRICS)
+        self.count = 0
+        self.latency_edge = LatencySketch()
+        self.latency_cloud = LatencySketch()
+
+    def add(self, node: "MariNode"):
+        self.count += 1
+        self.replace(EMPTY_PROBE_METRICS, node.probe_metrics)
+        self.latency_edge.merge(node.latency_edge)
+        self.latency_cloud.merge(node.latency_cloud)
+
+    def remove(self, node: "MariNode"):
+        self.count -= 1
+        self.replace(node.probe_metrics, EMPTY_PROBE_METRICS)
+        self.latency_edge.subtract(node.latency_edge)
+        self.latency_cloud.subtract(node.latency_cloud)
+
+    def replace(self, old: tuple, new: tuple):
+        sums = self.sums
+        for index, (old_value, new_value) in enumerate(zip(old, new)):
+            sums[index] += new_value - old_value
+        if self.count == 0:
+            # no rounding errors left behind
+            self.sums = list(EMPTY_PROBE_METRICS)
+
+    def sum(self, metric: str):
+        return self.sums[_NODE_AGGREGATE_INDEXES[metric]]
+
+    def average(self, metric: str) -> float:
+        return self.sum(metric) / self.count if self.count else 0.0
 
 
 @dataclass
 class MariNode:
     address: int
     gateway_address: int
-    last_seen: datetime = field(default_factory=lambda: datetime.now())
+    last_seen: float = None  # Clock.now(), set on creation
     probe_stats: deque[MetricsProbePayload] = field(
         default_factory=lambda: deque(maxlen=MARI_PROBE_STATS_MAX_LEN)
     )  # NOTE: related to frequency of probe stats
@@ -263,14 +684,68 @@ class MariNode:
     pdr_uplink: float = 0.0
     probe_tx_count: int = 0
     probe_rx_count: int = 0
+    clock: Clock = field(default=SYSTEM_CLOCK, repr=False)
+    # values of NODE_AGGREGATE_METRICS, computed when a probe is saved
+    probe_metrics: tuple = field(default=EMPTY_PROBE_METRICS, init=False, repr=False)
+    # round trip times of all the probes, in milliseconds
+    latency_edge: LatencySketch = field(default_factory=LatencySketch, init=False, repr=False)
+    latency_cloud: LatencySketch = field(default_factory=LatencySketch, init=False, repr=False)
+    # sums of the gateway the node is part of
+    aggregates: NodeAggregates | None = field(default=None, init=False, repr=False)
+    # columnar copy of the node, when the gateway has a node table
+    node_table: "NodeTable | None" = field(default=None, init=False, repr=False)
+    node_slot: int = field(default=-1, init=False, repr=False)
+
+    def __post_init__(self):
+        if self.last_seen is None:
+            self.last_seen = self.clock.now()
+        self.stats.clock = self.clock
+
+    @property
+    def alive_until(self) -> float:
+        return self.last_seen + MARI_TIMEOUT_NODE_IS_ALIVE
 
     @property
     def is_alive(self) -> bool:
-        return datetime.now() - self.last_seen < timedelta(seconds=MARI_TIMEOUT_NODE_IS_ALIVE)
+        return self.clock.now() < self.alive_until
 
     def save_probe_stats(self, probe_stats: MetricsProbePayload):
         # save the current probe stats
         self.probe_stats.append(probe_stats)
+        previous, self.probe_metrics = self.probe_metrics, self._compute_probe_metrics()
+        if self.aggregates is not None:
+            self.aggregates.replace(previous, self.probe_metrics)
+        if self.node_table is not None:
+            self.node_table.set_probe(
+                self.node_slot,
+                self.probe_metrics,
+                probe_stats.rssi_at_node_dbm(),
+                probe_stats.rssi_at_gw_dbm(),
+            )
+        # a probe that did not go through the edge or the cloud has no round trip time
+        if (latency := probe_stats.latency_roundtrip_node_edge_ms()) > 0:
+            self.latency_edge.add(latency)
+            if self.aggregates is not None:
+                self.aggregates.latency_edge.add(latency)
+        if (latency := probe_stats.latency_roundtrip_node_cloud_ms()) > 0:
+            self.latency_cloud.add(latency)
+            if self.aggregates is not None:
+                self.aggregates.latency_cloud.add(latency)
+
+    def _compute_probe_metrics(self) -> tuple:
+        latest = self.probe_stats_latest
+        return (
+            self.stats_pdr_downlink_radio(),
+            self.stats_pdr_uplink_radio(),
+            self.stats_pdr_downlink_uart(),
+            self.stats_pdr_uplink_uart(),
+            self.stats_avg_latency_roundtrip_node_edge_ms(),
+            self.stats_avg_latency_roundtrip_node_cloud_ms(),
+            latest.node_tx_count,
+            latest.node_rx_count,
+            latest.gw_tx_count,
+            latest.gw_rx_count,
+        )
 
     @property
     def probe_stats_latest(self) -> MetricsProbePayload | None:
@@ -352,28 +827,71 @@ class MariNode:
             return 0
         return self.probe_stats_latest.latency_roundtrip_node_cloud_ms()
 
+    def stats_latency_roundtrip_node_edge_ms_percentiles(
+        self, percentiles: tuple = LATENCY_PERCENTILES
+    ) -> tuple[float, ...]:
+        """Latencies between node and edge at the given percentiles, over all probes"""
+        return self.latency_edge.percentiles(percentiles)
+
+    def stats_latency_roundtrip_node_cloud_ms_percentiles(
+        self, percentiles: tuple = LATENCY_PERCENTILES
+    ) -> tuple[float, ...]:
+        """Latencies between node and cloud at the given percentiles, over all probes"""
+        return self.latency_cloud.percentiles(percentiles)
+
+    def mark_seen(self, now: float):
+        self.last_seen = now
+        if self.node_table is not None:
+            self.node_table.set_last_seen(self.node_slot, now)
+
+    def attach_node_table(self, node_table: "NodeTable"):
+        """Copies the node to a new slot of node_table, then keeps the slot up to date."""
+        self.node_table = node_table
+        self.node_slot = node_table.allocate(
+            self.address,
+            self.gateway_address,
+            self.last_seen,
+            sent_count=self.stats.cumulative_sent,
+            received_count=self.stats.cumulative_received,
+            last_rssi_dbm=self.stats.last_received_rssi_dbm,
+        )
+        if latest := self.probe_stats_latest:
+            node_table.set_probe(
+                self.node_slot,
+                self.probe_metrics,
+                latest.rssi_at_node_dbm(),
+                latest.rssi_at_gw_dbm(),
+            )
+
+    def detach_node_table(self):
+        if self.node_table is not None:
+            self.node_table.release(self.node_slot)
+            self.node_table, self.node_slot = None, -1
+
     def register_received_frame(self, frame: Frame):
         self.stats.add_received(frame)
+        if self.node_table is not None:
+            self.node_table.add_received(self.node_slot, frame.stats.rssi_dbm)
 
     def register_sent_frame(self, frame: Frame):
         self.stats.add_sent(frame)
+        if self.node_table is not None:
+            self.node_table.add_sent(self.node_slot)
 
     def as_node_info_cloud(self) -> NodeInfoCloud:
         return NodeInfoCloud(address=self.address, gateway_address=self.gateway_address)
 
 
-@dataclass
+@dataclass(slots=True)
 class GatewayInfo(Packet):
-    metadata: list[PacketFieldMetadata] = field(
-        default_factory=lambda: [
-            PacketFieldMetadata(name="address", length=8),
-            PacketFieldMetadata(name="network_id", length=2),
-            PacketFieldMetadata(name="schedule_id", length=1),
-            PacketFieldMetadata(name="schedule_stats", length=4 * 8),  # 4 uint64_t values
-            PacketFieldMetadata(name="asn", length=8),
-            PacketFieldMetadata(name="timer", length=4),
-        ]
-    )
+    metadata: ClassVar[list[PacketFieldMetadata]] = [
+        PacketFieldMetadata(name="address", length=8),
+        PacketFieldMetadata(name="network_id", length=2),
+        PacketFieldMetadata(name="schedule_id", length=1),
+        PacketFieldMetadata(name="schedule_stats", length=4 * 8),  # 4 uint64_t values
+        PacketFieldMetadata(name="asn", length=8),
+        PacketFieldMetadata(name="timer", length=4),
+    ]
     address: int = 0
     network_id: int = 0
     schedule_id: int = 0
@@ -456,10 +974,31 @@ class MariGateway:
     node_registry: dict[int, MariNode] = field(default_factory=dict)
     stats: FrameStats = field(default_factory=FrameStats)
     metrics_stats: MetricsStats = field(default_factory=MetricsStats)
-    last_seen: datetime = field(default_factory=lambda: datetime.now())
+    last_seen: float = None  # Clock.now(), updated on gateway info
+    clock: Clock = field(default=SYSTEM_CLOCK, repr=False)
+    # sums of the probe metrics of the nodes, maintained by add_node and remove_node
+    aggregates: NodeAggregates = field(default_factory=NodeAggregates, init=False, repr=False)
+    # addresses of the nodes, by liveness deadline
+    node_expiry: ExpiryQueue = field(default_factory=ExpiryQueue, init=False, repr=False)
+    # optional columnar copy of the nodes, usually shared by all the gateways of a cloud
+    node_table: "NodeTable | None" = field(default=None, repr=False)
+    # frames kept in the history of the gateway and of the nodes it adds, 0 keeps no history
+    frame_history_capacity: int = 0
 
     def __post_init__(self):
-        self.last_seen = datetime.now()
+        self.last_seen = self.clock.now()
+        self.stats.clock = self.clock
+        if self.frame_history_capacity:
+            self.stats.keep_history(self.frame_history_capacity)
+        for addr, node in self.node_registry.items():
+            self._attach_node(addr, node)
+
+    def _attach_node(self, addr: int, node: MariNode):
+        node.aggregates = self.aggregates
+        self.aggregates.add(node)
+        self.node_expiry.schedule(addr, node.alive_until)
+        if self.node_table is not None:
+            node.attach_node_table(self.node_table)
 
     @property
     def nodes(self) -> list[MariNode]:
@@ -469,102 +1008,118 @@ class MariGateway:
     def nodes_addresses(self) -> list[int]:
         return list(self.node_registry.keys())
 
+    @property
+    def alive_until(self) -> float:
+        return self.last_seen + MARI_TIMEOUT_GATEWAY_IS_ALIVE
+
     @property
     def is_alive(self) -> bool:
-        return datetime.now() - self.last_seen < timedelta(seconds=MARI_TIMEOUT_GATEWAY_IS_ALIVE)
+        return self.clock.now() < self.alive_until
 
-    def stats_avg_pdr_downlink_radio(self) -> float:
-        if not self.nodes:
-            return 0.0
-        res = sum(n.stats_pdr_downlink_radio() for n in self.nodes) / len(self.nodes)
+    def _average_pdr(self, metric: str) -> float:
+        res = self.aggregates.average(metric)
         return res if res >= 0 and res <= 1.0 else 0.0
 
+    def _average_latency(self, metric: str) -> float:
+        res = self.aggregates.average(metric)
+        return res if res >= 0 else 0.0
+
+    def stats_avg_pdr_downlink_radio(self) -> float:
+        return self._average_pdr("pdr_downlink_radio")
+
     def stats_avg_pdr_uplink_radio(self) -> float:
-        if not self.nodes:
-            return 0.0
-        res = sum(n.stats_pdr_uplink_radio() for n in self.nodes) / len(self.nodes)
-        return res if res >= 0 and res <= 1.0 else 0.0
+        return self._average_pdr("pdr_uplink_radio")
 
     def stats_avg_pdr_downlink_uart(self) -> float:
-        if not self.nodes:
-            return 0.0
-        res = sum(n.stats_pdr_downlink_uart() for n in self.nodes) / len(self.nodes)
-        return res if res >= 0 and res <= 1.0 else 0.0
+        return self._average_pdr("pdr_downlink_uart")
 
     def stats_avg_pdr_uplink_uart(self) -> float:
-        if not self.nodes:
-            return 0.0
-        res = sum(n.stats_pdr_uplink_uart() for n in self.nodes) / len(self.nodes)
-        return res if res >= 0 and res <= 1.0 else 0.0
+        return self._average_pdr("pdr_uplink_uart")
 
     def stats_avg_latency_roundtrip_node_edge_ms(self) -> float:
-        if not self.nodes:
-            return 0.0
-        res = sum(n.stats_avg_latency_roundtrip_node_edge_ms() for n in self.nodes) / len(
-            self.nodes
-        )
-        return res if res >= 0 else 0.0
+        return self._average_latency("avg_latency_roundtrip_node_edge_ms")
 
     def stats_avg_latency_roundtrip_node_cloud_ms(self) -> float:
-        if not self.nodes:
-            return 0.0
-        res = sum(n.stats_avg_latency_roundtrip_node_cloud_ms() for n in self.nodes) / len(
-            self.nodes
-        )
-        return res if res >= 0 else 0.0
+        return self._average_latency("avg_latency_roundtrip_node_cloud_ms")
+
+    def stats_latency_roundtrip_node_edge_ms_percentiles(
+        self, percentiles: tuple = LATENCY_PERCENTILES
+    ) -> tuple[float, ...]:
+        """Latencies between the nodes and edge at the given percentiles, over all their probes"""
+        return self.aggregates.latency_edge.percentiles(percentiles)
+
+    def stats_latency_roundtrip_node_cloud_ms_percentiles(
+        self, percentiles: tuple = LATENCY_PERCENTILES
+    ) -> tuple[float, ...]:
+        """Latencies between the nodes and cloud at the given percentiles, over all their probes"""
+        return self.aggregates.latency_cloud.percentiles(percentiles)
 
     def stats_latest_node_tx_count(self) -> int:
         """Returns sum of tx counts for all nodes"""
-        if not self.nodes:
-            return 0
-        return sum(n.probe_stats_latest.node_tx_count for n in self.nodes if n.probe_stats_latest)
+        return self.aggregates.sum("latest_node_tx_count")
 
     def stats_latest_node_rx_count(self) -> int:
         """Returns sum of rx counts for all nodes"""
-        if not self.nodes:
-            return 0
-        return sum(n.probe_stats_latest.node_rx_count for n in self.nodes if n.probe_stats_latest)
+        return self.aggregates.sum("latest_node_rx_count")
 
     def stats_latest_gw_tx_count(self) -> int:
         """Returns sum of tx counts for all nodes"""
-        if not self.nodes:
-            return 0
-        return sum(n.probe_stats_latest.gw_tx_count for n in self.nodes if n.probe_stats_latest)
+        return self.aggregates.sum("latest_gw_tx_count")
 
     def stats_latest_gw_rx_count(self) -> int:
         """Returns sum of rx counts for all nodes"""
-        if not self.nodes:
-            return 0
-        return sum(n.probe_stats_latest.gw_rx_count for n in self.nodes if n.probe_stats_latest)
+        return self.aggregates.sum("latest_gw_rx_count")
 
-    def update(self):
-        """Recurrent bookkeeping. Don't forget to call this periodically on your main loop."""
-        self.node_registry = {
-            addr: node for addr, node in self.node_registry.items() if node.is_alive
-        }
+    def update(self) -> list[MariNode]:
+        """Recurrent bookkeeping. Don't forget to call this periodically on your main loop.
+
+        Returns the nodes that timed out, which are removed from the gateway.
+        """
+        expired = self.node_expiry.pop_expired(self.clock.now(), self._node_alive_until)
+        return [self.remove_node(addr) for addr in expired]
+
+    def _node_alive_until(self, addr: int) -> float | None:
+        node = self.node_registry.get(addr)
+        return node.alive_until if node else None
 
     def set_info(self, info: GatewayInfo):
         self.info = info
-        self.last_seen = datetime.now()
+        self.last_seen = self.clock.now()
 
     def get_node(self, addr: int) -> MariNode | None:
         return self.node_registry.get(addr)
 
     def add_node(self, addr: int) -> MariNode:
         if node := self.get_node(addr):
-            node.last_seen = datetime.now()
+            node.mark_seen(self.clock.now())
             return node
-        node = MariNode(addr, self.info.address)
+        node = MariNode(addr, self.info.address, clock=self.clock)
+        if self.frame_history_capacity:
+            node.stats.keep_history(self.frame_history_capacity)
         self.node_registry[addr] = node
+        self._attach_node(addr, node)
+        return node
+
+    def move_node_in(self, node: MariNode) -> MariNode:
+        """Adds a node removed from another gateway, keeping its stats, sketches and probes."""
+        node.gateway_address = self.info.address
+        node.mark_seen(self.clock.now())
+        self.node_registry[node.address] = node
+        self._attach_node(node.address, node)
         return node
 
     def remove_node(self, addr: int) -> MariNode | None:
-        return self.node_registry.pop(addr, None)
+        node = self.node_registry.pop(addr, None)
+        if node is not None:
+            self.aggregates.remove(node)
+            node.aggregates = None
+            node.detach_node_table()
+        return node
 
     def update_node_liveness(self, addr: int) -> MariNode:
         node = self.get_node(addr)
         if node:
-            node.last_seen = datetime.now()
+            node.mark_seen(self.clock.now())
         else:
             node = self.add_node(addr)
         return node
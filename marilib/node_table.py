@@ -0,0 +1,178 @@
+"""Columnar copy of the nodes of a cloud, for fleet-wide aggregates with NumPy.
+
+Requires the optional numpy dependency (pip install marilib-pkg[numpy]).
+
+Each node attached to a NodeTable owns a slot, the same index in every column.
+The nodes write their liveness, frame counts, RSSI and probe metrics to their
+slot as they are updated, so fleet-wide counts, averages and rankings are
+vectorized operations on the columns instead of loops over MariNode objects.
+Windowed stats, sketches and probe histories stay in the MariNode objects.
+"""
+
+from typing import Any
+
+from marilib.model import MARI_TIMEOUT_NODE_IS_ALIVE, NODE_AGGREGATE_METRICS
+
+# columns of the table, a NumPy array each
+NODE_TABLE_FIELDS = [
+    ("in_use", "?"),  # False for the free slots
+    ("address", "<u8"),
+    ("gateway_address", "<u8"),
+    ("last_seen", "<f8"),  # Clock.now()
+    ("sent_count", "<i8"),
+    ("received_count", "<i8"),
+    ("last_rssi_dbm", "<i2"),  # of the last frame received from the node
+    ("has_probe", "?"),  # the probe metrics and RSSI below are set
+    *[(metric, "<f8") for metric in NODE_AGGREGATE_METRICS],
+    ("rssi_node_dbm", "<i2"),  # of the latest probe
+    ("rssi_gw_dbm", "<i2"),
+]
+NODE_TABLE_INITIAL_CAPACITY = 256  # slots, doubled when full
+_PROBE_COLUMNS = [metric for metric, _ in NODE_TABLE_FIELDS if metric in NODE_AGGREGATE_METRICS]
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError as exc:
+        raise ImportError(
+            "numpy is required for the node table: pip install marilib-pkg[numpy]"
+        ) from exc
+    return numpy
+
+
+class NodeTable:
+    """Struct of arrays of the nodes, indexed by slot.
+
+    Written by the thread that updates the model, with its lock held. Read the
+    aggregates with the same lock held to get a consistent view.
+    """
+
+    def __init__(self, capacity: int = NODE_TABLE_INITIAL_CAPACITY):
+        if capacity < 1:
+            raise ValueError("capacity must be >= 1")
+        self.np = _numpy()
+        self.columns: dict[str, Any] = {
+            name: self.np.zeros(capacity, dtype) for name, dtype in NODE_TABLE_FIELDS
+        }
+        self._free = list(range(capacity - 1, -1, -1))  # free slots, lowest last
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, name: str) -> Any:
+        """Returns a column, including the free slots, see in_use."""
+        return self.columns[name]
+
+    @property
+    def capacity(self) -> int:
+        return len(self.columns["in_use"])
+
+    # ============================ Written by the nodes ========================
+
+    def allocate(
+        self,
+        address: int,
+        gateway_address: int,
+        last_seen: float,
+        sent_count: int = 0,
+        received_count: int = 0,
+        last_rssi_dbm: int = 0,
+    ) -> int:
+        """Returns the slot of a new node, growing the columns when they are full."""
+        if not self._free:
+            self._grow()
+        slot = self._free.pop()
+        for column in self.columns.values():
+            column[slot] = 0
+        columns = self.columns
+        columns["in_use"][slot] = True
+        columns["address"][slot] = address
+        columns["gateway_address"][slot] = gateway_address
+        columns["last_seen"][slot] = last_seen
+        columns["sent_count"][slot] = sent_count
+        columns["received_count"][slot] = received_count
+        columns["last_rssi_dbm"][slot] = last_rssi_dbm
+        self._count += 1
+        return slot
+
+    def release(self, slot: int):
+        self.columns["in_use"][slot] = False
+        self._free.append(slot)
+        self._count -= 1
+
+    def _grow(self):
+        capacity = self.capacity
+        columns = {}
+        for name, column in self.columns.items():
+            columns[name] = self.np.zeros(capacity * 2, column.dtype)
+            columns[name][:capacity] = column
+        # a single reference swap, readers see the old or the new columns
+        self.columns = columns
+        self._free = list(range(capacity * 2 - 1, capacity - 1, -1))
+
+    def set_last_seen(self, slot: int, now: float):
+        self.columns["last_seen"][slot] = now
+
+    def add_received(self, slot: int, rssi_dbm: int):
+        self.columns["received_count"][slot] += 1
+        self.columns["last_rssi_dbm"][slot] = rssi_dbm
+
+    def add_sent(self, slot: int):
+        self.columns["sent_count"][slot] += 1
+
+    def set_probe(self, slot: int, probe_metrics: tuple, rssi_node_dbm: int, rssi_gw_dbm: int):
+        """Saves the probe metrics, in the order of NODE_AGGREGATE_METRICS."""
+        columns = self.columns
+        for name, value in zip(_PROBE_COLUMNS, probe_metrics):
+            columns[name][slot] = value
+        columns["rssi_node_dbm"][slot] = rssi_node_dbm
+        columns["rssi_gw_dbm"][slot] = rssi_gw_dbm
+        columns["has_probe"][slot] = True
+
+    # ============================ Fleet-wide aggregates =======================
+
+    def alive(self, now: float) -> Any:
+        """Returns the mask of the slots of the nodes alive at now."""
+        columns = self.columns
+        return columns["in_use"] & (now < columns["last_seen"] + MARI_TIMEOUT_NODE_IS_ALIVE)
+
+    def alive_count(self, now: float) -> int:
+        return int(self.np.count_nonzero(self.alive(now)))
+
+    def alive_count_by_gateway(self, now: float) -> dict[int, int]:
+        columns = self.columns
+        gateways, counts = self.np.unique(
+            columns["gateway_address"][self.alive(now)], return_counts=True
+        )
+        return {int(gateway): int(count) for gateway, count in zip(gateways, counts)}
+
+    def averages(self, gateway_address: int | None = None) -> dict[str, float]:
+        """Averages of the probe metrics over the nodes with a probe, of a gateway or of all."""
+        columns = self.columns
+        mask = columns["in_use"] & columns["has_probe"]
+        if gateway_address is not None:
+            mask &= columns["gateway_address"] == gateway_address
+        count = int(self.np.count_nonzero(mask))
+        return {
+            name: float(columns[name][mask].mean()) if count else 0.0
+            for name in _PROBE_COLUMNS + ["rssi_node_dbm", "rssi_gw_dbm"]
+        }
+
+    def worst(self, metric: str = "pdr_uplink_radio", k: int = 10) -> list[tuple[int, int, float]]:
+        """Returns (address, gateway address, value) of the k nodes with the lowest metric.
+
+        Only the nodes with a probe are ranked, the lowest value first.
+        """
+        columns = self.columns
+        slots = self.np.flatnonzero(columns["in_use"] & columns["has_probe"])
+        values = columns[metric][slots]
+        if len(slots) > k:
+            selected = self.np.argpartition(values, k)[:k]
+            slots, values = slots[selected], values[selected]
+        order = self.np.argsort(values, kind="stable")
+        return [
+            (int(columns["address"][slot]), int(columns["gateway_address"][slot]), float(value))
+            for slot, value in zip(slots[order], values[order])
+        ]
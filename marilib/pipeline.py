@@ -0,0 +1,107 @@
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+
+DISPATCH_QUEUE_SIZE = 1024  # max items waiting, per worker
+
+
+@dataclass
+class StageStats:
+    """Latency statistics of a pipeline stage."""
+
+    count: int = 0
+    total_s: float = 0.0
+    max_s: float = 0.0
+
+    def add(self, duration_s: float):
+        self.count += 1
+        self.total_s += duration_s
+        if duration_s > self.max_s:
+            self.max_s = duration_s
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total_s / self.count * 1000 if self.count else 0.0
+
+    @property
+    def max_ms(self) -> float:
+        return self.max_s * 1000
+
+
+class DispatchPipeline:
+    """
+    Runs the handling of received data in worker threads, so that the thread
+    receiving the data only has to queue it.
+
+    Each item goes through the stages in order: a stage is called with the value
+    returned by the previous one, and returning None stops the processing of the
+    item. Items with the same key (e.g. the same node address) are handled by
+    the same worker, so they are processed in the order they were submitted.
+    """
+
+    def __init__(
+        self,
+        stages: list[tuple[str, Callable[[Any], Any]]],
+        workers: int = 1,
+        queue_size: int = DISPATCH_QUEUE_SIZE,
+        key: Callable[[Any], int] | None = None,
+    ):
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+        self.stages = stages
+        self.key = key
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self.stats = {name: StageStats() for name in ["queue", *(name for name, _ in stages)]}
+        self.dropped = 0
+        self._stats_lock = threading.Lock()
+        self._logger = logging.getLogger(__name__)
+        self._threads = [
+            threading.Thread(target=self._run, args=(q,), daemon=True) for q in self.queues
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(q.qsize() for q in self.queues)
+
+    def submit(self, item) -> bool:
+        """Queues an item, returns False if it was dropped because the queue is full."""
+        index = self.key(item) % len(self.queues) if self.key and len(self.queues) > 1 else 0
+        try:
+            self.queues[index].put_nowait((time.perf_counter(), item))
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+            return False
+        return True
+
+    def stop(self):
+        """Handles what is already queued, then stops the workers."""
+        for q in self.queues:
+            q.put((0, None))
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self, q: queue.Queue):
+        while True:
+            ts, item = q.get()
+            if item is None:
+                break
+            durations = [("queue", time.perf_counter() - ts)]
+            for name, stage in self.stages:
+                start = time.perf_counter()
+                try:
+                    item = stage(item)
+                except Exception:
+                    self._logger.exception(f"Error in pipeline stage {name}")
+                    item = None
+                durations.append((name, time.perf_counter() - start))
+                if item is None:
+                    break
+            with self._stats_lock:
+                for name, duration in durations:
+                    self.stats[name].add(duration)
@@ -1,6 +1,7 @@
 # TODO: import this from like PyDotBot or similar
 
 import dataclasses
+import struct
 import typing
 from abc import ABC
 from dataclasses import dataclass
@@ -36,74 +37,204 @@ class PacketFieldMetadata:
             self.disp = self.name
 
 
+# struct format characters of the integer fields, by length
+_STRUCT_INT_FORMATS = {1: "b", 2: "h", 4: "i", 8: "q"}
+
+
+class PacketCodec:
+    """Encoder/decoder of a Packet subclass, compiled once from its metadata.
+
+    Runs of consecutive integer fields of 1, 2, 4 or 8 bytes are decoded and
+    encoded with a single struct.Struct. Other fields (bytes, lists, integers of
+    other lengths) fall back to dedicated handlers.
+    """
+
+    def __init__(self, packet_class: type):
+        fields = dataclasses.fields(packet_class)
+        self.metadata = packet_class.metadata
+        # metadata describes every field, in the same order
+        if not fields or len(fields) != len(self.metadata):
+            raise ValueError("metadata must describe every field")
+        # (struct, fields, metadata) for a run of integer fields,
+        # (None, [field], [metadata]) for the other fields
+        self.segments = []
+        run = []
+        for metadata, field in zip(self.metadata, fields):
+            if metadata.type_ is int and metadata.length in _STRUCT_INT_FORMATS:
+                run.append((field, metadata))
+                continue
+            if run:
+                self.segments.append(self._compile_run(run))
+                run = []
+            self.segments.append((None, [field], [metadata]))
+        if run:
+            self.segments.append(self._compile_run(run))
+        self.names = [[field.name for field in fields_] for _, fields_, _ in self.segments]
+        # the whole packet fits in a single struct, the common case
+        self.struct = self.segments[0][0] if len(self.segments) == 1 else None
+
+    @staticmethod
+    def _compile_run(run: list) -> tuple:
+        format_ = "<"
+        for _, metadata in run:
+            int_format = _STRUCT_INT_FORMATS[metadata.length]
+            format_ += int_format if metadata.signed else int_format.upper()
+        return (
+            struct.Struct(format_),
+            [field for field, _ in run],
+            [metadata for _, metadata in run],
+        )
+
+    def decode(self, packet: "Packet", buffer, offset: int = 0) -> int:
+        """Decodes the packet at offset in buffer, returns the offset right after it.
+
+        The buffer is never sliced, except for the values of bytes fields.
+        """
+        if self.struct is not None:
+            if len(buffer) - offset < self.struct.size:
+                raise ValueError("Not enough bytes to parse")
+            for name, value in zip(self.names[0], self.struct.unpack_from(buffer, offset)):
+                setattr(packet, name, value)
+            return offset + self.struct.size
+        for (struct_, fields, metadata), names in zip(self.segments, self.names):
+            if struct_ is None:
+                offset = self._decode_field(packet, buffer, offset, fields[0], metadata[0])
+                continue
+            if len(buffer) - offset < struct_.size:
+                raise ValueError("Not enough bytes to parse")
+            for name, value in zip(names, struct_.unpack_from(buffer, offset)):
+                setattr(packet, name, value)
+            offset += struct_.size
+        return offset
+
+    def encode(self, packet: "Packet") -> bytearray:
+        if self.struct is not None:
+            buffer = bytearray(self.struct.size)
+            try:
+                self.struct.pack_into(buffer, 0, *[getattr(packet, name) for name in self.names[0]])
+                return buffer
+            except struct.error:
+                # not an integer, or out of range: fall back to the field by field encoding
+                pass
+        buffer = bytearray()
+        for (struct_, _, metadata), names in zip(self.segments, self.names):
+            values = [getattr(packet, name) for name in names]
+            if struct_ is not None:
+                try:
+                    buffer += struct_.pack(*values)
+                    continue
+                except struct.error:
+                    pass
+            for value, value_metadata in zip(values, metadata):
+                buffer += self._encode_value(value, value_metadata)
+        return buffer
+
+    @staticmethod
+    def _decode_field(packet, buffer, offset, field, metadata) -> int:
+        """Decodes a field that is not part of a struct, returns the new offset."""
+        if metadata.type_ is list:
+            element_class = typing.get_args(field.type)[0]
+            field_attribute = getattr(packet, field.name)
+            # subclass element is a list and previous attribute is called
+            # "count" and should have already been retrieved from the byte
+            # stream
+            for _ in range(packet.count):
+                element = element_class()
+                offset = element.codec().decode(element, buffer, offset)
+                field_attribute.append(element)
+        elif metadata.type_ in [bytes, bytearray]:
+            # subclass element is bytes and previous attribute is called
+            # "count" and should have already been retrieved from the byte
+            # stream
+            length = metadata.length
+            if hasattr(packet, "count"):
+                length = packet.count
+            if len(buffer) - offset < length:
+                raise ValueError("Not enough bytes to parse")
+            value = buffer[offset : offset + length]
+            if isinstance(value, memoryview):
+                value = value.tobytes()
+            setattr(packet, field.name, value)
+            offset += length
+        else:
+            length = metadata.length
+            if len(buffer) - offset < length:
+                raise ValueError("Not enough bytes to parse")
+            setattr(
+                packet,
+                field.name,
+                int.from_bytes(
+                    bytes=buffer[offset : offset + length],
+                    signed=metadata.signed,
+                    byteorder="little",
+                ),
+            )
+            offset += length
+        return offset
+
+    @staticmethod
+    def _encode_value(value, metadata, byteorder="little") -> bytes:
+        if isinstance(value, list):
+            return b"".join(element.to_bytes() for element in value)
+        if isinstance(value, (bytes, bytearray)):
+            return value
+        return int(value).to_bytes(
+            length=metadata.length,
+            byteorder=byteorder,
+            signed=metadata.signed,
+        )
+
+
+# compiled codecs, by Packet subclass
+_PACKET_CODECS: dict[type, PacketCodec] = {}
+
+
 @dataclass
 class Packet(ABC):
-    """Base class for packet classes."""
+    """Base class for packet classes.
+
+    Subclasses describe their fields, in order, in the metadata class attribute
+    and are usually declared with @dataclass(slots=True).
+    """
+
+    __slots__ = ()
+    metadata: typing.ClassVar[list[PacketFieldMetadata]] = []
+
+    @classmethod
+    def codec(cls) -> PacketCodec:
+        """Returns the codec of the class, compiled on first use."""
+        codec = _PACKET_CODECS.get(cls)
+        if codec is None:
+            codec = _PACKET_CODECS[cls] = PacketCodec(cls)
+        return codec
 
     @property
     def size(self) -> int:
         return sum(field.length for field in self.metadata)
 
     def from_bytes(self, bytes_):
-        fields = dataclasses.fields(self)
-        # base class makes metadata attribute mandatory so there's at least one
-        # field defined in subclasses
-        # first elements in fields has to be metadata
-        if not fields or fields[0].name != "metadata":
-            raise ValueError("metadata must be defined first")
-        metadata = fields[0].default_factory()
-        for idx, field in enumerate(fields[1:]):
-            if metadata[idx].type_ is list:
-                element_class = typing.get_args(field.type)[0]
-                field_attribute = getattr(self, field.name)
-                # subclass element is a list and previous attribute is called
-                # "count" and should have already been retrieved from the byte
-                # stream
-                for _ in range(self.count):
-                    element = element_class()
-                    if len(bytes_) < element.size:
-                        raise ValueError("Not enough bytes to parse")
-                    field_attribute.append(element.from_bytes(bytes_))
-                    bytes_ = bytes_[element.size :]
-            elif metadata[idx].type_ in [bytes, bytearray]:
-                # subclass element is bytes and previous attribute is called
-                # "count" and should have already been retrieved from the byte
-                # stream
-                length = metadata[idx].length
-                if hasattr(self, "count"):
-                    length = self.count
-                setattr(self, field.name, bytes_[0:length])
-                bytes_ = bytes_[length:]
-            else:
-                length = metadata[idx].length
-                if len(bytes_) < length:
-                    raise ValueError("Not enough bytes to parse")
-                setattr(
-                    self,
-                    field.name,
-                    int.from_bytes(
-                        bytes=bytes_[0:length],
-                        signed=metadata[idx].signed,
-                        byteorder="little",
-                    ),
-                )
-                bytes_ = bytes_[length:]
+        self.codec().decode(self, bytes_)
         return self
 
+    def from_buffer(self, buffer, offset: int = 0) -> int:
+        """Decodes the packet at offset in buffer, returns the number of bytes consumed."""
+        return self.codec().decode(self, buffer, offset) - offset
+
+    @classmethod
+    def iter_from_buffer(cls, buffer, offset: int = 0):
+        """Decodes packets one after the other, until the end of buffer."""
+        buffer = memoryview(buffer)
+        codec = cls.codec()
+        while offset < len(buffer):
+            packet = cls()
+            offset = codec.decode(packet, buffer, offset)
+            yield packet
+
     def to_bytes(self, byteorder="little") -> bytes:
+        if byteorder == "little":
+            return self.codec().encode(self)
         buffer = bytearray()
-        metadata = dataclasses.fields(self)[0].default_factory()
-        for idx, field in enumerate(dataclasses.fields(self)[1:]):
-            value = getattr(self, field.name)
-            if isinstance(value, list):
-                for element in value:
-                    buffer += element.to_bytes()
-            elif isinstance(value, (bytes, bytearray)):
-                buffer += value
-            else:
-                buffer += int(value).to_bytes(
-                    length=metadata[idx].length,
-                    byteorder=byteorder,
-                    signed=metadata[idx].signed,
-                )
+        codec = self.codec()
+        for metadata, field in zip(codec.metadata, dataclasses.fields(self)):
+            buffer += codec._encode_value(getattr(self, field.name), metadata, byteorder)
         return buffer
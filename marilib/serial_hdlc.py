@@ -1,5 +1,6 @@
 """Module implementing HDLC protocol primitives."""
 
+import binascii
 import logging
 from enum import Enum
 
@@ -47,6 +48,9 @@ FCS16TAB = (
 )
 # fmt: on
 
+# bit-reversal table, used to compute the (reflected) HDLC FCS with binascii.crc_hqx
+_BIT_REVERSE_TABLE = bytes(int(f"{i:08b}"[::-1], 2) for i in range(256))
+
 
 class HDLCDecodeException(Exception):
     """Exception raised when decoding wrong HDLC frames."""
@@ -56,21 +60,59 @@ def _fcs_update(fcs, byte):
     return (fcs >> 8) ^ FCS16TAB[((fcs ^ ord(byte)) & 0xFF)]
 
 
+def _reverse16(value):
+    return (_BIT_REVERSE_TABLE[value & 0xFF] << 8) | _BIT_REVERSE_TABLE[value >> 8]
+
+
+def _fcs16(data, fcs=HDLC_FCS_INIT):
+    """Computes the HDLC FCS of a whole buffer at once.
+
+    The HDLC FCS is the bit-reflected version of the CRC-CCITT computed by
+    binascii.crc_hqx, so reflect the input bytes and the register around it.
+
+    >>> hex(_fcs16(b"test"))
+    '0xf877'
+    >>> _fcs16(b"test\\x88\\x07") == HDLC_FCS_OK
+    True
+    """
+    crc = binascii.crc_hqx(bytes(data).translate(_BIT_REVERSE_TABLE), _reverse16(fcs))
+    return _reverse16(crc)
+
+
+def _unescape(data, escape_byte=False):
+    """Unescapes a chunk of a frame, returns the output and the pending escape state."""
+    parts = data.split(HDLC_ESCAPE)
+    if not escape_byte and len(parts) == 1:
+        return data, False
+    output = bytearray() if escape_byte else bytearray(parts[0])
+    for part in parts if escape_byte else parts[1:]:
+        if not part:
+            # consecutive escape bytes, the escape is still pending
+            escape_byte = True
+            continue
+        if part[0] == HDLC_ESCAPE_ESCAPED[0]:
+            output += HDLC_ESCAPE
+        elif part[0] == HDLC_FLAG_ESCAPED[0]:
+            output += HDLC_FLAG
+        output += part[1:]
+        escape_byte = False
+    return output, escape_byte
+
+
 def _to_byte(value):
     return int(value).to_bytes(1, "little")
 
 
-def _escape_byte(byte) -> bytes:
-    result = bytearray()
-    if byte == HDLC_ESCAPE:
-        result += HDLC_ESCAPE
-        result += HDLC_ESCAPE_ESCAPED
-    elif byte == HDLC_FLAG:
-        result += HDLC_ESCAPE
-        result += HDLC_FLAG_ESCAPED
-    else:
-        result += byte
-    return result
+def _escape(data) -> bytes:
+    return data.replace(HDLC_ESCAPE, HDLC_ESCAPE + HDLC_ESCAPE_ESCAPED).replace(
+        HDLC_FLAG, HDLC_ESCAPE + HDLC_FLAG_ESCAPED
+    )
+
+
+def _encode_frame_content(payload) -> bytes:
+    """Returns the escaped payload followed by its escaped FCS, without flags."""
+    fcs = 0xFFFF - _fcs16(payload)
+    return _escape(bytes(payload) + fcs.to_bytes(2, "little"))
 
 
 def hdlc_encode(payload: bytes) -> bytes:
@@ -92,29 +134,57 @@ def hdlc_encode(payload: bytes) -> bytes:
     >>> hdlc_encode(b"'$W\\x82")
     bytearray(b"~\\'$W\\x82\\x13}]~")
     """
-    # initialize output buffer
-    hdlc_frame = bytearray()
+    return bytearray(HDLC_FLAG) + _encode_frame_content(payload) + HDLC_FLAG
 
-    # initialize frame check sequence
-    fcs = HDLC_FCS_INIT
 
-    # add start flag
-    hdlc_frame += HDLC_FLAG
+def hdlc_encode_into(payload: bytes, buffer, offset: int = 0) -> int:
+    """Encodes a payload in an HDLC frame written in buffer, starting at offset.
+
+    The buffer can be any writable buffer (bytearray, memoryview, ...) and must
+    be large enough to hold the frame, see hdlc_max_encoded_size.
+    Returns the offset right after the end of the frame.
 
-    # write payload in frame
-    for byte in payload:
-        fcs = _fcs_update(fcs, _to_byte(byte))
-        hdlc_frame += _escape_byte(_to_byte(byte))
-    fcs = 0xFFFF - fcs
+    >>> buffer = bytearray(16)
+    >>> hdlc_encode_into(b"test", buffer, 2)
+    10
+    >>> buffer[2:10]
+    bytearray(b'~test\\x88\\x07~')
+    >>> hdlc_encode_into(b"test", buffer, 10)
+    Traceback (most recent call last):
+    ValueError: Buffer too small to encode HDLC frame
+    """
+    content = _encode_frame_content(payload)
+    end = offset + len(content) + 2
+    if end > len(buffer):
+        raise ValueError("Buffer too small to encode HDLC frame")
+    buffer[offset] = HDLC_FLAG[0]
+    buffer[offset + 1 : end - 1] = content
+    buffer[end - 1] = HDLC_FLAG[0]
+    return end
 
-    # add FCS
-    hdlc_frame += _escape_byte(_to_byte(fcs & 0xFF))
-    hdlc_frame += _escape_byte(_to_byte((fcs & 0xFF00) >> 8))
 
-    # add end flag
-    hdlc_frame += HDLC_FLAG
+def hdlc_max_encoded_size(payload_length: int) -> int:
+    """Returns the size of the largest HDLC frame for a payload of a given length.
 
-    return hdlc_frame
+    >>> hdlc_max_encoded_size(4)
+    14
+    """
+    # every payload and FCS byte may be escaped, plus the two flags
+    return 2 * (payload_length + 2) + 2
+
+
+def hdlc_encode_batch(payloads: list[bytes]) -> bytearray:
+    """Encodes several payloads as consecutive HDLC frames in a single buffer.
+
+    >>> hdlc_encode_batch([b"test", b"~test}"])
+    bytearray(b'~test\\x88\\x07~~}^test}]\\x06\\x94~')
+    """
+    buffer = bytearray(sum(hdlc_max_encoded_size(len(payload)) for payload in payloads))
+    offset = 0
+    for payload in payloads:
+        offset = hdlc_encode_into(payload, buffer, offset)
+    del buffer[offset:]
+    return buffer
 
 
 def hdlc_decode(frame: bytes) -> bytes:
@@ -226,3 +296,65 @@ class HDLCHandler:
             else:
                 self.output += byte
                 self.fcs = _fcs_update(self.fcs, byte)
+
+
+class HDLCStreamDecoder:
+    """Decodes HDLC frames from a stream of chunks of arbitrary size.
+
+    Partial frames are kept across calls to feed, so the stream can be split
+    anywhere, including in the middle of an escape sequence.
+
+    >>> decoder = HDLCStreamDecoder()
+    >>> decoder.feed(b"~test\\x88\\x07~~}^te")
+    [b'test']
+    >>> decoder.feed(b"st}]\\x06\\x94~")
+    [b'~test}']
+    """
+
+    def __init__(self):
+        self.state = HDLCState.IDLE
+        self.output = bytearray()
+        self.escape_byte = False
+        self._logger = logging.getLogger(__name__)
+
+    def reset(self):
+        """Drops any partially received frame."""
+        self.state = HDLCState.IDLE
+        self.output = bytearray()
+        self.escape_byte = False
+
+    def feed(self, data: bytes) -> list[bytes]:
+        """Handle new bytes received, returns the payloads of all complete frames."""
+        payloads = []
+        chunks = data.split(HDLC_FLAG)
+        self._handle_chunk(chunks[0])
+        for chunk in chunks[1:]:
+            # each chunk after the first one was preceded by a flag
+            if self.state == HDLCState.RECEIVING and self.output:
+                # End of frame
+                payload = self._payload()
+                if payload:
+                    payloads.append(payload)
+                self.state = HDLCState.IDLE
+            else:
+                # Start of frame
+                self.state = HDLCState.RECEIVING
+            self.output = bytearray()
+            self.escape_byte = False
+            self._handle_chunk(chunk)
+        return payloads
+
+    def _handle_chunk(self, chunk):
+        if self.state != HDLCState.RECEIVING or not chunk:
+            return
+        chunk, self.escape_byte = _unescape(chunk, self.escape_byte)
+        self.output += chunk
+
+    def _payload(self):
+        if len(self.output) < 2:
+            self._logger.error("Invalid payload")
+            return None
+        if _fcs16(self.output) != HDLC_FCS_OK:
+            self._logger.error("Invalid FCS")
+            return None
+        return bytes(self.output[:-2])
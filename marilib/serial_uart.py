@@ -7,9 +7,13 @@
 """Serial interface."""
 
 import logging
+import queue
 import sys
 import threading
 import time
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum
 from typing import Callable
 
 import serial
@@ -18,9 +22,17 @@ from serial.tools import list_ports
 SERIAL_PAYLOAD_CHUNK_SIZE = 64
 SERIAL_PAYLOAD_CHUNK_SIZE_WITH_TRIGGER_BYTE = 63
 SERIAL_PAYLOAD_CHUNK_DELAY = 0.003  # 2 ms
+SERIAL_TRIGGER_BYTE_DELAY = 0.0001  # 100 us
 SERIAL_DEFAULT_PORT = "/dev/ttyACM0"
 SERIAL_DEFAULT_BAUDRATE = 1_000_000
 # SERIAL_DEFAULT_BAUDRATE = 460_800
+SERIAL_READ_CHUNK_SIZE = 4096  # max bytes handed to the callback at once
+SERIAL_TX_QUEUE_SIZE = 256  # max frames waiting to be written
+SERIAL_TX_COALESCE_MAX_SIZE = 256  # max bytes of queued frames written at once
+SERIAL_TX_BLOCK_CHECK_PERIOD = 0.1  # seconds, blocked writes check if the writer stopped
+SERIAL_READ_RATES_WINDOW = 1.0  # seconds, read rates are averaged over about this duration
+SERIAL_READ_RATES_SAMPLE_PERIOD = 0.25  # seconds, between samples of the read counters
+SERIAL_READ_RATES_MAX_SAMPLES = 8
 
 
 def get_default_port():
@@ -34,35 +46,141 @@ def get_default_port():
     return ports[0].device
 
 
+def iter_chunks_with_trigger_byte(bytes_):
+    """Splits bytes in (trigger byte, chunk) pairs, as expected by the gateway.
+
+    >>> list(iter_chunks_with_trigger_byte(bytes(range(70))))[1]
+    (b'@', b'ABCDE')
+    """
+    pos = 0
+    while pos < len(bytes_):
+        chunk_end = min(pos + 1 + SERIAL_PAYLOAD_CHUNK_SIZE_WITH_TRIGGER_BYTE, len(bytes_))
+        yield bytes_[pos : pos + 1], bytes_[pos + 1 : chunk_end]
+        pos = chunk_end
+
+
+class SerialReadCounters:
+    """Counts the bytes and chunks read from a serial port.
+
+    The counters are cumulative. The reading thread also samples them at most
+    every SERIAL_READ_RATES_SAMPLE_PERIOD seconds, and rates() compares the
+    counters with the sample about SERIAL_READ_RATES_WINDOW seconds old, so
+    reading the rates has no side effects and several readers get the same values.
+    """
+
+    def __init__(self, now: float | None = None):
+        self.bytes_received = 0
+        self.chunks_received = 0
+        now = time.monotonic() if now is None else now
+        # (time, bytes_received, chunks_received), oldest first
+        self._samples = deque([(now, 0, 0)], maxlen=SERIAL_READ_RATES_MAX_SAMPLES)
+
+    def add(self, data: bytes, now: float | None = None):
+        self.bytes_received += len(data)
+        self.chunks_received += 1
+        now = time.monotonic() if now is None else now
+        if now - self._samples[-1][0] >= SERIAL_READ_RATES_SAMPLE_PERIOD:
+            self._samples.append((now, self.bytes_received, self.chunks_received))
+
+    def rates(self, now: float | None = None) -> tuple[float, float]:
+        """Returns the bytes and chunks received per second, over about the last second."""
+        now = time.monotonic() if now is None else now
+        samples = list(self._samples)
+        # the newest sample at least a window old, or the oldest one
+        reference = samples[0]
+        for sample in samples:
+            if now - sample[0] < SERIAL_READ_RATES_WINDOW:
+                break
+            reference = sample
+        ts, bytes_received, chunks_received = reference
+        elapsed = now - ts
+        if elapsed <= 0:
+            return 0.0, 0.0
+        return (
+            (self.bytes_received - bytes_received) / elapsed,
+            (self.chunks_received - chunks_received) / elapsed,
+        )
+
+
 class SerialInterfaceException(Exception):
     """Exception raised when serial port is disconnected."""
 
 
+class SerialTxQueueFullException(SerialInterfaceException):
+    """Exception raised when the serial transmit queue is full."""
+
+
+class SerialTxOverflowPolicy(Enum):
+    """What to do with a new frame when the transmit queue is full."""
+
+    BLOCK = "block"  # wait until there is room in the queue
+    DROP = "drop"  # silently discard the new frame
+    RAISE = "raise"  # raise SerialTxQueueFullException
+
+
+@dataclass
+class SerialTxStats:
+    """Statistics of the serial transmit queue."""
+
+    frames_enqueued: int = 0
+    frames_written: int = 0
+    frames_dropped: int = 0
+    writes: int = 0
+    queue_depth_max: int = 0
+    queue_time_total: float = 0.0  # seconds
+    queue_time_max: float = 0.0  # seconds
+
+    @property
+    def queue_time_avg(self) -> float:
+        return self.queue_time_total / self.frames_written if self.frames_written else 0.0
+
+
 class SerialInterface(threading.Thread):
     """Bidirectional serial interface."""
 
-    def __init__(self, port: str, baudrate: int, callback: Callable):
+    def __init__(
+        self,
+        port: str,
+        baudrate: int,
+        callback: Callable,
+        read_chunk_size: int = SERIAL_READ_CHUNK_SIZE,
+        read_timeout: float | None = None,
+    ):
+        if read_chunk_size < 1:
+            raise ValueError("read_chunk_size must be >= 1")
         self.lock = threading.Lock()
         self.callback = callback
-        self.serial = serial.Serial(port, baudrate)
+        self.read_chunk_size = read_chunk_size
+        self.serial = serial.Serial(port, baudrate, timeout=read_timeout)
+        self.read_counters = SerialReadCounters()
         super().__init__(daemon=True)
         self._logger = logging.getLogger(__name__)
         self.start()
         self._logger.info("Serial port thread started")
 
     def run(self):
-        """Listen continuously at each byte received on serial."""
+        """Listen continuously to the serial port, passing received chunks to the callback.
+
+        Blocks until (at least) one byte is available, then drains everything
+        already buffered by the OS, up to read_chunk_size bytes, in a single read.
+        """
         self.serial.flush()
         try:
             while 1:
                 try:
-                    byte = self.serial.read(1)
-                except (TypeError, serial.serialutil.SerialException):
-                    byte = None
-                if byte is None:
+                    data = self.serial.read(1)
+                    if data and self.read_chunk_size > 1 and (waiting := self.serial.in_waiting):
+                        data += self.serial.read(min(waiting, self.read_chunk_size - 1))
+                except (TypeError, OSError, serial.serialutil.SerialException):
+                    data = None
+                if data is None:
                     self._logger.info("Serial port disconnected")
                     break
-                self.callback(byte)
+                if not data:
+                    # read timeout
+                    continue
+                self.read_counters.add(data)
+                self.callback(data)
         except serial.serialutil.PortNotOpenError as exc:
             self._logger.error(f"{exc}")
             raise SerialInterfaceException(f"{exc}") from exc
@@ -74,6 +192,10 @@ class SerialInterface(threading.Thread):
         self.serial.close()
         self.join()
 
+    def read_rates(self) -> tuple[float, float]:
+        """Returns the bytes and chunks received per second, over about the last second."""
+        return self.read_counters.rates()
+
     def write_chunked(self, bytes_):
         """Write bytes on serial using the chunked strategy. (deprecated)"""
         # Send 64 bytes at a time
@@ -99,21 +221,12 @@ class SerialInterface(threading.Thread):
     def write_chunked_with_trigger_byte(self, bytes_):
         """Write bytes on serial using the chunked strategy with trigger byte."""
         # Send 64 bytes at a time
-        pos = 0
-        while pos < len(bytes_):
-            # send trigger byte
-            trigger_byte = bytes_[pos : pos + 1]
+        for trigger_byte, chunk in iter_chunks_with_trigger_byte(bytes_):
             self.serial.write(trigger_byte)
-            time.sleep(
-                0.0001
-            )  # 100 us -- this time is important because of the trigger byte timeout on the nRF side
-            pos += 1
-
-            # send chunk
-            chunk_end = min(pos + SERIAL_PAYLOAD_CHUNK_SIZE_WITH_TRIGGER_BYTE, len(bytes_))
-            self.serial.write(bytes_[pos:chunk_end])
+            # this time is important because of the trigger byte timeout on the nRF side
+            time.sleep(SERIAL_TRIGGER_BYTE_DELAY)
+            self.serial.write(chunk)
             self.serial.flush()
-            pos = chunk_end
 
             # sleep to force a delay between chunks (or between calls to this function)
             time.sleep(SERIAL_PAYLOAD_CHUNK_DELAY)
@@ -121,3 +234,118 @@ class SerialInterface(threading.Thread):
     def write(self, bytes_):
         """Write bytes on serial."""
         self.write_chunked_with_trigger_byte(bytes_)
+
+
+class SerialWriter(threading.Thread):
+    """Writes data on a serial interface from a dedicated thread.
+
+    Data is put in a bounded queue and written by a single thread, that paces
+    the trigger byte and chunk protocol of SerialInterface.write. Frames waiting
+    in the queue are coalesced in a single write, up to coalesce_max_size bytes
+    (0 disables coalescing).
+    """
+
+    def __init__(
+        self,
+        serial_interface: SerialInterface,
+        queue_size: int = SERIAL_TX_QUEUE_SIZE,
+        overflow_policy: SerialTxOverflowPolicy = SerialTxOverflowPolicy.BLOCK,
+        coalesce_max_size: int = SERIAL_TX_COALESCE_MAX_SIZE,
+    ):
+        if queue_size < 1:
+            raise ValueError("queue_size must be >= 1")
+        self.serial_interface = serial_interface
+        self.overflow_policy = SerialTxOverflowPolicy(overflow_policy)
+        self.coalesce_max_size = coalesce_max_size
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stats = SerialTxStats()
+        self._stats_lock = threading.Lock()
+        self._stopped = threading.Event()
+        super().__init__(daemon=True)
+        self._logger = logging.getLogger(__name__)
+        self.start()
+
+    @property
+    def queue_depth(self) -> int:
+        return self.queue.qsize()
+
+    def write(self, bytes_) -> bool:
+        """Queues bytes to be written, returns False if they were dropped.
+
+        Bytes written after stop() are dropped, or raise SerialInterfaceException
+        with the RAISE overflow policy.
+        """
+        item = (time.monotonic(), bytes_)
+        try:
+            if self._stopped.is_set():
+                raise queue.Full
+            if self.overflow_policy == SerialTxOverflowPolicy.BLOCK:
+                # wakes up regularly, nothing drains the queue once the writer is stopped
+                while True:
+                    try:
+                        self.queue.put(item, timeout=SERIAL_TX_BLOCK_CHECK_PERIOD)
+                        break
+                    except queue.Full:
+                        if self._stopped.is_set():
+                            raise
+            else:
+                self.queue.put_nowait(item)
+        except queue.Full:
+            with self._stats_lock:
+                self.stats.frames_dropped += 1
+            if self._stopped.is_set():
+                if self.overflow_policy == SerialTxOverflowPolicy.RAISE:
+                    raise SerialInterfaceException("Serial writer is stopped")
+            elif self.overflow_policy == SerialTxOverflowPolicy.RAISE:
+                raise SerialTxQueueFullException("Serial transmit queue is full")
+            return False
+        with self._stats_lock:
+            self.stats.frames_enqueued += 1
+            self.stats.queue_depth_max = max(self.stats.queue_depth_max, self.queue.qsize())
+        return True
+
+    def stop(self):
+        """Writes what is already queued, then stops the thread."""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self.queue.put((time.monotonic(), None))
+        self.join()
+
+    def run(self):
+        running = True
+        while running:
+            items = [self.queue.get()]
+            size = len(items[0][1] or b"")
+            while size < self.coalesce_max_size:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                items.append(item)
+                if item[1] is None:
+                    break
+                size += len(item[1])
+            if items[-1][1] is None:
+                running = False
+                items.pop()
+            if not items:
+                continue
+
+            now = time.monotonic()
+            with self._stats_lock:
+                for ts, _ in items:
+                    self.stats.queue_time_total += now - ts
+                    self.stats.queue_time_max = max(self.stats.queue_time_max, now - ts)
+            try:
+                with self.serial_interface.lock:
+                    self.serial_interface.serial.flush()
+                    self.serial_interface.write(b"".join(bytes_ for _, bytes_ in items))
+            except (TypeError, OSError, serial.serialutil.SerialException) as exc:
+                self._logger.error(f"{exc}")
+                with self._stats_lock:
+                    self.stats.frames_dropped += len(items)
+                continue
+            with self._stats_lock:
+                self.stats.frames_written += len(items)
+                self.stats.writes += 1
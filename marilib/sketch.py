@@ -0,0 +1,108 @@
+"""Mergeable streaming quantiles, for latency percentiles over long horizons.
+
+A DDSketch-style histogram: values are counted in buckets whose bounds grow
+geometrically, so any quantile is known within relative_accuracy of its true
+value, with a memory bounded by the range of the values rather than their number.
+"""
+
+import math
+
+LATENCY_PERCENTILES = (50, 95, 99)  # reported by the TUI, the logger and the snapshots
+
+
+class LatencySketch:
+    """Quantile sketch of positive values, such as round trip times in milliseconds.
+
+    >>> sketch = LatencySketch()
+    >>> for value in range(1, 1001):
+    ...     sketch.add(value)
+    >>> [round(value) for value in sketch.percentiles((50, 95, 99))]
+    [498, 944, 983]
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, min_value: float = 1e-3):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value  # smaller values are counted as 0
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: dict[int, int] = {}  # count of values, by bucket index
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self._version = 0  # incremented on every change, for the percentiles cache
+        self._cache: tuple = (None, None, None)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def add(self, value: float, count: int = 1):
+        if value < self.min_value:
+            self.zero_count += count
+        else:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.count += count
+        self.sum += value * count
+        self._version += 1
+
+    def merge(self, other: "LatencySketch"):
+        """Adds the values of other, a sketch with the same relative_accuracy."""
+        self._combine(other, 1)
+
+    def subtract(self, other: "LatencySketch"):
+        """Removes the values of other, which must have been merged before."""
+        self._combine(other, -1)
+
+    def _combine(self, other: "LatencySketch", sign: int):
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot combine sketches with different relative accuracies")
+        bins = self.bins
+        for index, count in other.bins.items():
+            count = bins.get(index, 0) + sign * count
+            if count:
+                bins[index] = count
+            else:
+                del bins[index]
+        self.zero_count += sign * other.zero_count
+        self.count += sign * other.count
+        self.sum += sign * other.sum
+        if self.count == 0:
+            # no rounding errors left behind
+            self.sum = 0.0
+        self._version += 1
+
+    def copy(self) -> "LatencySketch":
+        sketch = LatencySketch(self.relative_accuracy, self.min_value)
+        sketch.merge(self)
+        return sketch
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def percentile(self, percentile: float) -> float:
+        return self.percentiles((percentile,))[0]
+
+    def percentiles(self, percentiles: tuple = LATENCY_PERCENTILES) -> tuple[float, ...]:
+        """Returns the values at the given percentiles (0 to 100), 0 for an empty sketch."""
+        version, cached_percentiles, values = self._cache
+        if version == self._version and cached_percentiles == percentiles:
+            return values
+        values = [0.0] * len(percentiles)
+        if self.count:
+            # a single walk through the buckets, for the ranks in increasing order
+            ranks = sorted((p / 100 * (self.count - 1), i) for i, p in enumerate(percentiles))
+            buckets = iter(sorted(self.bins.items()))
+            seen = self.zero_count
+            value = 0.0
+            for rank, position in ranks:
+                while seen <= rank:
+                    index, count = next(buckets)
+                    seen += count
+                    value = 2 * self.gamma**index / (self.gamma + 1)
+                values[position] = value
+        values = tuple(values)
+        self._cache = (self._version, percentiles, values)
+        return values
@@ -0,0 +1,222 @@
+"""Immutable snapshots of the network, for readers that must not take the ingest lock.
+
+`mari.update()` publishes a new NetworkSnapshot at most every `period`
+seconds, by replacing a single reference. Readers (TUI, logger, exporters,
+applications) get the latest one with `mari.snapshot()` and can take all the
+time they need to read it.
+
+The snapshot is built outside of the ingest callbacks, and the model lock is
+only held for SNAPSHOT_NODES_PER_LOCK nodes at a time, so ingest waits for a
+few nodes to be snapshotted at most, not for the whole network.
+"""
+
+import threading
+from dataclasses import dataclass
+
+from marilib.clock import SYSTEM_CLOCK, Clock
+from marilib.model import GatewayInfo, MariGateway, MariNode
+
+SNAPSHOT_PUBLISH_PERIOD = 0.2  # seconds, same as the default TUI refresh period
+SNAPSHOT_NODES_PER_LOCK = 32  # nodes snapshotted each time the model lock is taken
+
+
+@dataclass(frozen=True, slots=True)
+class NodeSnapshot:
+    address: int
+    gateway_address: int
+    is_alive: bool
+    last_seen: float  # Clock.now()
+    sent_count: int
+    received_count: int
+    sent_rate: int  # frames during the last second
+    received_rate: int
+    success_rate: float
+    success_rate_30s: float
+    pdr_downlink: float
+    pdr_uplink: float
+    pdr_downlink_radio: float
+    pdr_uplink_radio: float
+    pdr_downlink_uart: float
+    pdr_uplink_uart: float
+    rssi_node_dbm: float | None
+    rssi_gw_dbm: float | None
+    # of the frames received from the node, during the last minute
+    rssi_mean_dbm: float
+    rssi_stddev_dbm: float
+    rssi_trend_db: float  # mean of the last minute minus mean of the last hour
+    avg_latency_roundtrip_node_edge_ms: float
+    avg_latency_roundtrip_node_cloud_ms: float
+    latest_latency_roundtrip_node_edge_ms: float
+    latest_latency_roundtrip_node_cloud_ms: float
+    # values at LATENCY_PERCENTILES, over all the probes of the node
+    latency_roundtrip_node_edge_ms_percentiles: tuple[float, ...]
+    latency_roundtrip_node_cloud_ms_percentiles: tuple[float, ...]
+
+    @classmethod
+    def from_node(cls, node: MariNode) -> "NodeSnapshot":
+        stats = node.stats
+        # the probe metrics are computed once per probe, in the order of NODE_AGGREGATE_METRICS
+        pdr_down_radio, pdr_up_radio, pdr_down_uart, pdr_up_uart, latency_edge, latency_cloud = (
+            node.probe_metrics[:6]
+        )
+        latest = node.probe_stats_latest
+        return cls(
+            address=node.address,
+            gateway_address=node.gateway_address,
+            is_alive=node.is_alive,
+            last_seen=node.last_seen,
+            sent_count=stats.cumulative_sent,
+            received_count=stats.cumulative_received,
+            sent_rate=stats.sent_count(1, include_test_packets=True),
+            received_rate=stats.received_count(1, include_test_packets=True),
+            success_rate=stats.success_rate(),
+            success_rate_30s=stats.success_rate(30),
+            pdr_downlink=node.pdr_downlink,
+            pdr_uplink=node.pdr_uplink,
+            pdr_downlink_radio=pdr_down_radio,
+            pdr_uplink_radio=pdr_up_radio,
+            pdr_downlink_uart=pdr_down_uart,
+            pdr_uplink_uart=pdr_up_uart,
+            rssi_node_dbm=latest.rssi_at_node_dbm() if latest else None,
+            rssi_gw_dbm=latest.rssi_at_gw_dbm() if latest else None,
+            rssi_mean_dbm=stats.rssi_mean_dbm(60),
+            rssi_stddev_dbm=stats.rssi_stddev_dbm(60),
+            rssi_trend_db=stats.rssi_trend_db(60, 3600),
+            avg_latency_roundtrip_node_edge_ms=latency_edge,
+            avg_latency_roundtrip_node_cloud_ms=latency_cloud,
+            latest_latency_roundtrip_node_edge_ms=(
+                latest.latency_roundtrip_node_edge_ms() if latest else 0
+            ),
+            latest_latency_roundtrip_node_cloud_ms=(
+                latest.latency_roundtrip_node_cloud_ms() if latest else 0
+            ),
+            # cached by the sketches until the next probe
+            latency_roundtrip_node_edge_ms_percentiles=node.latency_edge.percentiles(),
+            latency_roundtrip_node_cloud_ms_percentiles=node.latency_cloud.percentiles(),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class GatewaySnapshot:
+    # the model replaces the info of a gateway, it never modifies it, so it is not copied
+    info: GatewayInfo
+    is_alive: bool
+    sent_count: int
+    received_count: int
+    sent_rate: int  # frames during the last second
+    received_rate: int
+    avg_pdr_downlink_radio: float
+    avg_pdr_uplink_radio: float
+    avg_pdr_downlink_uart: float
+    avg_pdr_uplink_uart: float
+    avg_latency_roundtrip_node_edge_ms: float
+    avg_latency_roundtrip_node_cloud_ms: float
+    latest_node_tx_count: int
+    latest_node_rx_count: int
+    latest_gw_tx_count: int
+    latest_gw_rx_count: int
+    # values at LATENCY_PERCENTILES, over all the probes of all the nodes
+    latency_roundtrip_node_edge_ms_percentiles: tuple[float, ...]
+    latency_roundtrip_node_cloud_ms_percentiles: tuple[float, ...]
+    nodes: tuple[NodeSnapshot, ...]
+
+    @classmethod
+    def from_gateway(
+        cls, gateway: MariGateway, nodes: tuple[NodeSnapshot, ...] | None = None
+    ) -> "GatewaySnapshot":
+        """Snapshots the gateway, and its nodes unless they are given."""
+        if nodes is None:
+            nodes = tuple(NodeSnapshot.from_node(node) for node in gateway.node_registry.values())
+        stats = gateway.stats
+        return cls(
+            info=gateway.info,
+            is_alive=gateway.is_alive,
+            sent_count=stats.sent_count(include_test_packets=True),
+            received_count=stats.received_count(include_test_packets=True),
+            sent_rate=stats.sent_count(1, include_test_packets=True),
+            received_rate=stats.received_count(1, include_test_packets=True),
+            avg_pdr_downlink_radio=gateway.stats_avg_pdr_downlink_radio(),
+            avg_pdr_uplink_radio=gateway.stats_avg_pdr_uplink_radio(),
+            avg_pdr_downlink_uart=gateway.stats_avg_pdr_downlink_uart(),
+            avg_pdr_uplink_uart=gateway.stats_avg_pdr_uplink_uart(),
+            avg_latency_roundtrip_node_edge_ms=gateway.stats_avg_latency_roundtrip_node_edge_ms(),
+            avg_latency_roundtrip_node_cloud_ms=gateway.stats_avg_latency_roundtrip_node_cloud_ms(),
+            latest_node_tx_count=gateway.stats_latest_node_tx_count(),
+            latest_node_rx_count=gateway.stats_latest_node_rx_count(),
+            latest_gw_tx_count=gateway.stats_latest_gw_tx_count(),
+            latest_gw_rx_count=gateway.stats_latest_gw_rx_count(),
+            latency_roundtrip_node_edge_ms_percentiles=(
+                gateway.stats_latency_roundtrip_node_edge_ms_percentiles()
+            ),
+            latency_roundtrip_node_cloud_ms_percentiles=(
+                gateway.stats_latency_roundtrip_node_cloud_ms_percentiles()
+            ),
+            nodes=nodes,
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class NetworkSnapshot:
+    ts: float  # Clock.now() at publication
+    gateways: tuple[GatewaySnapshot, ...]
+
+    @property
+    def nodes(self) -> list[NodeSnapshot]:
+        return [node for gateway in self.gateways for node in gateway.nodes]
+
+    def get_gateway(self, address: int) -> GatewaySnapshot | None:
+        for gateway in self.gateways:
+            if gateway.info.address == address:
+                return gateway
+        return None
+
+
+class SnapshotPublisher:
+    """Holds the latest NetworkSnapshot, replaced by the writer at most every period seconds."""
+
+    def __init__(
+        self,
+        clock: Clock = SYSTEM_CLOCK,
+        period: float = SNAPSHOT_PUBLISH_PERIOD,
+        nodes_per_lock: int = SNAPSHOT_NODES_PER_LOCK,
+    ):
+        self.clock = clock
+        self.period = period
+        self.nodes_per_lock = nodes_per_lock
+        self.latest: NetworkSnapshot | None = None
+        self._publish_lock = threading.Lock()  # one publication at a time
+
+    def is_due(self) -> bool:
+        return self.latest is None or self.clock.now() - self.latest.ts >= self.period
+
+    def publish(self, gateways: list[MariGateway], lock: threading.Lock) -> NetworkSnapshot:
+        """Snapshots the gateways, must be called without the lock of the model held.
+
+        The lock is taken for nodes_per_lock nodes at a time, then for the gateway
+        itself. Each node snapshot is consistent, but the nodes of a gateway, and
+        the gateway totals, can be read a few ingested frames apart.
+        """
+        with self._publish_lock:
+            ts = self.clock.now()
+            snapshot = NetworkSnapshot(
+                ts=ts,
+                gateways=tuple(self._snapshot_gateway(gateway, lock) for gateway in gateways),
+            )
+            # replacing the reference is atomic, readers see the previous or the new snapshot
+            self.latest = snapshot
+            return snapshot
+
+    def _snapshot_gateway(self, gateway: MariGateway, lock: threading.Lock) -> GatewaySnapshot:
+        with lock:
+            nodes = list(gateway.node_registry.values())
+        snapshots = []
+        for start in range(0, len(nodes), self.nodes_per_lock):
+            with lock:
+                snapshots += [
+                    NodeSnapshot.from_node(node)
+                    for node in nodes[start : start + self.nodes_per_lock]
+                    # skips the nodes removed since the copy of the list
+                    if gateway.node_registry.get(node.address) is node
+                ]
+        with lock:
+            return GatewaySnapshot.from_gateway(gateway, tuple(snapshots))
@@ -1,5 +1,3 @@
-from datetime import datetime, timedelta
-
 from rich.columns import Columns
 from rich.console import Console, Group
 from rich.layout import Layout
@@ -9,7 +7,7 @@ from rich.table import Table
 from rich.text import Text
 
 from marilib import MarilibCloud
-from marilib.model import MariGateway
+from marilib.snapshot import GatewaySnapshot, NetworkSnapshot
 from marilib.tui import MarilibTUI
 
 
@@ -20,13 +18,14 @@ class MarilibTUICloud(MarilibTUI):
         self,
         max_tables=4,
         re_render_max_freq=0.2,
+        console: Console | None = None,
     ):
-        self.console = Console()
+        self.console = console or Console()
         self.live = Live(console=self.console, auto_refresh=False, transient=True)
         self.live.start()
         self.max_tables = max_tables
         self.re_render_max_freq = re_render_max_freq
-        self.last_render_time = datetime.now()
+        self.last_render_time = 0.0  # mari.clock.now() of the last render
 
     def get_max_rows(self) -> int:
         """Calculate maximum rows based on terminal height."""
@@ -35,19 +34,20 @@ class MarilibTUICloud(MarilibTUI):
         return max(2, available_height)
 
     def render(self, mari: MarilibCloud):
-        """Render the TUI layout."""
-        with mari.lock:
-            if datetime.now() - self.last_render_time < timedelta(seconds=self.re_render_max_freq):
-                return
-            self.last_render_time = datetime.now()
-            layout = Layout()
-            layout.split(
-                Layout(self.create_header_panel(mari), size=6),
-                Layout(self.create_gateways_panel(mari)),
-            )
-            self.live.update(layout, refresh=True)
+        """Render the TUI layout, from the latest snapshot of the network."""
+        now = mari.clock.now()
+        if now - self.last_render_time < self.re_render_max_freq:
+            return
+        self.last_render_time = now
+        snapshot = mari.snapshot()
+        layout = Layout()
+        layout.split(
+            Layout(self.create_header_panel(mari, snapshot), size=6),
+            Layout(self.create_gateways_panel(snapshot)),
+        )
+        self.live.update(layout, refresh=True)
 
-    def create_header_panel(self, mari: MarilibCloud) -> Panel:
+    def create_header_panel(self, mari: MarilibCloud, snapshot: NetworkSnapshot) -> Panel:
         """Create the header panel with MQTT connection and network info."""
         status = Text()
         status.append("MarilibCloud is ", style="bold")
@@ -58,7 +58,7 @@ class MarilibTUICloud(MarilibTUI):
             f"since {mari.started_ts.strftime('%Y-%m-%d %H:%M:%S')}"
         )
         status.append("  |  ")
-        secs = int((datetime.now() - mari.last_received_mqtt_data_ts).total_seconds())
+        secs = int(mari.clock.now() - mari.last_received_mqtt_data_ts)
         status.append(
             f"last received: {secs}s ago",
             style="bold green" if secs <= 1 else "bold red",
@@ -68,14 +68,14 @@ class MarilibTUICloud(MarilibTUI):
         status.append(f"0x{mari.network_id:04X}")
         status.append("  |  ")
         status.append("Gateways: ", style="bold cyan")
-        status.append(f"{len(mari.gateways)}")
+        status.append(f"{len(snapshot.gateways)}")
         status.append("  |  ")
         status.append("Nodes: ", style="bold cyan")
-        status.append(f"{len(mari.nodes)}")
+        status.append(f"{len(snapshot.nodes)}")
 
         return Panel(status, title="[bold]MarilibCloud Status", border_style="blue")
 
-    def create_gateway_table(self, gateway: MariGateway) -> Table:
+    def create_gateway_table(self, gateway: GatewaySnapshot) -> Table:
         """Create a table for a single gateway with 3 rows and 2 columns."""
         table = Table(
             show_header=False,
@@ -90,19 +90,24 @@ class MarilibTUICloud(MarilibTUI):
         schedule_info = f"#{gateway.info.schedule_id} {gateway.info.schedule_name}"
 
         # --- Latency and PDR Display ---
-        avg_latency_edge = gateway.stats_avg_latency_roundtrip_node_edge_ms()
+        avg_latency_edge = gateway.avg_latency_roundtrip_node_edge_ms
         has_latency_info = avg_latency_edge > 0
 
         # Check if we have PDR info by looking at the gateway averages
-        avg_uart_pdr_up = gateway.stats_avg_pdr_uplink_uart()
-        avg_uart_pdr_down = gateway.stats_avg_pdr_downlink_uart()
+        avg_uart_pdr_up = gateway.avg_pdr_uplink_uart
+        avg_uart_pdr_down = gateway.avg_pdr_downlink_uart
         has_uart_pdr_info = avg_uart_pdr_up > 0 or avg_uart_pdr_down > 0
 
-        avg_radio_pdr_down = gateway.stats_avg_pdr_downlink_radio()
-        avg_radio_pdr_up = gateway.stats_avg_pdr_uplink_radio()
+        avg_radio_pdr_down = gateway.avg_pdr_downlink_radio
+        avg_radio_pdr_up = gateway.avg_pdr_uplink_radio
         has_radio_pdr_info = avg_radio_pdr_down > 0 or avg_radio_pdr_up > 0
 
-        latency_info = f"  |  Latency: {avg_latency_edge:.1f}ms" if has_latency_info else ""
+        p50, p95, p99 = gateway.latency_roundtrip_node_edge_ms_percentiles
+        latency_info = (
+            f"  |  Latency: {avg_latency_edge:.1f}ms p50 {p50:.1f} p95 {p95:.1f} p99 {p99:.1f}"
+            if has_latency_info
+            else ""
+        )
         pdr_info = "  |  PDR:" if has_uart_pdr_info or has_radio_pdr_info else ""
         radio_pdr_info = (
             f"  Radio ↓ {avg_radio_pdr_down:.1%} ↑ {avg_radio_pdr_up:.1%}"
@@ -133,9 +138,9 @@ class MarilibTUICloud(MarilibTUI):
 
         return table
 
-    def create_gateways_panel(self, mari: MarilibCloud) -> Panel:
+    def create_gateways_panel(self, snapshot: NetworkSnapshot) -> Panel:
         """Create the panel that contains individual gateway tables."""
-        gateways = list(mari.gateways.values())
+        gateways = snapshot.gateways
 
         if not gateways:
             empty_table = Table(title="No Gateways Connected")
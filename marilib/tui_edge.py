@@ -1,5 +1,4 @@
 from __future__ import annotations
-from datetime import datetime, timedelta
 from typing import TYPE_CHECKING
 
 from rich.columns import Columns
@@ -10,7 +9,8 @@ from rich.panel import Panel
 from rich.table import Table
 from rich.text import Text
 
-from marilib.model import MariNode, TestState
+from marilib.model import TestState
+from marilib.snapshot import GatewaySnapshot, NodeSnapshot
 from marilib.tui import MarilibTUI
 
 if TYPE_CHECKING:
@@ -25,13 +25,14 @@ class MarilibTUIEdge(MarilibTUI):
         max_tables=3,
         re_render_max_freq=0.2,
         test_state: TestState | None = None,
+        console: Console | None = None,
     ):
-        self.console = Console()
+        self.console = console or Console()
         self.live = Live(console=self.console, auto_refresh=False, transient=True)
         self.live.start()
         self.max_tables = max_tables
         self.re_render_max_freq = re_render_max_freq
-        self.last_render_time = datetime.now()
+        self.last_render_time = 0.0  # mari.clock.now() of the last render
         self.test_state = test_state
 
     def get_max_rows(self) -> int:
@@ -41,19 +42,20 @@ class MarilibTUIEdge(MarilibTUI):
         return max(2, available_height)
 
     def render(self, mari: "MarilibEdge"):
-        """Render the TUI layout."""
-        with mari.lock:
-            if datetime.now() - self.last_render_time < timedelta(seconds=self.re_render_max_freq):
-                return
-            self.last_render_time = datetime.now()
-            layout = Layout()
-            layout.split(
-                Layout(self.create_header_panel(mari), size=12),
-                Layout(self.create_nodes_panel(mari)),
-            )
-            self.live.update(layout, refresh=True)
+        """Render the TUI layout, from the latest snapshot of the network."""
+        now = mari.clock.now()
+        if now - self.last_render_time < self.re_render_max_freq:
+            return
+        self.last_render_time = now
+        gateway = mari.snapshot().gateways[0]
+        layout = Layout()
+        layout.split(
+            Layout(self.create_header_panel(mari, gateway), size=12),
+            Layout(self.create_nodes_panel(gateway)),
+        )
+        self.live.update(layout, refresh=True)
 
-    def create_header_panel(self, mari: "MarilibEdge") -> Panel:
+    def create_header_panel(self, mari: "MarilibEdge", gateway: GatewaySnapshot) -> Panel:
         """Create the header panel with gateway and network stats."""
         status = Text()
 
@@ -67,7 +69,9 @@ class MarilibTUIEdge(MarilibTUI):
             status.append(
                 f" via {mari.serial_interface.port} at {mari.serial_interface.baudrate} baud "
             )
-        secs = int((datetime.now() - mari.last_received_serial_data_ts).total_seconds())
+            bytes_per_sec, chunks_per_sec = mari.serial_interface.read_rates()
+            status.append(f"({bytes_per_sec / 1000:.1f} kB/s in {chunks_per_sec:.0f} reads/s) ")
+        secs = int(mari.clock.now() - mari.last_received_serial_data_ts)
         status.append(
             f"(last: {secs}s ago)",
             style="bold green" if secs <= 1 else "bold red",
@@ -84,7 +88,7 @@ class MarilibTUIEdge(MarilibTUI):
             )
             if mari.mqtt_connected:
                 status.append(f" to {mari.mqtt_interface.host}:{mari.mqtt_interface.port} ")
-            mqtt_secs = int((datetime.now() - mari.last_received_mqtt_data_ts).total_seconds())
+            mqtt_secs = int(mari.clock.now() - mari.last_received_mqtt_data_ts)
             status.append(
                 f"(last: {mqtt_secs}s ago)",
                 style="bold green" if mqtt_secs <= 1 else "bold red",
@@ -93,29 +97,29 @@ class MarilibTUIEdge(MarilibTUI):
             status.append("disabled", style="bold yellow")
 
         status.append("\n\nGateway:  ", style="bold cyan")
-        status.append(f"0x{mari.gateway.info.address:016X}  |  ")
+        status.append(f"0x{gateway.info.address:016X}  |  ")
         status.append("Network ID: ", style="bold cyan")
-        status.append(f"0x{mari.gateway.info.network_id:04X}  |  ")
+        status.append(f"0x{gateway.info.network_id:04X}  |  ")
         status.append("ASN: ", style="bold cyan")
-        status.append(f"{mari.gateway.info.asn:020d}")
+        status.append(f"{gateway.info.asn:020d}")
 
         status.append("\n\n")
         status.append("Schedule: ", style="bold cyan")
-        status.append(f"#{mari.gateway.info.schedule_id} {mari.gateway.info.schedule_name} |  ")
-        status.append(f"{len(mari.gateway.nodes)} / {mari.gateway.info.max_nodes} nodes  |  ")
-        status.append(mari.gateway.info.repr_schedule_cells_with_colors())
+        status.append(f"#{gateway.info.schedule_id} {gateway.info.schedule_name} |  ")
+        status.append(f"{len(gateway.nodes)} / {gateway.info.max_nodes} nodes  |  ")
+        status.append(gateway.info.repr_schedule_cells_with_colors())
 
         # --- Latency and PDR Display ---
-        avg_latency_edge = mari.gateway.stats_avg_latency_roundtrip_node_edge_ms()
+        avg_latency_edge = gateway.avg_latency_roundtrip_node_edge_ms
         has_latency_info = avg_latency_edge > 0
 
         # Check if we have PDR info by looking at the gateway averages
-        avg_uart_pdr_up = mari.gateway.stats_avg_pdr_uplink_uart()
-        avg_uart_pdr_down = mari.gateway.stats_avg_pdr_downlink_uart()
+        avg_uart_pdr_up = gateway.avg_pdr_uplink_uart
+        avg_uart_pdr_down = gateway.avg_pdr_downlink_uart
         has_uart_pdr_info = avg_uart_pdr_up > 0 or avg_uart_pdr_down > 0
 
-        avg_radio_pdr_down = mari.gateway.stats_avg_pdr_downlink_radio()
-        avg_radio_pdr_up = mari.gateway.stats_avg_pdr_uplink_radio()
+        avg_radio_pdr_down = gateway.avg_pdr_downlink_radio
+        avg_radio_pdr_up = gateway.avg_pdr_uplink_radio
         has_radio_pdr_info = avg_radio_pdr_down > 0 or avg_radio_pdr_up > 0
 
         pdr_info = "  |  PDR:" if has_uart_pdr_info or has_radio_pdr_info else ""
@@ -134,7 +138,10 @@ class MarilibTUIEdge(MarilibTUI):
         # Display Latency
         if has_latency_info:
             status.append("Latency:  ", style="bold yellow")
-            status.append(f"Avg: {avg_latency_edge:.1f}ms")
+            p50, p95, p99 = gateway.latency_roundtrip_node_edge_ms_percentiles
+            status.append(
+                f"Avg: {avg_latency_edge:.1f}ms  p50 {p50:.1f}  p95 {p95:.1f}  p99 {p99:.1f}"
+            )
 
         # Display PDR
         status.append(f"{pdr_info}{radio_pdr_info}{uart_pdr_info}")
@@ -147,11 +154,10 @@ class MarilibTUIEdge(MarilibTUI):
             status.append(f"{self.test_state.load}% of {self.test_state.rate} pps")
             status.append("  |  ")
 
-        stats = mari.gateway.stats
-        status.append(f"Frames TX: {stats.sent_count(include_test_packets=True)}  |  ")
-        status.append(f"Frames RX: {stats.received_count(include_test_packets=True)} |  ")
-        status.append(f"TX/s: {stats.sent_count(1, include_test_packets=True)}  |  ")
-        status.append(f"RX/s: {stats.received_count(1, include_test_packets=True)}")
+        status.append(f"Frames TX: {gateway.sent_count}  |  ")
+        status.append(f"Frames RX: {gateway.received_count} |  ")
+        status.append(f"TX/s: {gateway.sent_rate}  |  ")
+        status.append(f"RX/s: {gateway.received_rate}")
 
         return Panel(
             status,
@@ -159,7 +165,7 @@ class MarilibTUIEdge(MarilibTUI):
             border_style="blue",
         )
 
-    def create_nodes_table(self, nodes: list[MariNode], title="") -> Table:
+    def create_nodes_table(self, nodes: list[NodeSnapshot], title="") -> Table:
         table = Table(
             show_header=True,
             header_style="bold cyan",
@@ -175,74 +181,67 @@ class MarilibTUIEdge(MarilibTUI):
         table.add_column("Radio ↓ PDR | RSSI", justify="center")
         table.add_column("Radio ↑ PDR | RSSI", justify="center")
         table.add_column("UART PDR ↓ | ↑", justify="center")
-        table.add_column("Latency", justify="center")
+        table.add_column("Latency | p99", justify="center")
 
         for node in nodes:
             lat_str = (
-                f"{node.stats_avg_latency_roundtrip_node_edge_ms():.1f} ms"
-                if node.stats_avg_latency_roundtrip_node_edge_ms() > 0
+                f"{node.avg_latency_roundtrip_node_edge_ms:.1f} | "
+                f"{node.latency_roundtrip_node_edge_ms_percentiles[-1]:.1f} ms"
+                if node.avg_latency_roundtrip_node_edge_ms > 0
                 else "..."
             )
             # PDR Downlink with color coding
-            if node.stats_pdr_downlink_radio() > 0:
-                if node.stats_pdr_downlink_radio() > 0.9:
-                    pdr_down_str = f"[white]{node.stats_pdr_downlink_radio():>4.0%}[/white]"
-                elif node.stats_pdr_downlink_radio() > 0.8:
-                    pdr_down_str = f"[yellow]{node.stats_pdr_downlink_radio():>4.0%}[/yellow]"
+            if node.pdr_downlink_radio > 0:
+                if node.pdr_downlink_radio > 0.9:
+                    pdr_down_str = f"[white]{node.pdr_downlink_radio:>4.0%}[/white]"
+                elif node.pdr_downlink_radio > 0.8:
+                    pdr_down_str = f"[yellow]{node.pdr_downlink_radio:>4.0%}[/yellow]"
                 else:
-                    pdr_down_str = f"[red]{node.stats_pdr_downlink_radio():>4.0%}[/red]"
+                    pdr_down_str = f"[red]{node.pdr_downlink_radio:>4.0%}[/red]"
             else:
                 pdr_down_str = "..."
 
             # PDR Uplink with color coding
-            if node.stats_pdr_uplink_radio() > 0:
-                if node.stats_pdr_uplink_radio() > 0.9:
-                    pdr_up_str = f"[white]{node.stats_pdr_uplink_radio():>4.0%}[/white]"
-                elif node.stats_pdr_uplink_radio() > 0.8:
-                    pdr_up_str = f"[yellow]{node.stats_pdr_uplink_radio():>4.0%}[/yellow]"
+            if node.pdr_uplink_radio > 0:
+                if node.pdr_uplink_radio > 0.9:
+                    pdr_up_str = f"[white]{node.pdr_uplink_radio:>4.0%}[/white]"
+                elif node.pdr_uplink_radio > 0.8:
+                    pdr_up_str = f"[yellow]{node.pdr_uplink_radio:>4.0%}[/yellow]"
                 else:
-                    pdr_up_str = f"[red]{node.stats_pdr_uplink_radio():>4.0%}[/red]"
+                    pdr_up_str = f"[red]{node.pdr_uplink_radio:>4.0%}[/red]"
             else:
                 pdr_up_str = "..."
 
             # PDR UART Up / Down with color coding
-            if node.stats_pdr_downlink_uart() > 0:
-                if node.stats_pdr_downlink_uart() > 0.9:
-                    pdr_down_gw_edge_str = f"[white]{node.stats_pdr_downlink_uart():>4.0%}[/white]"
-                elif node.stats_pdr_downlink_uart() > 0.8:
-                    pdr_down_gw_edge_str = (
-                        f"[yellow]{node.stats_pdr_downlink_uart():>4.0%}[/yellow]"
-                    )
+            if node.pdr_downlink_uart > 0:
+                if node.pdr_downlink_uart > 0.9:
+                    pdr_down_gw_edge_str = f"[white]{node.pdr_downlink_uart:>4.0%}[/white]"
+                elif node.pdr_downlink_uart > 0.8:
+                    pdr_down_gw_edge_str = f"[yellow]{node.pdr_downlink_uart:>4.0%}[/yellow]"
                 else:
-                    pdr_down_gw_edge_str = f"[red]{node.stats_pdr_downlink_uart():>4.0%}[/red]"
+                    pdr_down_gw_edge_str = f"[red]{node.pdr_downlink_uart:>4.0%}[/red]"
             else:
                 pdr_down_gw_edge_str = "..."
 
-            if node.stats_pdr_uplink_uart() > 0:
-                if node.stats_pdr_uplink_uart() > 0.9:
-                    pdr_up_gw_edge_str = f"[white]{node.stats_pdr_uplink_uart():>4.0%}[/white]"
-                elif node.stats_pdr_uplink_uart() > 0.8:
-                    pdr_up_gw_edge_str = f"[yellow]{node.stats_pdr_uplink_uart():>4.0%}[/yellow]"
+            if node.pdr_uplink_uart > 0:
+                if node.pdr_uplink_uart > 0.9:
+                    pdr_up_gw_edge_str = f"[white]{node.pdr_uplink_uart:>4.0%}[/white]"
+                elif node.pdr_uplink_uart > 0.8:
+                    pdr_up_gw_edge_str = f"[yellow]{node.pdr_uplink_uart:>4.0%}[/yellow]"
                 else:
-                    pdr_up_gw_edge_str = f"[red]{node.stats_pdr_uplink_uart():>4.0%}[/red]"
+                    pdr_up_gw_edge_str = f"[red]{node.pdr_uplink_uart:>4.0%}[/red]"
             else:
                 pdr_up_gw_edge_str = "..."
 
-            rssi_node_str = (
-                f"{node.stats_rssi_node_dbm():.0f}"
-                if node.stats_rssi_node_dbm() is not None
-                else "..."
-            )
-            rssi_gw_str = (
-                f"{node.stats_rssi_gw_dbm():.0f}" if node.stats_rssi_gw_dbm() is not None else "..."
-            )
+            rssi_node_str = f"{node.rssi_node_dbm:.0f}" if node.rssi_node_dbm is not None else "..."
+            rssi_gw_str = f"{node.rssi_gw_dbm:.0f}" if node.rssi_gw_dbm is not None else "..."
 
             table.add_row(
                 f"0x{node.address:016X}",
-                str(node.stats.sent_count(include_test_packets=True)),
-                str(node.stats.sent_count(1, include_test_packets=True)),
-                str(node.stats.received_count(include_test_packets=True)),
-                str(node.stats.received_count(1, include_test_packets=True)),
+                str(node.sent_count),
+                str(node.sent_rate),
+                str(node.received_count),
+                str(node.received_rate),
                 f"{pdr_down_str} | {rssi_node_str} dBm",
                 f"{pdr_up_str} | {rssi_gw_str} dBm",
                 f"{pdr_down_gw_edge_str} | {pdr_up_gw_edge_str}",
@@ -250,9 +249,9 @@ class MarilibTUIEdge(MarilibTUI):
             )
         return table
 
-    def create_nodes_panel(self, mari: "MarilibEdge") -> Panel:
+    def create_nodes_panel(self, gateway: GatewaySnapshot) -> Panel:
         """Create the panel that contains the nodes table."""
-        nodes = mari.gateway.nodes
+        nodes = gateway.nodes
         max_rows = self.get_max_rows()
         max_displayable_nodes = self.max_tables * max_rows
         nodes_to_display = nodes[:max_displayable_nodes]
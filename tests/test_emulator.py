@@ -0,0 +1,52 @@
+"""Test module for the gateway emulator."""
+
+import sys
+import time
+
+import pytest
+
+from marilib.communication_adapter import SerialAdapter
+from marilib.marilib_edge import MarilibEdge
+from marilib.model import EdgeEvent
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="requires a pseudo-terminal")
+
+
+def wait_for(condition, timeout=5):
+    start = time.monotonic()
+    while not condition():
+        if time.monotonic() - start > timeout:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_marilib_edge_attached_to_emulator():
+    from marilib.emulator import GatewayEmulator
+
+    emulator = GatewayEmulator(num_nodes=20, schedule_id=3, data_rate=20, seed=1)
+    emulator.start()
+    events = []
+    mari = MarilibEdge(lambda event, data: events.append(event), SerialAdapter(emulator.port))
+    try:
+        assert wait_for(lambda: len(mari.nodes) == 20)
+        # the first gateway info may be sent before the port is opened
+        assert wait_for(lambda: mari.gateway.info.address == emulator.gateway_address)
+        assert mari.gateway.info.schedule_name == "big"
+        assert wait_for(lambda: len(events) >= 20)
+        assert set(events) == {EdgeEvent.NODE_DATA}
+
+        node = mari.nodes[0]
+        mari.metrics_tester.send_metrics_request(node, "edge")
+        assert wait_for(lambda: node.probe_stats_latest is not None)
+        probe = node.probe_stats_latest
+        assert probe.edge_tx_count == probe.edge_rx_count == 1
+        assert probe.node_rx_count == probe.gw_tx_count == 1
+        assert probe.latency_roundtrip_node_edge_ms() > 0
+        assert node.stats_rssi_gw_dbm() == emulator.nodes[node.address].rssi_dbm
+
+        emulator.remove_node(node.address)
+        assert wait_for(lambda: len(mari.nodes) == 19)
+    finally:
+        emulator.stop()
+        mari.serial_interface.close()
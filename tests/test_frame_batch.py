@@ -0,0 +1,43 @@
+import pytest
+
+from marilib.frame_batch import decode_frames, decode_frames_buffer, encode_frames_buffer
+from marilib.mari_protocol import Frame, FrameView, Header, HeaderStats
+
+np = pytest.importorskip("numpy")
+
+FRAMES = [
+    Frame(
+        Header(destination=0xEEE, source=0x1000 + idx), HeaderStats(rssi=170 + idx), payload
+    ).to_bytes()
+    for idx, payload in enumerate([b"\x01hello", b"\x9c" + bytes(10), b"", b"\x01"])
+] + [Header(source=0x2000).to_bytes()]
+
+
+def test_decode_frames_same_as_frame_view():
+    batch = decode_frames(FRAMES)
+    assert len(batch) == len(FRAMES)
+    for idx, bytes_ in enumerate(FRAMES):
+        view = FrameView(bytes_)
+        record = batch.records[idx]
+        for name in ["version", "type_", "network_id", "destination", "source"]:
+            assert record[name] == getattr(view.header, name)
+        assert record["rssi_dbm"] == view.stats.rssi_dbm
+        assert batch.payload(idx) == view.payload
+        assert record["payload_type"] == (view.payload[0] if view.payload else 0)
+
+
+def test_decode_frames_buffer():
+    batch = decode_frames_buffer(encode_frames_buffer(FRAMES))
+    expected = decode_frames(FRAMES).records
+    for name in ["source", "rssi_dbm", "payload_length", "payload_type"]:
+        assert (batch.records[name] == expected[name]).all()
+    assert [batch.payload(idx) for idx in range(len(batch))] == [
+        FrameView(bytes_).payload for bytes_ in FRAMES
+    ]
+    records = batch.records
+    weak = records[(records["source"] == 0x1001) & (records["rssi_dbm"] < -80)]
+    assert len(weak) == 1
+    with pytest.raises(ValueError):
+        decode_frames_buffer(encode_frames_buffer(FRAMES)[:-1])
+    with pytest.raises(ValueError):
+        decode_frames([bytes(19)])
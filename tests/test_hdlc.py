@@ -2,7 +2,17 @@
 
 import pytest
 
-from marilib.serial_hdlc import HDLCDecodeException, HDLCHandler, HDLCState
+from marilib.serial_hdlc import (
+    HDLCDecodeException,
+    HDLCHandler,
+    HDLCState,
+    HDLCStreamDecoder,
+    hdlc_decode,
+    hdlc_encode,
+    hdlc_encode_batch,
+    hdlc_encode_into,
+    hdlc_max_encoded_size,
+)
 
 
 def test_hdlc_handler_states():
@@ -74,3 +84,61 @@ def test_hdlc_handler_payload_too_short():
         handler.handle_byte(int(byte).to_bytes(1, "little"))
     payload = handler.payload
     assert payload == bytearray()
+
+
+def test_hdlc_stream_decoder_multiple_frames():
+    decoder = HDLCStreamDecoder()
+    stream = b"garbage" + hdlc_encode(b"test") + hdlc_encode(b"~test}") + hdlc_encode(b"")
+    assert decoder.feed(stream) == [b"test", b"~test}"]
+    assert decoder.feed(b"") == []
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 64])
+def test_hdlc_stream_decoder_chunked(chunk_size):
+    payloads = [b"test", b"~test}", b"}}}~~~", bytes(range(256)), b"\x00" * 300]
+    stream = b"".join(hdlc_encode(payload) for payload in payloads)
+    decoder = HDLCStreamDecoder()
+    result = []
+    for pos in range(0, len(stream), chunk_size):
+        result += decoder.feed(stream[pos : pos + chunk_size])
+    assert result == payloads
+
+
+def test_hdlc_stream_decoder_invalid_frames():
+    decoder = HDLCStreamDecoder()
+    assert decoder.feed(b"~test\x42\x42~") == []
+    assert decoder.feed(b"~a~") == []
+    assert decoder.feed(b"~~~") == []
+    assert decoder.feed(b"~test\x88\x07~") == [b"test"]
+
+
+def test_hdlc_stream_decoder_same_as_handler():
+    stream = b"A~A~~A\xf5\xa3~~~" + hdlc_encode(b"test") + b"x" + hdlc_encode(b"~}") + b"~"
+    handler = HDLCHandler()
+    expected = []
+    for byte in stream:
+        handler.handle_byte(int(byte).to_bytes(1, "little"))
+        if handler.state == HDLCState.READY and (payload := handler.payload):
+            expected.append(payload)
+    assert HDLCStreamDecoder().feed(stream) == expected
+
+
+@pytest.mark.parametrize(
+    "payload", [b"", b"test", b"~~~", b"}}}", b"~}" * 100, bytes(range(256)) * 2]
+)
+def test_hdlc_encode_roundtrip(payload):
+    frame = hdlc_encode(payload)
+    assert len(frame) <= hdlc_max_encoded_size(len(payload))
+    assert frame.count(b"~") == 2
+    assert hdlc_decode(frame) == payload
+
+
+def test_hdlc_encode_into_preallocated_buffer():
+    payloads = [b"test", b"~test}", bytes(range(256))]
+    buffer = bytearray(1024)
+    offset = 0
+    for payload in payloads:
+        offset = hdlc_encode_into(payload, memoryview(buffer), offset)
+    assert buffer[:offset] == b"".join(hdlc_encode(payload) for payload in payloads)
+    assert buffer[:offset] == hdlc_encode_batch(payloads)
+    assert HDLCStreamDecoder().feed(buffer[:offset]) == payloads
@@ -0,0 +1,141 @@
+import contextlib
+import csv
+import io
+
+from marilib.clock import VirtualClock
+from marilib.communication_adapter import MQTTAdapterDummy
+from marilib.logger import MetricsLogger
+from marilib.mari_protocol import Frame, Header, HeaderStats
+from marilib.marilib_cloud import MarilibCloud
+from marilib.model import EdgeEvent, GatewayInfo, NodeInfoCloud
+
+GATEWAY_A = 0xA1
+GATEWAY_B = 0xB2
+
+
+def build_cloud(clock: VirtualClock, events: list) -> MarilibCloud:
+    with contextlib.redirect_stdout(io.StringIO()):
+        mari = MarilibCloud(
+            lambda event, data: events.append((event, data)),
+            MQTTAdapterDummy(is_edge=False),
+            1,
+            clock=clock,
+        )
+    for gateway_address in [GATEWAY_A, GATEWAY_B]:
+        gateway_info(mari, gateway_address)
+    return mari
+
+
+def gateway_info(mari: MarilibCloud, address: int):
+    info = GatewayInfo(address=address, schedule_id=1, schedule_stats=0)
+    mari.on_mqtt_data_received(EdgeEvent.to_bytes(EdgeEvent.GATEWAY_INFO) + info.to_bytes())
+
+
+def node_event(mari: MarilibCloud, event: EdgeEvent, address: int, gateway_address: int):
+    node_info = NodeInfoCloud(address=address, gateway_address=gateway_address)
+    mari.on_mqtt_data_received(EdgeEvent.to_bytes(event) + node_info.to_bytes())
+
+
+def node_data(mari: MarilibCloud, address: int, gateway_address: int):
+    frame = Frame(Header(destination=gateway_address, source=address), HeaderStats(rssi=200))
+    mari.on_mqtt_data_received(EdgeEvent.to_bytes(EdgeEvent.NODE_DATA) + frame.to_bytes())
+
+
+def left_events(events: list) -> list[tuple[int, int]]:
+    return [
+        (data.address, data.gateway_address)
+        for event, data in events
+        if event == EdgeEvent.NODE_LEFT
+    ]
+
+
+def test_marilib_cloud_node_index():
+    clock = VirtualClock()
+    mari = build_cloud(clock, [])
+    for address in range(1, 5):
+        node_event(mari, EdgeEvent.NODE_JOINED, address, GATEWAY_A)
+    # a keep-alive of an unknown node adds it
+    node_event(mari, EdgeEvent.NODE_KEEP_ALIVE, 5, GATEWAY_B)
+
+    assert mari.node_count == len(mari.nodes) == 5
+    assert sorted(node.address for node in mari.iter_nodes()) == [1, 2, 3, 4, 5]
+    assert mari.get_node(5) is mari.gateways[GATEWAY_B].get_node(5)
+    assert mari.get_node_gateway(1) is mari.gateways[GATEWAY_A]
+    assert mari.get_node(6) is None and mari.get_node_gateway(6) is None
+
+    node_event(mari, EdgeEvent.NODE_LEFT, 1, GATEWAY_A)
+    assert mari.remove_node(2) is not None
+    assert mari.get_node(1) is None and mari.get_node(2) is None
+    assert mari.node_count == 3
+
+    # frames sent to a node are counted on its gateway
+    mari.send_frame(3, b"\x01")
+    assert mari.get_node(3).stats.sent_count() == 1
+    assert mari.gateways[GATEWAY_A].stats.sent_count() == 1
+
+    # nodes and gateways that time out leave the index
+    clock.advance(2)
+    gateway_info(mari, GATEWAY_A)
+    node_data(mari, 3, GATEWAY_A)
+    clock.advance(2)
+    mari.update()
+    assert [node.address for node in mari.iter_nodes()] == [3]
+    assert list(mari.gateways) == [GATEWAY_A]
+
+
+def test_marilib_cloud_node_moves_between_gateways():
+    events = []
+    mari = build_cloud(VirtualClock(), events)
+    node_event(mari, EdgeEvent.NODE_JOINED, 1, GATEWAY_A)
+    node_event(mari, EdgeEvent.NODE_JOINED, 2, GATEWAY_A)
+
+    node_data(mari, 2, GATEWAY_A)
+    moving = mari.get_node(2)
+
+    # joins another gateway before the first one reports it left
+    node_event(mari, EdgeEvent.NODE_JOINED, 1, GATEWAY_B)
+    # or only sends data through another gateway
+    node_data(mari, 2, GATEWAY_B)
+    assert left_events(events) == [(1, GATEWAY_A), (2, GATEWAY_A)]
+    # the join is dispatched for the node only seen through the new gateway
+    assert [(event, data.address, data.gateway_address) for event, data in events[-3:-1]] == [
+        (EdgeEvent.NODE_LEFT, 2, GATEWAY_A),
+        (EdgeEvent.NODE_JOINED, 2, GATEWAY_B),
+    ]
+    assert events[-1][0] == EdgeEvent.NODE_DATA
+    assert mari.gateways[GATEWAY_A].nodes == []
+    assert mari.get_node_gateway(1) is mari.get_node_gateway(2) is mari.gateways[GATEWAY_B]
+    # the node keeps its stats
+    assert mari.get_node(2) is moving
+    assert moving.gateway_address == GATEWAY_B
+    assert moving.stats.received_count() == 2
+    assert mari.gateways[GATEWAY_A].aggregates.count == 0
+    assert mari.gateways[GATEWAY_B].aggregates.count == 2
+
+    # the late leave from the previous gateway does not remove the node
+    events.clear()
+    node_event(mari, EdgeEvent.NODE_LEFT, 1, GATEWAY_A)
+    assert left_events(events) == []
+    assert mari.get_node(1) is mari.gateways[GATEWAY_B].get_node(1)
+    assert mari.node_count == 2
+
+
+def test_marilib_cloud_logger_uses_the_cloud_clock(tmp_path):
+    clock = VirtualClock()
+    logger = MetricsLogger(log_dir_base=str(tmp_path))
+    with contextlib.redirect_stdout(io.StringIO()):
+        mari = MarilibCloud(
+            lambda *_: None, MQTTAdapterDummy(is_edge=False), 1, clock=clock, logger=logger
+        )
+    assert logger.clock is clock
+    for _ in range(10):
+        gateway_info(mari, GATEWAY_A)
+        gateway_info(mari, GATEWAY_B)
+        clock.advance(0.5)
+        mari.update()
+    with contextlib.redirect_stdout(io.StringIO()):
+        logger.close()
+
+    # one row per gateway and per second of virtual time
+    (path,) = tmp_path.glob("run_*/gateway_metrics_*.csv")
+    assert len(list(csv.reader(path.open()))) - 1 == 2 * 5
@@ -0,0 +1,275 @@
+"""Test module for the MarilibEdge class."""
+
+import csv
+import dataclasses
+from datetime import datetime
+
+import pytest
+
+from marilib.clock import VirtualClock
+from marilib.communication_adapter import CommunicationAdapterBase
+from marilib.logger import MetricsLogger
+from marilib.mari_protocol import MARI_BROADCAST_ADDRESS, Frame, Header
+from marilib.marilib_edge import MarilibEdge
+from marilib.marilib_edge_multi import MarilibEdgeMulti
+from marilib.model import EdgeEvent, GatewayInfo, NodeInfoCloud, NodeInfoEdge
+
+GATEWAY_ADDRESS = 0x0102030405060708
+
+
+class FakeSerialAdapter(CommunicationAdapterBase):
+    def __init__(self):
+        self.port = "fake"
+        self.baudrate = 0
+        self.sent = []
+
+    def init(self, on_data_received):
+        self.on_data_received = on_data_received
+
+    def close(self):
+        pass
+
+    def send_data(self, data) -> bool:
+        self.sent.append(data)
+        return True
+
+
+def gateway_info_event() -> bytes:
+    info = GatewayInfo(address=GATEWAY_ADDRESS, schedule_id=6, schedule_stats=bytes(32))
+    return EdgeEvent.to_bytes(EdgeEvent.GATEWAY_INFO) + info.to_bytes()
+
+
+def node_event(event: EdgeEvent, address: int) -> bytes:
+    return EdgeEvent.to_bytes(event) + NodeInfoEdge(address=address).to_bytes()
+
+
+def node_data_event(address: int, payload: bytes) -> bytes:
+    frame = Frame(Header(destination=GATEWAY_ADDRESS, source=address), payload=payload)
+    return EdgeEvent.to_bytes(EdgeEvent.NODE_DATA) + frame.to_bytes()
+
+
+def test_marilib_edge_dispatch_workers():
+    received = []
+    serial = FakeSerialAdapter()
+    mari = MarilibEdge(
+        lambda event, frame: received.append((frame.header.source, frame.payload)),
+        serial_interface=serial,
+        dispatch_workers=3,
+    )
+    serial.on_data_received(gateway_info_event())
+    for address in range(1, 11):
+        serial.on_data_received(node_event(EdgeEvent.NODE_JOINED, address))
+    for seq in range(50):
+        for address in range(1, 11):
+            serial.on_data_received(node_data_event(address, bytes([0x01, seq])))
+    mari.pipeline.stop()
+
+    assert mari.gateway.info.address == GATEWAY_ADDRESS
+    assert len(mari.nodes) == 10
+    for address in range(1, 11):
+        payloads = [payload for source, payload in received if source == address]
+        assert payloads == [bytes([0x01, seq]) for seq in range(50)]
+        assert mari.gateway.get_node(address).stats.received_count() == 50
+    assert mari.pipeline.stats["dispatch"].count == 1 + 10 + 500
+
+
+def test_marilib_edge_multi_routes_frames():
+    serials = [FakeSerialAdapter(), FakeSerialAdapter()]
+    mari = MarilibEdgeMulti(lambda event, data: None, serial_interfaces=serials)
+    for index, serial in enumerate(serials):
+        info = GatewayInfo(address=GATEWAY_ADDRESS + index, schedule_stats=bytes(32))
+        serial.on_data_received(EdgeEvent.to_bytes(EdgeEvent.GATEWAY_INFO) + info.to_bytes())
+        serial.on_data_received(node_event(EdgeEvent.NODE_JOINED, 0x10 + index))
+
+    assert [gateway.info.address for gateway in mari.gateways] == [
+        GATEWAY_ADDRESS,
+        GATEWAY_ADDRESS + 1,
+    ]
+    assert sorted(node.address for node in mari.nodes) == [0x10, 0x11]
+
+    mari.send_frame(0x11, b"\x01unicast")
+    mari.send_frame(0x42, b"\x01unknown")
+    mari.send_frame(MARI_BROADCAST_ADDRESS, b"\x01broadcast")
+    frame = Frame(Header(destination=0x10), payload=b"\x01cloud")
+    mari.on_mqtt_data_received(EdgeEvent.to_bytes(EdgeEvent.NODE_DATA) + frame.to_bytes())
+
+    def payloads(serial):
+        return [Frame().from_bytes(data[1:]).payload for data in serial.sent]
+
+    assert payloads(serials[0]) == [b"\x01broadcast", b"\x01cloud"]
+    assert payloads(serials[1]) == [b"\x01unicast", b"\x01broadcast"]
+
+    assert mari.remove_node(0x11).address == 0x11
+    assert mari.add_node(0x12, GATEWAY_ADDRESS + 1).gateway_address == GATEWAY_ADDRESS + 1
+    assert mari.get_edge_by_node(0x12) is mari.edges[1]
+
+
+def test_marilib_edge_payload_types():
+    received = []
+    handled = []
+    serial = FakeSerialAdapter()
+    mari = MarilibEdge(lambda event, frame: received.append(frame.payload), serial_interface=serial)
+    mari.payload_types.register(
+        0x42,
+        "CALIBRATION",
+        is_test=True,
+        handler=lambda frame, gateway, node: handled.append((frame.payload, node.address)),
+        decoder=lambda payload: payload[1:].decode(),
+    )
+    serial.on_data_received(gateway_info_event())
+    serial.on_data_received(node_event(EdgeEvent.NODE_JOINED, 0x10))
+    serial.on_data_received(node_data_event(0x10, b"\x42abc"))
+    serial.on_data_received(node_data_event(0x10, b"\x01app"))
+
+    assert handled == [(b"\x42abc", 0x10)]
+    assert received == [b"\x01app"]
+    assert mari.payload_types.decode(b"\x42abc") == "abc"
+    node = mari.gateway.get_node(0x10)
+    assert node.stats.received_count(include_test_packets=True) == 2
+    assert node.stats.cumulative_received_non_test == 1
+    # sent frames are classified with the same payload types
+    mari.send_frame(0x10, b"\x42def")
+    assert node.stats.sent_count(include_test_packets=False) == 0
+    assert node.stats.sent_count(include_test_packets=True) == 1
+    # other instances keep the default payload types
+    assert (
+        MarilibEdge(lambda *_: None, FakeSerialAdapter()).payload_types.get(0x42).name == "UNKNOWN"
+    )
+
+
+def test_marilib_edge_virtual_clock():
+    clock = VirtualClock()
+    serial = FakeSerialAdapter()
+    mari = MarilibEdge(lambda *_: None, serial_interface=serial, clock=clock)
+    serial.on_data_received(gateway_info_event())
+    serial.on_data_received(node_event(EdgeEvent.NODE_JOINED, 0x10))
+    serial.on_data_received(node_event(EdgeEvent.NODE_JOINED, 0x11))
+    clock.advance(2)
+    serial.on_data_received(node_data_event(0x10, b"\x01abc"))
+    assert mari.last_received_serial_data_ts == 2
+    assert mari.gateway.get_node(0x10).stats.received_count(1) == 1
+
+    # node 0x11 was last seen 3 seconds ago, without any real time elapsed
+    clock.advance(1)
+    mari.update()
+    assert [node.address for node in mari.nodes] == [0x10]
+    assert mari.gateway.is_alive is False
+    assert mari.metrics_tester.timestamp_us() == 3_000_000
+
+
+def test_marilib_edge_snapshot():
+    clock = VirtualClock()
+    serial = FakeSerialAdapter()
+    mari = MarilibEdge(lambda *_: None, serial_interface=serial, clock=clock, snapshot_period=1)
+    serial.on_data_received(gateway_info_event())
+    snapshot = mari.snapshot()
+    assert snapshot.gateways[0].info.address == GATEWAY_ADDRESS
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        snapshot.gateways[0].sent_count = 1
+
+    # receiving data does not publish, update() does once snapshot_period has elapsed
+    serial.on_data_received(node_event(EdgeEvent.NODE_JOINED, 0x10))
+    serial.on_data_received(node_data_event(0x10, b"\x01abc"))
+    assert mari.snapshot() is snapshot and snapshot.nodes == []
+    mari.update()
+    assert mari.snapshot() is snapshot
+    clock.advance(2)
+    serial.on_data_received(node_data_event(0x10, b"\x01def"))
+    mari.update()
+    snapshot = mari.snapshot()
+    (node,) = snapshot.nodes
+    assert (node.address, node.received_count, node.received_rate) == (0x10, 2, 1)
+    assert snapshot.gateways[0].received_count == 2
+
+
+def test_marilib_edge_snapshot_nodes_per_lock():
+    serial = FakeSerialAdapter()
+    mari = MarilibEdge(lambda *_: None, serial_interface=serial)
+    serial.on_data_received(gateway_info_event())
+    for address in range(1, 101):
+        serial.on_data_received(node_event(EdgeEvent.NODE_JOINED, address))
+
+    class CountingLock:
+        def __init__(self, lock):
+            self.lock, self.acquired = lock, 0
+
+        def __enter__(self):
+            self.acquired += 1
+            return self.lock.__enter__()
+
+        def __exit__(self, *exc):
+            return self.lock.__exit__(*exc)
+
+    lock = CountingLock(mari.lock)
+    snapshot = mari.snapshots.publish([mari.gateway], lock)
+    assert [node.address for node in snapshot.nodes] == list(range(1, 101))
+    # the list of nodes, 4 chunks of 32 nodes, then the gateway
+    assert lock.acquired == 1 + 4 + 1
+
+
+class FakeLogger:
+    active = True
+
+    def __init__(self):
+        self.events = []
+
+    def use_clock(self, clock):
+        pass
+
+    def log_setup_parameters(self, params):
+        pass
+
+    def log_periodic_metrics(self, gateway):
+        pass
+
+    def log_event(self, gateway_address, node_address, event_name, event_tag=""):
+        self.events.append((node_address, event_name, event_tag))
+
+
+def test_marilib_edge_node_timeout_events():
+    clock = VirtualClock()
+    serial = FakeSerialAdapter()
+    logger = FakeLogger()
+    mari = MarilibEdge(lambda *_: None, serial_interface=serial, clock=clock, logger=logger)
+    to_cloud = []
+    mari.mqtt_interface.send_data_to_cloud = to_cloud.append
+    serial.on_data_received(gateway_info_event())
+    serial.on_data_received(node_event(EdgeEvent.NODE_JOINED, 0x10))
+    serial.on_data_received(node_event(EdgeEvent.NODE_JOINED, 0x11))
+    clock.advance(2)
+    serial.on_data_received(node_event(EdgeEvent.NODE_KEEP_ALIVE, 0x11))
+    clock.advance(1)
+    mari.update()
+
+    assert [node.address for node in mari.nodes] == [0x11]
+    assert logger.events == [
+        (0x10, "NODE_JOINED", ""),
+        (0x11, "NODE_JOINED", ""),
+        (0x10, "NODE_LEFT", "timeout"),
+    ]
+    assert to_cloud[-1][0] == EdgeEvent.NODE_LEFT
+    assert NodeInfoCloud().from_bytes(to_cloud[-1][1:]) == NodeInfoCloud(0x10, GATEWAY_ADDRESS)
+
+
+def test_marilib_edge_logger_uses_the_edge_clock(tmp_path):
+    clock = VirtualClock(wall_start=datetime(2026, 1, 1, 12))
+    logger = MetricsLogger(log_dir_base=str(tmp_path), rotation_interval_minutes=1)
+    serial = FakeSerialAdapter()
+    mari = MarilibEdge(lambda *_: None, serial_interface=serial, clock=clock, logger=logger)
+    assert logger.clock is clock
+    serial.on_data_received(gateway_info_event())
+    for _ in range(300):
+        clock.advance(0.5)
+        mari.update()
+    logger.close()
+
+    # one row per second of virtual time, in a new segment every minute of it
+    rows = {
+        path.name: len(list(csv.reader(path.open()))) - 1
+        for path in tmp_path.glob("run_*/gateway_metrics_*.csv")
+    }
+    assert len(rows) == 3
+    assert rows.pop("gateway_metrics_120100.csv") == 60
+    assert rows.pop("gateway_metrics_120200.csv") == 31
+    # the first segment was opened before the logger was attached, with the system clock
+    assert list(rows.values()) == [59]
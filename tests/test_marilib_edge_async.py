@@ -0,0 +1,73 @@
+"""Test module for the asyncio edge facade."""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+from marilib.communication_adapter import AsyncSerialAdapter
+from marilib.mari_protocol import Frame, Header
+from marilib.marilib_edge_async import AsyncMarilibEdge
+from marilib.model import EdgeEvent, GatewayInfo, NodeInfoEdge
+from marilib.serial_hdlc import HDLCStreamDecoder, hdlc_encode
+
+GATEWAY_ADDRESS = 0x0102030405060708
+NODE_ADDRESS = 0x1112131415161718
+
+
+async def _read_payload(fd: int, timeout: float = 5) -> bytes:
+    decoder = HDLCStreamDecoder()
+    for _ in range(int(timeout / 0.01)):
+        try:
+            payloads = decoder.feed(os.read(fd, 1024))
+        except BlockingIOError:
+            payloads = []
+        if payloads:
+            return payloads[0]
+        await asyncio.sleep(0.01)
+    raise TimeoutError
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="requires a pseudo-terminal")
+def test_async_marilib_edge():
+    import tty
+
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    os.set_blocking(master, False)
+
+    async def main():
+        async with AsyncMarilibEdge(AsyncSerialAdapter(os.ttyname(slave))) as mari:
+            gateway_info = GatewayInfo(address=GATEWAY_ADDRESS, schedule_stats=bytes(32))
+            frame = Frame(Header(destination=GATEWAY_ADDRESS, source=NODE_ADDRESS), payload=b"hi")
+            os.write(
+                master,
+                hdlc_encode(EdgeEvent.to_bytes(EdgeEvent.GATEWAY_INFO) + gateway_info.to_bytes())
+                + hdlc_encode(
+                    EdgeEvent.to_bytes(EdgeEvent.NODE_JOINED)
+                    + NodeInfoEdge(address=NODE_ADDRESS).to_bytes()
+                )
+                + hdlc_encode(EdgeEvent.to_bytes(EdgeEvent.NODE_DATA) + frame.to_bytes()),
+            )
+            events = mari.events()
+            event, event_data = await asyncio.wait_for(events.__anext__(), 5)
+            assert event == EdgeEvent.NODE_DATA
+            assert event_data.header.source == NODE_ADDRESS
+            assert event_data.payload == b"hi"
+            assert mari.gateway.info.address == GATEWAY_ADDRESS
+            assert [node.address for node in mari.nodes] == [NODE_ADDRESS]
+
+            await mari.send_frame(NODE_ADDRESS, b"ping")
+            data = await _read_payload(master)
+            assert data[0] == EdgeEvent.NODE_DATA
+            sent = Frame().from_bytes(data[1:])
+            assert sent.header.destination == NODE_ADDRESS
+            assert sent.payload == b"ping"
+            assert mari.gateway.get_node(NODE_ADDRESS).stats.sent_count() == 1
+
+    try:
+        asyncio.run(main())
+    finally:
+        os.close(master)
+        os.close(slave)
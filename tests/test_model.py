@@ -0,0 +1,312 @@
+import random
+from datetime import timedelta
+
+import pytest
+
+from marilib.clock import VirtualClock
+from marilib.mari_protocol import Frame, Header, HeaderStats, MetricsProbePayload
+from marilib.model import FrameCounters, FrameHistory, FrameStats, MariGateway
+from marilib.sketch import LatencySketch
+
+
+def test_frame_counters_window():
+    counters = FrameCounters(window_seconds=10, resolution=1.0)
+    for now in [100.1, 100.2, 100.9, 101.5, 102.5]:
+        counters.add(is_test=now > 102, rssi_dbm=-50, now=now)
+
+    assert counters.sums(10, now=102.5) == (5, 1, -250)
+    # the current bucket, and half of the previous one
+    assert counters.sums(1, now=102.5) == (1.5, 1, -75)
+    assert counters.sums(2, now=102.9) == pytest.approx((2.3, 1, -115))
+    # the oldest bucket is only partly in the window
+    assert counters.sums(10, now=111.9) == pytest.approx((1.1, 1, -55))
+    # frames older than the window are forgotten, reading does not clear the buckets
+    assert counters.sums(10, now=113.0) == (0, 0, 0)
+    assert sum(counters.counts) == 5
+    counters.add(is_test=False, now=120.0)
+    assert counters.sums(10, now=120.5) == (1, 0, 0)
+
+
+def test_frame_stats_steady_rate():
+    clock = VirtualClock()
+    stats = FrameStats(clock=clock)
+    header = Header()
+    # 100 frames per second, for 5 seconds
+    for idx in range(500):
+        stats.add_received(Frame(header, HeaderStats(rssi=200), b"\x01"))
+        if idx >= 100:
+            # at any point within a second
+            assert abs(stats.received_count(1) - 100) <= 1
+            assert abs(stats.received_count(2) - min(idx + 1, 200)) <= 1
+        clock.advance(0.01)
+
+
+def test_frame_counters_invalid_resolution():
+    with pytest.raises(ValueError):
+        FrameCounters(window_seconds=10, resolution=0)
+
+
+def test_frame_stats_counts():
+    stats = FrameStats()
+    header = Header()
+    for payload in [b"\x01", b"\x9c", b"\x01"]:
+        stats.add_received(Frame(header, HeaderStats(rssi=200), payload))
+        stats.add_sent(Frame(header, payload=payload))
+
+    assert stats.received_count() == stats.received_count(60) == 3
+    assert stats.received_count(60, include_test_packets=False) == 2
+    assert stats.sent_count(1) == 3
+    assert stats.sent_count(include_test_packets=False) == 2
+    assert stats.success_rate(30) == 1.0
+    assert stats.received_rssi_dbm() == stats.received_rssi_dbm(10) == -55
+
+
+def test_frame_stats_rssi_windows():
+    clock = VirtualClock()
+    stats = FrameStats(clock=clock)
+    header = Header()
+    # the bins are only allocated with the first frame
+    assert all(h.buckets is None for h in stats.received_rssi.windows.values())
+    assert stats.rssi_percentiles_dbm() == (0, 0, 0) and stats.rssi_trend_db() == 0
+    assert stats.received_rssi.window(60).histogram(clock.now()) == {}
+    assert all(h.buckets is None for h in stats.received_rssi.windows.values())
+    # a stable link for 50 minutes, 2 frames per second
+    for second in range(50 * 60):
+        for rssi_dbm in (-59, -61):
+            stats.add_received(Frame(header, HeaderStats(rssi=255 + rssi_dbm), b"\x01"))
+        clock.advance(1)
+    assert stats.rssi_mean_dbm(60) == stats.rssi_mean_dbm(3600) == -60
+    assert stats.rssi_stddev_dbm(600) == pytest.approx(1)
+    assert stats.rssi_percentiles_dbm((0, 50, 100), 3600) == (-61, -61, -59)
+    assert stats.rssi_trend_db() == 0
+
+    # then degrading during the last minute
+    for second in range(60):
+        stats.add_received(Frame(header, HeaderStats(rssi=255 - 80), b"\x01"))
+        clock.advance(1)
+    assert stats.rssi_mean_dbm(60) == -80
+    assert stats.rssi_percentiles_dbm((50,), 60) == (-80,)
+    assert -80 < stats.rssi_mean_dbm(3600) < -60
+    assert stats.rssi_trend_db() < -15
+
+    # the frames older than a window are forgotten
+    clock.advance(601)
+    assert stats.rssi_mean_dbm(600) == stats.rssi_stddev_dbm(600) == 0
+    assert stats.rssi_trend_db() == 0
+    # the hour covers the 5 minutes buckets since 300 seconds
+    assert stats.received_rssi.window(3600).histogram(clock.now()) == {
+        -80: 60,
+        -61: 2700,
+        -59: 2700,
+    }
+
+
+def test_frame_history_window_and_capacity():
+    history = FrameHistory(window_seconds=10, capacity=100)
+    for idx in range(200):
+        history.add(rssi_dbm=-idx, is_test=idx % 2 == 0, now=100 + idx * 0.01)
+    # only the last 100 frames are kept
+    assert len(history) == 100
+    assert list(history)[0] == (101.0, -100, True)
+    assert list(history)[-1][1:] == (-128, False)
+
+    history.add(rssi_dbm=-40, is_test=False, now=112.5)
+    assert list(history) == [(112.5, -40, False)]
+    assert len(history.timestamps) == 1
+
+    with pytest.raises(ValueError):
+        FrameHistory(window_seconds=10, capacity=-1)
+
+
+def test_frame_stats_history_is_opt_in():
+    clock = VirtualClock()
+    frame = Frame(Header(), stats=HeaderStats(rssi=200), payload=b"\x01")
+    gateway = MariGateway(clock=clock)
+    node = gateway.add_node(0x1)
+    node.register_received_frame(frame)
+    assert len(node.stats.received) == 0 and len(node.stats.received.timestamps) == 0
+
+    gateway = MariGateway(clock=clock, frame_history_capacity=10)
+    node = gateway.add_node(0x1)
+    for _ in range(20):
+        clock.advance(0.1)
+        node.register_received_frame(frame)
+        node.register_sent_frame(frame)
+        gateway.stats.add_received(frame)
+    assert len(node.stats.received) == len(node.stats.sent) == 10
+    assert len(gateway.stats.received) == 10
+    assert list(node.stats.received)[-1] == (clock.now(), frame.stats.rssi_dbm, False)
+
+
+def test_model_virtual_clock():
+    clock = VirtualClock(start_ns=10**9)
+    gateway = MariGateway(clock=clock)
+    node = gateway.add_node(0x10)
+    assert node.clock is node.stats.clock is clock
+    node.stats.add_sent(Frame(Header(), payload=b"\x01"))
+
+    clock.advance(2.5)
+    assert node.is_alive
+    assert node.stats.sent_count(2) == 0
+    assert node.stats.sent_count(5) == 1
+    clock.advance(0.5)
+    assert not node.is_alive and not gateway.is_alive
+    gateway.update_node_liveness(0x10)
+    assert node.is_alive
+    assert clock.wall_time() - clock.wall_start == timedelta(seconds=3)
+
+
+def brute_force_gateway_metrics(gateway: MariGateway) -> dict:
+    """The gateway metrics, computed from the probe stats of every node."""
+    nodes = gateway.nodes
+
+    def average(values, lower=0.0, upper=float("inf")):
+        if not nodes:
+            return 0.0
+        res = sum(values) / len(nodes)
+        return res if lower <= res <= upper else 0.0
+
+    latests = [node.probe_stats_latest for node in nodes if node.probe_stats_latest]
+    return {
+        "pdr_downlink_radio": average([n.stats_pdr_downlink_radio() for n in nodes], upper=1),
+        "pdr_uplink_radio": average([n.stats_pdr_uplink_radio() for n in nodes], upper=1),
+        "pdr_downlink_uart": average([n.stats_pdr_downlink_uart() for n in nodes], upper=1),
+        "pdr_uplink_uart": average([n.stats_pdr_uplink_uart() for n in nodes], upper=1),
+        "latency_edge": average([n.stats_avg_latency_roundtrip_node_edge_ms() for n in nodes]),
+        "latency_cloud": average([n.stats_avg_latency_roundtrip_node_cloud_ms() for n in nodes]),
+        "node_tx": sum(p.node_tx_count for p in latests),
+        "node_rx": sum(p.node_rx_count for p in latests),
+        "gw_tx": sum(p.gw_tx_count for p in latests),
+        "gw_rx": sum(p.gw_rx_count for p in latests),
+    }
+
+
+def gateway_metrics(gateway: MariGateway) -> dict:
+    return {
+        "pdr_downlink_radio": gateway.stats_avg_pdr_downlink_radio(),
+        "pdr_uplink_radio": gateway.stats_avg_pdr_uplink_radio(),
+        "pdr_downlink_uart": gateway.stats_avg_pdr_downlink_uart(),
+        "pdr_uplink_uart": gateway.stats_avg_pdr_uplink_uart(),
+        "latency_edge": gateway.stats_avg_latency_roundtrip_node_edge_ms(),
+        "latency_cloud": gateway.stats_avg_latency_roundtrip_node_cloud_ms(),
+        "node_tx": gateway.stats_latest_node_tx_count(),
+        "node_rx": gateway.stats_latest_node_rx_count(),
+        "gw_tx": gateway.stats_latest_gw_tx_count(),
+        "gw_rx": gateway.stats_latest_gw_rx_count(),
+    }
+
+
+def test_gateway_aggregates_consistency():
+    rng = random.Random(42)
+    clock = VirtualClock()
+    gateway = MariGateway(clock=clock)
+    counts = {}
+    for step in range(2000):
+        address = rng.randrange(1, 40)
+        action = rng.random()
+        if action < 0.05:
+            gateway.remove_node(address)
+        elif action < 0.07:
+            clock.advance(1)
+            gateway.update()
+        else:
+            node = gateway.update_node_liveness(address)
+            count = counts[address] = counts.get(address, 0) + rng.randrange(1, 20)
+            node.save_probe_stats(
+                MetricsProbePayload(
+                    edge_tx_ts_us=step * 1000,
+                    edge_rx_ts_us=step * 1000 + rng.randrange(10_000, 500_000),
+                    cloud_tx_ts_us=step * 1000,
+                    cloud_rx_ts_us=step * 1000 + rng.randrange(10_000, 900_000),
+                    edge_tx_count=count,
+                    edge_rx_count=count - rng.randrange(0, 3),
+                    gw_tx_count=count - rng.randrange(0, 3),
+                    gw_rx_count=count - rng.randrange(0, 5),
+                    node_tx_count=count,
+                    node_rx_count=count - rng.randrange(0, 5),
+                    cloud_tx_count=count,
+                    cloud_rx_count=count,
+                    gw_rx_asn=step * 565,
+                    rssi_at_node=rng.randrange(160, 230),
+                    rssi_at_gw=rng.randrange(160, 230),
+                )
+            )
+        if step % 50 == 0:
+            assert gateway_metrics(gateway) == pytest.approx(brute_force_gateway_metrics(gateway))
+            merged = LatencySketch()
+            for node in gateway.nodes:
+                merged.merge(node.latency_edge)
+            assert gateway.aggregates.latency_edge.bins == merged.bins
+            assert gateway.stats_latency_roundtrip_node_edge_ms_percentiles() == (
+                merged.percentiles()
+            )
+
+    assert gateway.aggregates.count == len(gateway.nodes) > 0
+    assert gateway_metrics(gateway) == pytest.approx(brute_force_gateway_metrics(gateway))
+    for address in gateway.nodes_addresses:
+        gateway.remove_node(address)
+    assert gateway.aggregates.sums == [0] * 10
+    assert gateway.aggregates.latency_cloud.count == 0
+    assert not gateway.aggregates.latency_cloud.bins
+    assert gateway_metrics(gateway) == brute_force_gateway_metrics(gateway)
+
+
+def test_latency_sketch_relative_accuracy():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(3, 1) for _ in range(20_000)]
+    sketch = LatencySketch(relative_accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+
+    values.sort()
+    percentiles = (1, 50, 90, 95, 99, 99.9, 100)
+    for percentile, estimate in zip(percentiles, sketch.percentiles(percentiles)):
+        exact = values[int(percentile / 100 * (len(values) - 1))]
+        assert estimate == pytest.approx(exact, rel=0.01)
+    assert sketch.mean == pytest.approx(sum(values) / len(values))
+
+
+def test_latency_sketch_merge_subtract():
+    first, second = LatencySketch(), LatencySketch()
+    for value in range(1, 101):
+        first.add(value)
+        second.add(value * 10)
+    merged = first.copy()
+    merged.merge(second)
+    assert merged.count == 200
+    assert merged.percentile(50) == pytest.approx(91, rel=0.01)
+
+    merged.subtract(second)
+    assert merged.bins == first.bins
+    assert merged.percentiles() == first.percentiles()
+    with pytest.raises(ValueError):
+        merged.merge(LatencySketch(relative_accuracy=0.05))
+    assert LatencySketch().percentiles() == (0.0, 0.0, 0.0)
+
+
+def test_gateway_update_expires_nodes():
+    clock = VirtualClock()
+    gateway = MariGateway(clock=clock)
+    for addr in range(1, 101):
+        gateway.add_node(addr)
+    clock.advance(2)
+    for addr in range(1, 51):
+        gateway.update_node_liveness(addr)
+    assert gateway.update() == []
+
+    clock.advance(1)
+    expired = gateway.update()
+    assert sorted(node.address for node in expired) == list(range(51, 101))
+    assert gateway.nodes_addresses == list(range(1, 51))
+    # the nodes still alive were pushed back once, with their new deadline
+    assert len(gateway.node_expiry) == 50
+
+    # a node removed then joined again is only in the queue once
+    gateway.remove_node(1)
+    gateway.add_node(1)
+    assert len(gateway.node_expiry) == 50
+    clock.advance(2)
+    assert sorted(node.address for node in gateway.update()) == list(range(2, 51))
+    clock.advance(1)
+    assert [node.address for node in gateway.update()] == [1]
+    assert len(gateway.node_expiry) == 0 and gateway.nodes == []
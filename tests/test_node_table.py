@@ -0,0 +1,129 @@
+import contextlib
+import io
+import random
+
+import pytest
+
+from marilib.clock import VirtualClock
+from marilib.communication_adapter import MQTTAdapterDummy
+from marilib.mari_protocol import Frame, Header, HeaderStats, MetricsProbePayload
+from marilib.marilib_cloud import MarilibCloud
+from marilib.model import EdgeEvent, GatewayInfo, NodeInfoCloud
+from marilib.node_table import NodeTable
+
+np = pytest.importorskip("numpy")
+
+GATEWAYS = [0xA1, 0xA2]
+
+
+def probe(rng: random.Random, count: int) -> MetricsProbePayload:
+    return MetricsProbePayload(
+        edge_tx_ts_us=0,
+        edge_rx_ts_us=rng.randrange(10_000, 500_000),
+        edge_tx_count=count,
+        edge_rx_count=count - rng.randrange(0, 3),
+        gw_tx_count=count - rng.randrange(0, 3),
+        gw_rx_count=count - rng.randrange(0, 5),
+        node_tx_count=count,
+        node_rx_count=count - rng.randrange(0, 5),
+        rssi_at_node=rng.randrange(160, 230),
+        rssi_at_gw=rng.randrange(160, 230),
+    )
+
+
+def build_cloud(clock: VirtualClock) -> MarilibCloud:
+    with contextlib.redirect_stdout(io.StringIO()):
+        mari = MarilibCloud(
+            lambda event, data: None,
+            MQTTAdapterDummy(is_edge=False),
+            1,
+            clock=clock,
+            node_table=NodeTable(capacity=4),
+        )
+    for gateway_address in GATEWAYS:
+        info = GatewayInfo(address=gateway_address, schedule_id=1, schedule_stats=0)
+        mari.handle_mqtt_data(EdgeEvent.to_bytes(EdgeEvent.GATEWAY_INFO) + info.to_bytes())
+    return mari
+
+
+def join(mari: MarilibCloud, address: int, gateway_address: int):
+    node_info = NodeInfoCloud(address=address, gateway_address=gateway_address)
+    mari.handle_mqtt_data(EdgeEvent.to_bytes(EdgeEvent.NODE_JOINED) + node_info.to_bytes())
+
+
+def test_node_table_slots():
+    table = NodeTable(capacity=2)
+    slots = [table.allocate(address, 0xA1, last_seen=0) for address in range(1, 4)]
+    assert slots == [0, 1, 2]
+    assert table.capacity == 4 and len(table) == 3
+    assert list(table["address"][:3]) == [1, 2, 3]
+
+    table.release(1)
+    assert len(table) == 2
+    assert table.allocate(9, 0xA2, last_seen=0, received_count=5) == 1
+    assert table["received_count"][1] == 5
+    assert table.alive_count_by_gateway(now=1) == {0xA1: 2, 0xA2: 1}
+    assert table.alive_count(now=10) == 0
+
+
+def test_cloud_node_table_mirrors_nodes():
+    rng = random.Random(3)
+    clock = VirtualClock()
+    mari = build_cloud(clock)
+    for address in range(1, 21):
+        join(mari, address, GATEWAYS[address % 2])
+    for step in range(200):
+        node = rng.choice(mari.nodes)
+        node.save_probe_stats(probe(rng, step + 10))
+        node.register_received_frame(
+            Frame(Header(source=node.address), HeaderStats(rssi=200), b"\x01")
+        )
+    mari.remove_node(4, GATEWAYS[0])
+    mari.remove_node(5, GATEWAYS[1])
+
+    table = mari.node_table
+    assert len(table) == len(mari.nodes) == 18
+    for node in mari.nodes:
+        assert table["address"][node.node_slot] == node.address
+        assert table["received_count"][node.node_slot] == node.stats.cumulative_received
+    for gateway_address in GATEWAYS:
+        gateway = mari.gateways[gateway_address]
+        averages = table.averages(gateway_address)
+        assert averages["pdr_uplink_radio"] == pytest.approx(gateway.stats_avg_pdr_uplink_radio())
+        assert averages["avg_latency_roundtrip_node_edge_ms"] == pytest.approx(
+            gateway.stats_avg_latency_roundtrip_node_edge_ms()
+        )
+
+    worst = table.worst("pdr_uplink_radio", k=3)
+    expected = sorted(mari.nodes, key=lambda node: node.stats_pdr_uplink_radio())[:3]
+    assert [pdr for _, _, pdr in worst] == pytest.approx(
+        [node.stats_pdr_uplink_radio() for node in expected]
+    )
+    assert table.alive_count(clock.now()) == 18
+
+    # the nodes of a gateway that timed out leave the table with it
+    clock.advance(2)
+    info = GatewayInfo(address=GATEWAYS[0], schedule_id=1, schedule_stats=0)
+    mari.handle_mqtt_data(EdgeEvent.to_bytes(EdgeEvent.GATEWAY_INFO) + info.to_bytes())
+    join(mari, 2, GATEWAYS[0])
+    clock.advance(2)
+    mari.update()
+    assert len(table) == 1
+    assert table.alive_count_by_gateway(clock.now()) == {GATEWAYS[0]: 1}
+
+
+def test_cloud_node_table_moved_node():
+    rng = random.Random(5)
+    mari = build_cloud(VirtualClock())
+    join(mari, 1, GATEWAYS[0])
+    node = mari.get_node(1)
+    node.save_probe_stats(probe(rng, 10))
+    node.register_received_frame(Frame(Header(source=1), HeaderStats(rssi=200), b"\x01"))
+
+    join(mari, 1, GATEWAYS[1])
+    table = mari.node_table
+    assert mari.get_node(1) is node and len(table) == 1
+    assert table["gateway_address"][node.node_slot] == GATEWAYS[1]
+    assert table["received_count"][node.node_slot] == 1
+    assert table["last_rssi_dbm"][node.node_slot] == -55
+    assert table.averages(GATEWAYS[1])["pdr_uplink_radio"] == node.stats_pdr_uplink_radio()
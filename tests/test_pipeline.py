@@ -0,0 +1,55 @@
+"""Test module for the dispatch pipeline."""
+
+import threading
+
+from marilib.pipeline import DispatchPipeline
+
+
+def test_pipeline_preserves_order_per_key():
+    results = []
+    lock = threading.Lock()
+
+    def handle(item):
+        key, seq = item
+        return None if seq < 0 else (key, seq * 10)
+
+    def dispatch(item):
+        with lock:
+            results.append(item)
+
+    pipeline = DispatchPipeline(
+        [("handle", handle), ("dispatch", dispatch)], workers=4, key=lambda item: item[0]
+    )
+    for seq in range(100):
+        for key in range(8):
+            assert pipeline.submit((key, seq))
+    pipeline.submit((0, -1))
+    pipeline.stop()
+
+    for key in range(8):
+        assert [seq for k, seq in results if k == key] == [seq * 10 for seq in range(100)]
+    assert pipeline.stats["queue"].count == 801
+    assert pipeline.stats["handle"].count == 801
+    assert pipeline.stats["dispatch"].count == 800
+    assert pipeline.stats["handle"].max_ms >= pipeline.stats["handle"].avg_ms > 0
+
+
+def test_pipeline_drops_when_full():
+    blocked = threading.Event()
+    release = threading.Event()
+
+    def handle(item):
+        blocked.set()
+        release.wait()
+
+    pipeline = DispatchPipeline([("handle", handle)], queue_size=2)
+    assert pipeline.submit(1)
+    assert blocked.wait(5)
+    assert pipeline.submit(2)
+    assert pipeline.submit(3)
+    assert not pipeline.submit(4)
+    assert pipeline.dropped == 1
+    assert pipeline.queue_depth == 2
+    release.set()
+    pipeline.stop()
+    assert pipeline.stats["handle"].count == 3
@@ -1,4 +1,35 @@
-from marilib.mari_protocol import Frame, Header
+import dataclasses
+import random
+from typing import ClassVar
+
+import pytest
+
+from marilib.mari_protocol import (
+    PAYLOAD_TYPES,
+    DefaultPayload,
+    Frame,
+    FrameView,
+    Header,
+    HeaderStats,
+    MetricsProbePayload,
+    MetricsRequestPayload,
+    MetricsResponsePayload,
+)
+from marilib.model import GatewayInfo, NodeInfoCloud, NodeInfoEdge, NodeStatsReply
+from marilib.protocol import Packet, PacketFieldMetadata
+
+PACKET_CLASSES = [
+    DefaultPayload,
+    MetricsProbePayload,
+    MetricsRequestPayload,
+    MetricsResponsePayload,
+    HeaderStats,
+    Header,
+    NodeInfoCloud,
+    NodeInfoEdge,
+    NodeStatsReply,
+    GatewayInfo,
+]
 
 
 def test_header_size():
@@ -33,3 +64,142 @@ def test_frame_from_bytes():
     )
     assert frame.stats.rssi_dbm == -35
     assert frame.payload == bytes.fromhex("f0f0f0f0f0")
+
+
+@pytest.mark.parametrize(
+    "hex_frame",
+    [
+        "0210170059291ba8fdcecef531eb7f2526ef0399dcf0f0f0f0f0",
+        "0210170059291ba8fdcecef531eb7f2526ef0399dc9c0102",
+        "0210170059291ba8fdcecef531eb7f2526ef039910",
+        "0210170059291ba8fdcecef531eb7f2526ef0399",
+    ],
+)
+def test_frame_view_same_as_frame(hex_frame):
+    bytes_ = bytes.fromhex(hex_frame)
+    frame = Frame().from_bytes(bytes_)
+    view = FrameView(bytes_)
+    for name in ["version", "type_", "network_id", "destination", "source"]:
+        assert getattr(view.header, name) == getattr(frame.header, name)
+    assert view.stats.rssi_dbm == frame.stats.rssi_dbm
+    assert view.payload == frame.payload
+    assert view.is_test_packet == frame.is_test_packet
+    assert view.is_load_test_packet == frame.is_load_test_packet
+    assert view.to_bytes() == frame.to_bytes()
+    assert view.to_frame() == frame
+    assert repr(view) == repr(frame)
+
+
+def test_frame_classify_registry():
+    registry = PAYLOAD_TYPES.copy()
+    registry.register(0x42, "CALIBRATION", is_test=True)
+    frame = Frame(Header(), payload=b"\x42abc")
+    view = FrameView(frame.to_bytes())
+    assert not frame.is_test_packet and not view.is_test_packet
+    assert frame.classify(registry).name == view.classify(registry).name == "CALIBRATION"
+    assert frame.is_test_packet and view.is_test_packet
+    assert view.to_frame().is_test_packet
+    # the registry is kept when the payload changes
+    view.payload = b"\x01abc"
+    assert not view.is_test_packet
+    view.payload = b"\x42def"
+    assert view.is_test_packet
+
+
+def test_frame_view_set_payload():
+    view = FrameView(bytes.fromhex("0210170059291ba8fdcecef531eb7f2526ef0399dc9c0102"))
+    assert view.is_test_packet
+    view.payload = b"\x01abc"
+    assert not view.is_test_packet
+    assert (
+        view.to_bytes() == bytes.fromhex("0210170059291ba8fdcecef531eb7f2526ef0399dc") + b"\x01abc"
+    )
+
+
+def test_frame_view_too_short():
+    with pytest.raises(ValueError):
+        FrameView(bytes(19))
+
+
+def _field_by_field_bytes(packet) -> bytes:
+    metadata = packet.metadata
+    fields = dataclasses.fields(packet)
+    return b"".join(
+        getattr(packet, field.name).to_bytes(meta.length, "little", signed=meta.signed)
+        for meta, field in zip(metadata, fields)
+    )
+
+
+@pytest.mark.parametrize("packet_class", PACKET_CLASSES)
+def test_packet_codec_same_as_field_by_field(packet_class):
+    rng = random.Random(packet_class.__name__)
+    packet = packet_class()
+    for meta, field in zip(packet.metadata, dataclasses.fields(packet)):
+        setattr(packet, field.name, rng.getrandbits(meta.length * 8))
+    expected = _field_by_field_bytes(packet)
+    assert packet.to_bytes() == expected
+    assert isinstance(packet.to_bytes(), bytearray)
+    assert packet_class().from_bytes(expected) == packet
+    assert packet_class().from_bytes(memoryview(expected + b"extra")) == packet
+    with pytest.raises(ValueError):
+        packet_class().from_bytes(expected[:-1])
+
+
+def test_packet_codec_fallbacks():
+    # schedule_stats does not fit in a struct, and can be empty bytes
+    info = GatewayInfo(address=1, network_id=2, schedule_id=3, schedule_stats=b"", asn=4, timer=5)
+    assert info.to_bytes() == bytes.fromhex("0100000000000000020003040000000000000005000000")
+    assert GatewayInfo.codec().struct is None
+    assert Header.codec().struct is not None
+    # out of range values raise the same error as int.to_bytes
+    with pytest.raises(OverflowError):
+        NodeInfoEdge(address=-1).to_bytes()
+    assert Header().to_bytes("big")[:4] == bytes.fromhex("02100001")
+
+
+@pytest.mark.parametrize("packet_class", PACKET_CLASSES)
+def test_packet_metadata_per_class(packet_class):
+    packet = packet_class()
+    assert packet.metadata is packet_class().metadata
+    assert not hasattr(packet, "__dict__")
+    assert packet.size == sum(field.length for field in packet_class.metadata)
+
+
+@dataclasses.dataclass(slots=True)
+class BlobPacket(Packet):
+    metadata: ClassVar[list[PacketFieldMetadata]] = [
+        PacketFieldMetadata(name="count", length=1),
+        PacketFieldMetadata(name="data", type_=bytes, length=0),
+    ]
+    count: int = 0
+    data: bytes = b""
+
+
+@dataclasses.dataclass(slots=True)
+class BlobListPacket(Packet):
+    metadata: ClassVar[list[PacketFieldMetadata]] = [
+        PacketFieldMetadata(name="count", length=2),
+        PacketFieldMetadata(name="blobs", type_=list, length=0),
+    ]
+    count: int = 0
+    blobs: list[BlobPacket] = dataclasses.field(default_factory=list)
+
+
+def test_packet_from_buffer_nested():
+    blobs = [BlobPacket(count=idx % 5, data=bytes(range(idx % 5))) for idx in range(1000)]
+    bytes_ = bytes(BlobListPacket(count=len(blobs), blobs=blobs).to_bytes())
+    packet = BlobListPacket()
+    assert packet.from_buffer(memoryview(bytes_ + b"extra")) == len(bytes_)
+    assert packet.blobs == blobs
+    assert all(type(blob.data) is bytes for blob in packet.blobs)
+    with pytest.raises(ValueError):
+        BlobListPacket().from_buffer(bytes_[:-3])
+
+
+def test_packet_iter_from_buffer():
+    infos = [NodeInfoEdge(address=address) for address in range(10)]
+    bytes_ = b"\x00" + b"".join(info.to_bytes() for info in infos)
+    assert list(NodeInfoEdge.iter_from_buffer(bytes_, offset=1)) == infos
+    assert NodeInfoEdge().from_buffer(bytes_, offset=9) == 8
+    with pytest.raises(ValueError):
+        list(NodeInfoEdge.iter_from_buffer(bytes_[:-1], offset=1))
@@ -0,0 +1,148 @@
+"""Test module for the serial interface."""
+
+import os
+import sys
+import threading
+
+import pytest
+
+from marilib.serial_uart import (
+    SerialInterface,
+    SerialInterfaceException,
+    SerialReadCounters,
+    SerialTxOverflowPolicy,
+    SerialTxQueueFullException,
+    SerialWriter,
+)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="requires a pseudo-terminal")
+def test_serial_interface_reads_chunks():
+    import tty
+
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    received = bytearray()
+    done = threading.Event()
+
+    def on_data(data):
+        received.extend(data)
+        if len(received) >= 3000:
+            done.set()
+
+    interface = SerialInterface(os.ttyname(slave), 1_000_000, on_data, read_chunk_size=256)
+    try:
+        os.write(master, bytes(range(256)) * 12)
+        assert done.wait(5)
+        assert received[:3000] == (bytes(range(256)) * 12)[:3000]
+        assert interface.read_counters.bytes_received >= 3000
+        assert interface.read_counters.chunks_received < interface.read_counters.bytes_received
+        bytes_per_sec, chunks_per_sec = interface.read_rates()
+        assert bytes_per_sec > 0 and chunks_per_sec > 0
+    finally:
+        interface.serial.close()
+        os.close(master)
+        os.close(slave)
+
+
+def test_serial_read_counters_rates():
+    counters = SerialReadCounters(now=100.0)
+    # 100 chunks of 10 bytes per second, for 3 seconds
+    for idx in range(300):
+        now = 100.0 + idx / 100
+        counters.add(bytes(10), now=now)
+        if idx >= 150:
+            bytes_per_sec, chunks_per_sec = counters.rates(now=now)
+            assert bytes_per_sec == pytest.approx(1000, rel=0.05)
+            assert chunks_per_sec == pytest.approx(100, rel=0.05)
+    # reading has no side effects, every reader gets the same rates
+    assert counters.rates(now=103.0) == counters.rates(now=103.0)
+    assert counters.bytes_received == 3000 and counters.chunks_received == 300
+    # and the rates decay when nothing is received
+    assert counters.rates(now=110.0)[0] < 100
+
+
+class FakeSerialInterface:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.serial = self
+        self.writes = []
+        self.writing = threading.Event()
+        self.can_write = threading.Event()
+        self.can_write.set()
+
+    def flush(self):
+        pass
+
+    def write(self, bytes_):
+        self.writing.set()
+        self.can_write.wait()
+        self.writes.append(bytes_)
+
+
+def test_serial_writer_coalesces_queued_frames():
+    interface = FakeSerialInterface()
+    interface.can_write.clear()
+    writer = SerialWriter(interface, queue_size=16, coalesce_max_size=10)
+    assert writer.write(b"0")
+    # wait for the writer thread to block on the first write
+    assert interface.writing.wait(5)
+    for idx in range(1, 8):
+        assert writer.write(str(idx).encode() * 3)
+    assert writer.queue_depth == 7
+    interface.can_write.set()
+    writer.stop()
+    assert interface.writes == [b"0", b"111222333444", b"555666777"]
+    assert writer.stats.frames_enqueued == 8
+    assert writer.stats.frames_written == 8
+    assert writer.stats.writes == 3
+    assert writer.stats.queue_depth_max == 7
+    assert writer.stats.queue_time_max >= writer.stats.queue_time_avg > 0
+
+
+@pytest.mark.parametrize("policy", [SerialTxOverflowPolicy.DROP, SerialTxOverflowPolicy.RAISE])
+def test_serial_writer_overflow(policy):
+    interface = FakeSerialInterface()
+    interface.can_write.clear()
+    writer = SerialWriter(interface, queue_size=2, overflow_policy=policy)
+    writer.write(b"0")
+    assert interface.writing.wait(5)
+    assert writer.write(b"1")
+    assert writer.write(b"2")
+    if policy == SerialTxOverflowPolicy.RAISE:
+        with pytest.raises(SerialTxQueueFullException):
+            writer.write(b"3")
+    else:
+        assert writer.write(b"3") is False
+    assert writer.stats.frames_dropped == 1
+    interface.can_write.set()
+    writer.stop()
+    assert b"".join(interface.writes) == b"012"
+
+
+@pytest.mark.parametrize("policy", list(SerialTxOverflowPolicy))
+def test_serial_writer_write_after_stop(policy):
+    interface = FakeSerialInterface()
+    interface.can_write.clear()
+    writer = SerialWriter(interface, queue_size=1, overflow_policy=policy)
+    writer.write(b"0")
+    assert interface.writing.wait(5)
+    assert writer.write(b"1")
+    if policy == SerialTxOverflowPolicy.BLOCK:
+        # blocked on the full queue when the writer is stopped
+        result = []
+        blocked = threading.Thread(target=lambda: result.append(writer.write(b"2")))
+        blocked.start()
+    interface.can_write.set()
+    writer.stop()
+    if policy == SerialTxOverflowPolicy.BLOCK:
+        blocked.join(5)
+        assert not blocked.is_alive()
+    if policy == SerialTxOverflowPolicy.RAISE:
+        with pytest.raises(SerialInterfaceException):
+            writer.write(b"3")
+    else:
+        assert writer.write(b"3") is False
+    writer.stop()
+    assert writer.stats.frames_dropped >= 1
+    assert b"".join(interface.writes).startswith(b"01")